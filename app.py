@@ -1,17 +1,31 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, g, before_render_template, template_rendered, send_from_directory
 from flask_session import Session
 import pandas as pd
-import spacy
-from rake_nltk import Rake
 import re
-import nltk
-from transformers import T5ForConditionalGeneration, T5Tokenizer
+import argparse
+import time
+from contextlib import contextmanager, ExitStack
+from resources import ResourceRegistry, LOADING_MODES, ensure_nltk_data
+from metrics import MetricsRegistry, profiled
+from batching import BatchScheduler
 import secrets
-from connect import getCursor
+from connect import db_cursor, get_pool
 from werkzeug.security import generate_password_hash, check_password_hash
-from werkzeug.utils import secure_filename
 import os
-from fuzzywuzzy import fuzz
+from scoring import RelevanceScorer, TOP_N
+from search_index import SearchIndex, DEFAULT_INDEX_PATH
+from catalog import Catalog, SamplePool
+from embeddings import EmbeddingIndex, DEFAULT_EMBEDDINGS_PATH, load_model
+from prefilter import CandidateRanker, TokenIndex, DEFAULT_CANDIDATES
+from shards import ShardCoordinator, shards_from_config, DEFAULT_TIMEOUT_MS
+from catalog_updates import CatalogManager, DEFAULT_POLL_SECONDS
+from facets import FacetFilter, FacetIndex, RATING_BUCKETS, PAGE_BUCKETS
+from images import ProfileImageStore, InvalidImage, THUMBNAIL_PATTERN, DEFAULT_IMAGE_DIR, DEFAULT_SIZE, MAX_UPLOAD_BYTES, is_content_key, thumbnail_name
+from jobs import JobQueue, QueueFull
+from result_store import ResultStore
+from query_cache import QueryCache, make_backend, normalize_query, ranking_key
+from intents import IntentClassifier, DEFAULT_INTENTS_PATH, DEFAULT_THRESHOLD
+import wishlist
 import numpy as np
 from itsdangerous import URLSafeTimedSerializer
 from sendgrid import SendGridAPIClient
@@ -23,20 +37,18 @@ DATABASE_URL = os.environ.get('DATABASE_URL')
 
 # Initialize the database schema
 def init_db():
-    connection, cursor = getCursor()
-    cursor.execute("""
-    CREATE TABLE IF NOT EXISTS users (
-        id INT AUTO_INCREMENT PRIMARY KEY,
-        username VARCHAR(100) NOT NULL UNIQUE,
-        password_hash VARCHAR(255) NOT NULL,
-        email VARCHAR(100) NOT NULL,
-        role_id INT,
-        is_active TINYINT DEFAULT 1
-    )
-    """)
-    connection.commit()  # Use the connection object here
-    cursor.close()
-    connection.close()
+    with db_cursor() as (connection, cursor):
+        cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            username VARCHAR(100) NOT NULL UNIQUE,
+            password_hash VARCHAR(255) NOT NULL,
+            email VARCHAR(100) NOT NULL,
+            role_id INT,
+            is_active TINYINT DEFAULT 1
+        )
+        """)
+        connection.commit()  # Use the connection object here
 
 
 
@@ -68,56 +80,167 @@ def create_app():
 
     
     UPLOAD_FOLDER = 'static/uploads'
-    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    DEFAULT_PROFILE_IMAGE = 'default.jpeg'
+    ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+
+    # Profile images: an upload is checked in the request, then turned into PROFILE_IMAGE_SIZE
+    # square WebP and JPEG thumbnails on a background thread. They are stored under the
+    # upload's content hash, so the same photo uploaded twice is processed and stored once
+    app.config['PROFILE_IMAGE_DIR'] = os.environ.get('PROFILE_IMAGE_DIR', DEFAULT_IMAGE_DIR)
+    app.config['PROFILE_IMAGE_SIZE'] = int(os.environ.get('PROFILE_IMAGE_SIZE', DEFAULT_SIZE))
+    profile_images = ProfileImageStore(app.config['PROFILE_IMAGE_DIR'], size=app.config['PROFILE_IMAGE_SIZE'])
+    # Larger request bodies are refused with 413 before they are read into memory
+    app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_BYTES + 1024 * 1024
+    app.extensions['profile_images'] = profile_images
     
-    # Load book data
-    book_data = pd.read_csv('data.csv')
-    book_data['coverImg'] = book_data['coverImg'].replace(np.nan, '', regex=True)
-
-    # Load SpaCy model once
-    nlp = spacy.load("en_core_web_sm")
-
-    # Download necessary NLTK resources
-    nltk.download('stopwords')
-    nltk.download('punkt')
-
-    # Load T5 model for summarization
-    model_name = "t5-base"
-    t5_model = T5ForConditionalGeneration.from_pretrained(model_name)
-    t5_tokenizer = T5Tokenizer.from_pretrained(model_name)
+    # Latency histograms, served in Prometheus text format on /metrics. With
+    # PROMETHEUS_MULTIPROC_DIR set (gunicorn.conf.py sets it) every worker answers
+    # with the totals of all workers
+    metrics = MetricsRegistry(directory=os.environ.get('PROMETHEUS_MULTIPROC_DIR'))
+    app.extensions['metrics'] = metrics
+    request_seconds = metrics.histogram('http_request_seconds', 'Time to handle a request, by endpoint', ['endpoint'])
+    stage_seconds = metrics.histogram('recommendation_stage_seconds', 'Time per recommendation pipeline stage', ['stage'])
+    db_seconds = metrics.histogram('db_seconds', 'Time holding a database cursor, by endpoint', ['endpoint'])
+    render_seconds = metrics.histogram('template_render_seconds', 'Time to render a template', ['template'])
+
+    # Send "X-Profile: 1" to get a cProfile dump of that request (and of the search
+    # it starts) in PROFILE_DIR; only honoured when PROFILING=1
+    app.config['PROFILING'] = os.environ.get('PROFILING', '0') == '1'
+    app.config['PROFILE_DIR'] = os.environ.get('PROFILE_DIR', 'profiles')
+
+    def profile_requested():
+        return app.config['PROFILING'] and request.headers.get('X-Profile') == '1'
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        # A search is profiled in its worker thread instead (see recommendation_job)
+        if profile_requested() and request.endpoint != 'extract':
+            g.profile = ExitStack()
+            g.profile.enter_context(profiled(app.config['PROFILE_DIR'], f'{request.endpoint}-{int(time.time() * 1000)}'))
+
+    @app.teardown_request
+    def observe_request(exc):
+        profile = g.pop('profile', None)
+        if profile is not None:
+            profile.close()
+        if 'request_start' in g:
+            request_seconds.observe(time.perf_counter() - g.request_start, endpoint=request.endpoint or 'unknown')
+
+    def start_render_timer(sender, template, context, **extra):
+        g.render_start = time.perf_counter()
+
+    def observe_render(sender, template, context, **extra):
+        if 'render_start' in g:
+            render_seconds.observe(time.perf_counter() - g.pop('render_start'), template=template.name)
+
+    before_render_template.connect(start_render_timer, app)
+    template_rendered.connect(observe_render, app)
+
+    # db_cursor() for the routes, timed per endpoint
+    @contextmanager
+    def timed_db_cursor():
+        with db_seconds.time(endpoint=request.endpoint or 'unknown'):
+            with db_cursor() as connection_cursor:
+                yield connection_cursor
+
+    # Heavy resources (spaCy, T5, the scoring indexes) load on first use, in a
+    # warm-up thread (MODEL_LOADING=background, the default), or all at startup
+    # (MODEL_LOADING=preload, for gunicorn --preload). Load times are in /jobs/stats
+    app.config['MODEL_LOADING'] = os.environ.get('MODEL_LOADING', 'background')
+    if app.config['MODEL_LOADING'] not in LOADING_MODES:
+        raise ValueError(f"Unknown MODEL_LOADING {app.config['MODEL_LOADING']!r}")
+    resources = ResourceRegistry()
+    app.extensions['resources'] = resources
+
+    # Load book data, from the prebuilt search index when there is an up-to-date one
+    # (build it with: python search_index.py build)
+    app.config['DATA_CSV_PATH'] = os.environ.get('DATA_CSV_PATH', 'data.csv')
+    app.config['SEARCH_INDEX_PATH'] = os.environ.get('SEARCH_INDEX_PATH', DEFAULT_INDEX_PATH)
+
+    def load_search_index():
+        if not os.path.exists(os.path.join(app.config['SEARCH_INDEX_PATH'], 'manifest.json')):
+            return None
+        index = SearchIndex.load(app.config['SEARCH_INDEX_PATH'])
+        if index.is_stale(app.config['DATA_CSV_PATH']):
+            app.logger.warning('Search index is older than data.csv, rebuild it with: python search_index.py build')
+            return None
+        return index
+
+    # Only registered when there is no up-to-date search index
+    def load_book_data():
+        book_data = pd.read_csv(app.config['DATA_CSV_PATH'])
+        book_data['coverImg'] = book_data['coverImg'].replace(np.nan, '', regex=True)
+        return book_data
+
+    # On a search index the catalog reads its text columns from the mapped files
+    def load_catalog():
+        if search_index is not None:
+            return Catalog.from_index(search_index)
+        return Catalog(resources.get('book_data'))
+
+    # The catalog is needed by most pages, so it is always loaded up front
+    resources.register('search_index', load_search_index)
+    search_index = resources.get('search_index')
+    if search_index is None:
+        resources.register('book_data', load_book_data)
+    resources.register('catalog', load_catalog)
+    catalog = resources.get('catalog')
+
+    # NLTK data is only downloaded when it is missing locally
+    resources.register('nltk_data', lambda: ensure_nltk_data('stopwords', 'punkt'))
+
+    # SpaCy (NER only) and RAKE, loaded once (RAKE needs the NLTK stopwords).
+    # Concurrent searches share nlp.pipe calls: wait up to SPACY_MAX_WAIT_MS for up to
+    # SPACY_BATCH_SIZE texts, spread over SPACY_N_PROCESS processes
+    app.config['SPACY_BATCH_SIZE'] = int(os.environ.get('SPACY_BATCH_SIZE', 32))
+    app.config['SPACY_N_PROCESS'] = int(os.environ.get('SPACY_N_PROCESS', 1))
+    app.config['SPACY_MAX_WAIT_MS'] = float(os.environ.get('SPACY_MAX_WAIT_MS', 5))
+
+    def load_keyword_extractor():
+        from keywords import KeywordExtractor  # imports spaCy
+        resources.get('nltk_data')
+        return KeywordExtractor(batch_size=app.config['SPACY_BATCH_SIZE'], n_process=app.config['SPACY_N_PROCESS'])
+
+    def load_keyword_scheduler():
+        extractor = resources.get('keyword_extractor')
+        return BatchScheduler(extractor.extract_many, max_batch=app.config['SPACY_BATCH_SIZE'],
+                              max_wait=app.config['SPACY_MAX_WAIT_MS'] / 1000, name='spacy-scheduler')
+
+    resources.register('keyword_extractor', load_keyword_extractor)
+    resources.register('keyword_scheduler', load_keyword_scheduler)
+
+    # T5 model for summarization (set T5_QUANTIZE=1 for the int8 CPU variant).
+    # Concurrent searches share generate calls: wait up to T5_MAX_WAIT_MS for up to T5_MAX_BATCH inputs
+    app.config['T5_MODEL'] = os.environ.get('T5_MODEL', 't5-base')
+    app.config['T5_QUANTIZE'] = os.environ.get('T5_QUANTIZE', '0') == '1'
+    app.config['T5_MAX_BATCH'] = int(os.environ.get('T5_MAX_BATCH', 8))
+    app.config['T5_MAX_WAIT_MS'] = float(os.environ.get('T5_MAX_WAIT_MS', 10))
+
+    def load_summarizer():
+        from summarizer import get_summarizer, SummarizationScheduler  # imports torch and transformers
+        summarizer = get_summarizer(app.config['T5_MODEL'], quantize=app.config['T5_QUANTIZE'])
+        return SummarizationScheduler(summarizer, max_batch=app.config['T5_MAX_BATCH'],
+                                      max_wait=app.config['T5_MAX_WAIT_MS'] / 1000)
+
+    resources.register('summarizer', load_summarizer)
 
     # Extract keywords using SpaCy NER and RAKE with additional contextual analysis
     def extract_keywords(text):
-        # Step 1: Extract Named Entities using SpaCy
-        doc = nlp(text)
-        # Common entity types to extract
-        entity_labels = ['PERSON', 'ORG', 'GPE', 'LOC', 'PRODUCT', 'DATE', 'TIME', 'MONEY', 'PERCENT', 'QUANTITY', 'EVENT', 'WORK_OF_ART']
-        named_entities = {ent.text for ent in doc.ents if ent.label_ in entity_labels}
-        
-        # Step 2: Extract keywords using RAKE
-        rake = Rake(min_length=1, max_length=3)  # Adjust lengths to capture longer phrases
-        rake.extract_keywords_from_text(text)
-        rake_keywords = set(rake.get_ranked_phrases())
-        
-        # Step 3: Combine RAKE keywords and SpaCy Named Entities
-        combined_keywords = rake_keywords.union(named_entities)
-        
-        # Additional contextual analysis
-        # Filter out overly generic keywords and those not providing value
-        filtered_keywords = [kw for kw in combined_keywords if len(kw.split()) > 1 ]
-        
-        return list(filtered_keywords)  # Return filtered keywords as a list
+        with stage_seconds.time(stage='extract_keywords'):
+            return resources.get('keyword_scheduler').submit(text).result()
 
     # Clean and filter keywords (updated for better results)
     def clean_keywords(keywords):
-        seen = set()
-        result = []
-        for keyword in keywords:
-            cleaned_keyword = re.sub(r'[^\w\s]', '', keyword).strip()
-            if cleaned_keyword and cleaned_keyword not in seen:
-                seen.add(cleaned_keyword)
-                result.append(cleaned_keyword)
-        return result
+        with stage_seconds.time(stage='clean_keywords'):
+            seen = set()
+            result = []
+            for keyword in keywords:
+                cleaned_keyword = re.sub(r'[^\w\s]', '', keyword).strip()
+                if cleaned_keyword and cleaned_keyword not in seen:
+                    seen.add(cleaned_keyword)
+                    result.append(cleaned_keyword)
+            return result
 
     # Get top N keywords
     def get_top_keywords(keywords, top_n=5):
@@ -125,16 +248,8 @@ def create_app():
 
     # Summarize text using T5
     def summarize_with_t5(text):
-        if len(text.split()) < 15:  # Skip summarization for short texts (e.g., < 15 words)
-            return text
-        # Otherwise, run the T5 summarization
-        model_name = "t5-base" 
-        model = T5ForConditionalGeneration.from_pretrained(model_name)
-        tokenizer = T5Tokenizer.from_pretrained(model_name)
-        input_ids = tokenizer.encode("summarize: " + text[:512], return_tensors="pt", max_length=512, truncation=True)
-        summary_ids = model.generate(input_ids, max_length=60, min_length=5, length_penalty=2.0, num_beams=3, early_stopping=True)
-        summary = tokenizer.decode(summary_ids[0], skip_special_tokens=True)
-        return summary
+        with stage_seconds.time(stage='summarize_with_t5'):
+            return resources.get('summarizer').summarize(text)
 
     # Combine keyword extraction and summarization
     def analyze_user_input(text):
@@ -147,104 +262,379 @@ def create_app():
             "summary": summary
         }
 
-    # Function to find the most relevant books based on user input
-    def find_relevant_books(keywords, summary):
-        book_data['relevance_score'] = 0.0
+    # Scoring engine over the catalog columns, built once.
+    # Only books sharing a token with the keywords (title, genres, characters) get
+    # the fuzzy scoring; set PREFILTER_CANDIDATES=0 to score the whole catalog
+    app.config['PREFILTER_CANDIDATES'] = int(os.environ.get('PREFILTER_CANDIDATES', DEFAULT_CANDIDATES))
 
-        for index, row in book_data.iterrows():
-            # Ensure all fields are strings
-            title = str(row['title']) if pd.notna(row['title']) else ""
-            genres = str(row['genres']) if pd.notna(row['genres']) else ""
-            characters = str(row['characters']) if pd.notna(row['characters']) else ""
-            description = str(row['description']) if pd.notna(row['description']) else ""
-            
-            # Calculate scores
-            title_score = max([fuzz.partial_ratio(keyword, title) for keyword in keywords], default=0)
-            genre_score = max([fuzz.partial_ratio(keyword, genres) for keyword in keywords], default=0)
-            character_score = max([fuzz.partial_ratio(keyword, characters) for keyword in keywords], default=0)
-            description_score = fuzz.partial_ratio(summary, description)
-            
-            # Calculate total score
-            total_score = (title_score + genre_score + character_score + description_score) / 4
-            book_data.at[index, 'relevance_score'] = total_score
-        
-        # Sort books by relevance score and return top 15
-        top_books = book_data.sort_values(by='relevance_score', ascending=False).head(15)
-        print(top_books)
-        return top_books
+    def load_ranker():
+        if search_index is not None:
+            scorer = RelevanceScorer.from_index(search_index)
+        else:
+            scorer = RelevanceScorer.from_frame(resources.get('book_data'))
+        token_index = None
+        if app.config['PREFILTER_CANDIDATES']:
+            if search_index is not None:
+                token_index = TokenIndex.from_search_index(search_index)
+            else:
+                token_index = TokenIndex.from_columns(scorer.titles, scorer.genres, scorer.characters)
+        return CandidateRanker(scorer, token_index, limit=app.config['PREFILTER_CANDIDATES'])
+
+    # How books are ranked: 'fuzzy' (keyword and summary matching), 'semantic'
+    # (embedding similarity, build with: python embeddings.py build) or 'hybrid'
+    # (the closest RERANK_CANDIDATES books by embedding, reranked by the fuzzy score)
+    app.config['RANKING_MODE'] = os.environ.get('RANKING_MODE', 'fuzzy')
+    app.config['EMBEDDINGS_PATH'] = os.environ.get('EMBEDDINGS_PATH', DEFAULT_EMBEDDINGS_PATH)
+    app.config['RERANK_CANDIDATES'] = int(os.environ.get('RERANK_CANDIDATES', 200))
+    embedding_index = None
+    if app.config['RANKING_MODE'] in ('semantic', 'hybrid'):
+        embedding_index = EmbeddingIndex.load(app.config['EMBEDDINGS_PATH'])
+        if len(embedding_index) != len(catalog.book_ids):
+            raise ValueError('Book embeddings do not match the catalog, rebuild them with: python embeddings.py build')
+        resources.register('embedding_model', lambda: load_model(embedding_index.model_name))
+    elif app.config['RANKING_MODE'] != 'fuzzy':
+        raise ValueError(f"Unknown RANKING_MODE {app.config['RANKING_MODE']!r}")
+
+    # Fuzzy ranking spread over search shards (run each with: python shards.py --shard i --shards n).
+    # SEARCH_SHARDS is a comma-separated list of shard URLs, or local:N to start N shard
+    # processes on this machine. Shards that miss SHARD_TIMEOUT_MS are left out of the results
+    app.config['SEARCH_SHARDS'] = os.environ.get('SEARCH_SHARDS', '')
+    app.config['SHARD_TIMEOUT_MS'] = int(os.environ.get('SHARD_TIMEOUT_MS', DEFAULT_TIMEOUT_MS))
+    sharded = bool(app.config['SEARCH_SHARDS'])
+    if sharded and app.config['RANKING_MODE'] != 'fuzzy':
+        raise ValueError('SEARCH_SHARDS only supports RANKING_MODE=fuzzy')
+
+    def load_shard_coordinator():
+        shards, cluster = shards_from_config(app.config['SEARCH_SHARDS'], app.config['DATA_CSV_PATH'],
+                                             limit=app.config['PREFILTER_CANDIDATES'])
+        app.extensions['shard_cluster'] = cluster
+        return ShardCoordinator(shards, timeout=app.config['SHARD_TIMEOUT_MS'] / 1000,
+                                workers=app.config['RECOMMENDATION_WORKERS'])
+
+    # Sharded apps never score locally, so they don't build the ranker
+    if sharded:
+        resources.register('search_shards', load_shard_coordinator)
+    else:
+        resources.register('ranker', load_ranker)
+
+    # Rankings are only valid for the data and settings they were computed with: the
+    # ranking mode and candidate limit, the catalog CSV (which shards started with
+    # local:N read too), the search index and embeddings builds, and the shard URLs
+    version_parts = [app.config['RANKING_MODE'], f"candidates={app.config['PREFILTER_CANDIDATES']}"]
+    if os.path.exists(app.config['DATA_CSV_PATH']):
+        stat = os.stat(app.config['DATA_CSV_PATH'])
+        version_parts.append(f'csv={stat.st_size}-{int(stat.st_mtime)}')
+    if search_index is not None:
+        version_parts.append(f'index={search_index.build_id}')
+    if embedding_index is not None:
+        stat = os.stat(os.path.join(app.config['EMBEDDINGS_PATH'], 'embeddings.npy'))
+        version_parts.append(f'embeddings={stat.st_size}-{stat.st_mtime_ns}')
+    if sharded:
+        version_parts.append(f"shards={app.config['SEARCH_SHARDS']}")
+    catalog_version = ';'.join(version_parts)
+
+    # choose 12 random high rating books to display, from a pool picked once per catalog version.
+    # With BOOK_IMAGES_ROTATE_SECONDS set, everyone sees the same covers within a
+    # window and the login/signup pages can be answered with 304 Not Modified
+    app.config['BOOK_IMAGES_MIN_RATING'] = float(os.environ.get('BOOK_IMAGES_MIN_RATING', 4.3))
+    app.config['BOOK_IMAGES_COUNT'] = int(os.environ.get('BOOK_IMAGES_COUNT', 12))
+    app.config['BOOK_IMAGES_ROTATE_SECONDS'] = int(os.environ.get('BOOK_IMAGES_ROTATE_SECONDS', 0))
+
+    def build_sample_pool(catalog):
+        return SamplePool(catalog.column('coverImg'), catalog.column('bookId'), catalog.column('rating'), live=catalog.live,
+                          min_rating=app.config['BOOK_IMAGES_MIN_RATING'],
+                          size=app.config['BOOK_IMAGES_COUNT'],
+                          rotate_seconds=app.config['BOOK_IMAGES_ROTATE_SECONDS'])
+
+    # Bitmaps per genre, rating and page-count bucket, for the facet filters on searches and author pages
+    resources.register('facets', lambda: FacetIndex.from_catalog(catalog))
+
+    # The catalog and everything built from it (ranker, embeddings, cover pool, facets) as one
+    # snapshot that is replaced, not modified, when books change. Delta files dropped
+    # into CATALOG_DELTA_DIR (format in catalog_updates.py) are picked up by every worker
+    # within CATALOG_DELTA_POLL_SECONDS, no restart needed
+    app.config['CATALOG_DELTA_DIR'] = os.environ.get('CATALOG_DELTA_DIR')
+    app.config['CATALOG_DELTA_POLL_SECONDS'] = float(os.environ.get('CATALOG_DELTA_POLL_SECONDS', DEFAULT_POLL_SECONDS))
+    catalog_manager = CatalogManager(catalog, build_sample_pool,
+                                     load_ranker=None if sharded else lambda: resources.get('ranker'),
+                                     embedding_index=embedding_index, facets=resources.get('facets'),
+                                     version=catalog_version)
+    app.extensions['catalog_manager'] = catalog_manager
+
+    def current_catalog():
+        return catalog_manager.current().catalog
+
+    @app.before_request
+    def poll_catalog_updates():
+        if app.config['CATALOG_DELTA_DIR']:
+            catalog_manager.poll(app.config['CATALOG_DELTA_DIR'], app.config['CATALOG_DELTA_POLL_SECONDS'])
+
+    # Function to find the most relevant books based on user input: catalog row
+    # positions and their scores, best first. Nothing shared is written to, so
+    # searches can run on several threads at once. allowed limits the search to
+    # the books matching a facet filter, before any of them is scored
+    def find_relevant_books(keywords, summary, snapshot, allowed=None):
+        with stage_seconds.time(stage='find_relevant_books'):
+            if snapshot.embedding_index is not None:
+                return find_similar_books(keywords, summary, snapshot, allowed)
+
+            # Take the top 15 books by relevance score
+            return catalog_manager.ranker(snapshot).rank(keywords, summary, allowed=allowed)
+
+    # Embedding search: embed the query once and compare it with every book
+    def find_similar_books(keywords, summary, snapshot, allowed=None):
+        query = ' '.join([summary] + list(keywords))
+        # Deleted books are only masked out once there are any (the facet bitmaps leave them out)
+        live = allowed if allowed is not None else snapshot.catalog.live if snapshot.generation else None
+        if app.config['RANKING_MODE'] == 'semantic':
+            rows, similarities = snapshot.embedding_index.search(query, k=TOP_N, live=live)
+            return rows, similarities * 100
+
+        rows, _ = snapshot.embedding_index.search(query, k=app.config['RERANK_CANDIDATES'], live=live)
+        scorer = catalog_manager.ranker(snapshot).scorer
+        scores = scorer.scores(keywords, summary, rows=rows)
+        order = scorer.top(scores)
+        return rows[order], scores[order]
+
+
+    # Finished searches, kept server-side as ranked bookIds and scores
+    app.config['RESULT_STORE_MAX_BYTES'] = int(os.environ.get('RESULT_STORE_MAX_BYTES', 16 * 1024 * 1024))
+    app.config['RESULT_STORE_TTL'] = int(os.environ.get('RESULT_STORE_TTL', 3600))
+    result_store = ResultStore(max_bytes=app.config['RESULT_STORE_MAX_BYTES'], ttl=app.config['RESULT_STORE_TTL'])
+    app.extensions['result_store'] = result_store
+
+    # Two-tier query cache: analysed input by normalized text, rankings by analysed input.
+    # Set QUERY_CACHE_PATH to a sqlite file to keep it across restarts and share it between workers
+    app.config['QUERY_CACHE_PATH'] = os.environ.get('QUERY_CACHE_PATH')
+    app.config['QUERY_CACHE_SIZE'] = int(os.environ.get('QUERY_CACHE_SIZE', 1024))
+    query_cache_backend = make_backend(app.config['QUERY_CACHE_PATH'], max_entries=app.config['QUERY_CACHE_SIZE'])
+    analysis_cache = QueryCache(query_cache_backend, 'analysis')
+    ranking_cache = QueryCache(query_cache_backend, 'ranking')
+    app.extensions['query_caches'] = {'analysis': analysis_cache, 'ranking': ranking_cache}
+
+    def rank_books(keywords, summary, snapshot, facet_filter=None):
+        if sharded:
+            with stage_seconds.time(stage='find_relevant_books'):
+                result = resources.get('search_shards').search(keywords, summary, facet_filter=facet_filter)
+            if result.partial:
+                app.logger.warning('Search shards %s did not answer, results are partial', result.failed + result.timed_out)
+            return {
+                "book_ids": result.book_ids,
+                "scores": result.scores,
+                "partial": result.partial
+            }
+        allowed = snapshot.facets.allowed(facet_filter) if facet_filter else None
+        rows, scores = find_relevant_books(keywords, summary, snapshot, allowed)
+        return {
+            "book_ids": snapshot.catalog.book_ids[rows].tolist(),
+            "scores": scores.tolist()
+        }
 
+    # Run the whole recommendation pipeline for one search, in a worker thread
+    def recommendation_job(job, user_input, profile=False, genre=None, facet_filter=None):
+        if profile:
+            with profiled(app.config['PROFILE_DIR'], f'job-{job.id}'):
+                return recommend(job, user_input, genre, facet_filter)
+        return recommend(job, user_input, genre, facet_filter)
+
+    def recommend(job, user_input, genre=None, facet_filter=None):
+        # The whole search ranks against this one version of the catalog
+        snapshot = catalog_manager.current()
+        if genre is not None:
+            # "Recommend a Poetry book": the genre is the keyword and the summary
+            analysis = {"keywords": [genre], "summary": genre}
+        else:
+            with job.timed('analyze_user_input'):
+                analysis = analysis_cache.get_or_compute(normalize_query(user_input), lambda: analyze_user_input(user_input))
+        keywords = analysis["keywords"]
+        summary = analysis["summary"]
+        with job.timed('find_relevant_books'):
+            key = ranking_key(keywords, summary, snapshot.version, facet_filter)
+            ranking = ranking_cache.get(key)
+            if ranking is None:
+                ranking = rank_books(keywords, summary, snapshot, facet_filter)
+                # A partial ranking lacks the books of the shards that did not answer
+                if not ranking.get("partial"):
+                    ranking_cache.put(key, ranking)
+        result_store.put(job.id, keywords, summary, ranking["book_ids"], ranking["scores"], facet_filter or None)
+
+    # Searches run in the background on a pool of threads. The catalog, scorer and
+    # token index are read-only once built, so the workers share them without locks
+    app.config['RECOMMENDATION_WORKERS'] = int(os.environ.get('RECOMMENDATION_WORKERS', 4))
+    app.config['RECOMMENDATION_MAX_PENDING'] = int(os.environ.get('RECOMMENDATION_MAX_PENDING', 32))
+    job_queue = JobQueue(recommendation_job,
+                         workers=app.config['RECOMMENDATION_WORKERS'],
+                         max_pending=app.config['RECOMMENDATION_MAX_PENDING'])
+    app.extensions['job_queue'] = job_queue
+
+    # Intents from intents.json, matched before the pipeline: greetings, thanks and the
+    # like are answered right away, and a bare genre request skips spaCy and T5
+    app.config['INTENTS_PATH'] = os.environ.get('INTENTS_PATH', DEFAULT_INTENTS_PATH)
+    app.config['INTENT_THRESHOLD'] = float(os.environ.get('INTENT_THRESHOLD', DEFAULT_THRESHOLD))
+    intent_classifier = None
+    if os.path.exists(app.config['INTENTS_PATH']):
+        intent_classifier = IntentClassifier.from_file(app.config['INTENTS_PATH'], threshold=app.config['INTENT_THRESHOLD'])
+
+    # Match rate, and roughly how much pipeline time the matched inputs did not use
+    def intent_stats():
+        stats = intent_classifier.stats()
+        avg_stage_ms = job_queue.stats()['avg_stage_ms']
+        stats['estimated_ms_saved'] = (stats['answered'] * avg_stage_ms.get('total', 0.0) +
+                                       stats['genre_shortcuts'] * avg_stage_ms.get('analyze_user_input', 0.0))
+        return stats
+
+    # Searches a session can still open by job id
+    RECENT_SEARCHES = 20
 
     @app.route('/extract', methods=['POST'])
     def extract():
-        # Clear only the specific session data related to search results
-        session.pop('keywords', None)  # Remove keywords if it exists
-        session.pop('summary', None)    # Remove summary if it exists
-        session.pop('top_books', None)  # Remove top_books if it exists
-
         user_input = request.form['user_input']
-        analysis = analyze_user_input(user_input)
-        keywords = analysis["keywords"]
-        summary = analysis["summary"]
-        session['keywords'] = keywords  # This should be a list of keywords
-        session['summary'] = summary
-        top_books = find_relevant_books(keywords, summary)
-        session['top_books'] = top_books.to_dict(orient='records')
-        return redirect(url_for('loading'))
-
+        intent = intent_classifier.classify(user_input) if intent_classifier is not None else None
+        if intent is not None and intent.kind == 'conversation':
+            flash(intent.response, 'info')
+            return redirect(url_for('home'))
+        genre = intent.tag if intent is not None else None
+        # Optional facet filters from the search form: genre, rating and pages (see facets.py)
+        facet_filter = FacetFilter.from_args(request.form)
+        try:
+            job = job_queue.submit(user_input, profile_requested(), genre, facet_filter)
+        except QueueFull:
+            flash('We are handling a lot of searches right now. Please try again in a moment.', 'danger')
+            return redirect(url_for('home'))
+
+        # Only job ids go into the session, the results stay on the server. The
+        # results page gets its job id in the URL, so searches in several tabs each
+        # show their own books; job_id is the latest one, for links without an id
+        session['job_id'] = job.id
+        session['job_ids'] = (session.get('job_ids', []) + [job.id])[-RECENT_SEARCHES:]
+        return redirect(url_for('loading', job_id=job.id))
+
+
+    @app.route('/loading/<job_id>')
+    def loading(job_id):
+        return render_template('loading.html', job_id=job_id)
+
+    # Status of a search, polled by the loading page
+    @app.route('/results/<job_id>')
+    def job_status(job_id):
+        job = job_queue.get(job_id)
+        if job is None:
+            return jsonify({'id': job_id, 'status': 'unknown'}), 404
+        return jsonify(job.to_dict())
 
-    @app.route('/loading')
-    def loading():
-        return render_template('loading.html')
-        
     @app.route('/results')
     def results():
-        keywords = session.get('keywords', [])  # Retrieve keywords, default to empty list
-        summary = session.get('summary', '')    # Retrieve summary, default to empty string
+        # Only this session's own searches can be opened by id
+        job_id = request.args.get('job_id')
+        if job_id is None:
+            job_id = session.get('job_id', '')
+        elif job_id not in session.get('job_ids', []):
+            job_id = ''
+        result = result_store.get(job_id)
+        if result is None:
+            return render_template('results.html', keywords='', summary='', books=[], facet_counts=None)
         # Convert list of keywords into a comma-separated string
-        keywords_str = ', '.join(keywords) if isinstance(keywords, list) else keywords
-        top_books = session.get('top_books', [])
-        return render_template('results.html', keywords=keywords_str, summary=summary, books=top_books)
-
-
-    # choose 12 random high rating books to display
-    def get_book_images():
-        high_rating_books = book_data[book_data['rating'] > 4.3]
-        if len(high_rating_books) > 12:
-            random_books = high_rating_books.sample(n=12)
+        keywords_str = ', '.join(result.keywords)
+        snapshot = catalog_manager.current()
+        rows = [row for row in map(snapshot.catalog.row_for, result.book_ids) if row is not None]
+        # Facets narrow the recommended books down without searching again
+        facet_filter = FacetFilter.from_args(request.args)
+        if facet_filter:
+            allowed = snapshot.facets.allowed(facet_filter)
+            rows = [row for row in rows if allowed[row]]
+        top_books = snapshot.catalog.records(rows)
+        return render_template('results.html', keywords=keywords_str, summary=result.summary, books=top_books,
+                               facet_counts=snapshot.facets.counts(snapshot.facets.bitmap(rows)),
+                               facet_filter=facet_filter, search_filter=result.facet_filter, job_id=job_id)
+
+    # Queue depth, average time per pipeline stage, result store and query cache usage,
+    # and which resources are loaded and how long each took
+    @app.route('/jobs/stats')
+    def job_stats():
+        stats = dict(job_queue.stats(), result_store=result_store.stats(),
+                     analysis_cache=analysis_cache.stats(), ranking_cache=ranking_cache.stats(),
+                     resources=resources.stats(), catalog=catalog_manager.stats(),
+                     profile_images=profile_images.stats())
+        if intent_classifier is not None:
+            stats['intents'] = intent_stats()
+        keyword_scheduler = resources.peek('keyword_scheduler')
+        if keyword_scheduler is not None:
+            stats['keyword_extractor'] = keyword_scheduler.stats()
+        scheduler = resources.peek('summarizer')
+        if scheduler is not None:
+            stats['summarizer'] = dict(scheduler.summarizer.stats(), scheduler=scheduler.stats())
+        coordinator = resources.peek('search_shards') if sharded else None
+        if coordinator is not None:
+            stats['search_shards'] = coordinator.stats()
+        return jsonify(stats)
+
+
+    # Latency histograms in Prometheus text format
+    @app.route('/metrics')
+    def metrics_endpoint():
+        return app.response_class(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+    # Database connection pool usage
+    @app.route('/db/stats')
+    def db_stats():
+        return jsonify(get_pool().stats())
+
+
+    def get_book_images(sample_pool):
+        if sample_pool.rotate_seconds:
+            return sample_pool.carousel()[1]
+        return sample_pool.sample()
+
+    # Render a page showing the book covers, as a conditional response when the
+    # carousel is on and there are no flash messages to show. The page header
+    # depends on the login, so signed-in users always get a fresh render, and
+    # browsers revalidate every time (no-cache, Vary: Cookie) rather than reuse
+    # a copy from before a login or logout
+    def render_with_book_images(template):
+        snapshot = catalog_manager.current()
+        sample_pool = snapshot.sample_pool
+        if (not sample_pool.rotate_seconds or request.method != 'GET' or session.get('_flashes')
+                or 'user_id' in session):
+            return render_template(template, book_images=get_book_images(sample_pool))
+
+        window, book_images = sample_pool.carousel()
+        etag = f'{template}-{snapshot.generation}-{window}'
+        if etag in request.if_none_match:
+            response = make_response('', 304)
         else:
-            random_books = high_rating_books
-        return list(zip(random_books['coverImg'].tolist(), random_books['bookId'].tolist()))
+            response = make_response(render_template(template, book_images=book_images))
+        response.set_etag(etag)
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        response.vary.add('Cookie')
+        return response
 
 
     # User signup
     @app.route('/signup', methods=['GET', 'POST'])
     def signup():
-        book_images = get_book_images()
         if request.method == 'POST':
             username = request.form['username']
             email = request.form['email']
             password = request.form['password']
             password_hash = generate_password_hash(password, method='pbkdf2:sha256')
-            connection, cursor = getCursor()
-            cursor.execute('SELECT * FROM users WHERE username = %s', (username,))
-            user = cursor.fetchone()
-            if user:
-                flash('Username already exists. Please log in', 'danger')
-            else:
-                cursor.execute("INSERT INTO users (UserName, Email, Password, RoleId) VALUES (%s, %s, %s, %s)", 
-                            (username, email, password_hash, 2))
-                connection.commit()
-                flash('Registration successful. Please log in', 'success')
-                return redirect(url_for('login'))
-            cursor.close()
-            connection.close()
-        return render_template('signup.html', book_images=book_images)
+            with timed_db_cursor() as (connection, cursor):
+                cursor.execute('SELECT * FROM users WHERE username = %s', (username,))
+                user = cursor.fetchone()
+                if user:
+                    flash('Username already exists. Please log in', 'danger')
+                else:
+                    cursor.execute("INSERT INTO users (UserName, Email, Password, RoleId) VALUES (%s, %s, %s, %s)", 
+                                (username, email, password_hash, 2))
+                    connection.commit()
+                    flash('Registration successful. Please log in', 'success')
+                    return redirect(url_for('login'))
+        return render_with_book_images('signup.html')
 
     # User login
     @app.route('/login', methods=['GET', 'POST'])
     def login():
-        book_images = get_book_images()
-
         # Redirect to dashboard if user is already logged in
         if 'user_id' in session:
             return redirect(url_for('dashboard'))
@@ -252,9 +642,9 @@ def create_app():
         if request.method == 'POST':
             username = request.form['username']
             password = request.form['password']
-            connection, cursor = getCursor()
-            cursor.execute('SELECT UserId, UserName, Password FROM users WHERE UserName = %s', (username,))
-            user = cursor.fetchone()
+            with timed_db_cursor() as (connection, cursor):
+                cursor.execute('SELECT UserId, UserName, Password FROM users WHERE UserName = %s', (username,))
+                user = cursor.fetchone()
             if user:
                 user_id, user_name, hashed_password = user
                 if check_password_hash(hashed_password, password):
@@ -271,20 +661,17 @@ def create_app():
                     return redirect(url_for('dashboard'))
                 
             flash('Invalid username or password', 'danger')
-            cursor.close()
-            connection.close()
-        return render_template('login.html', book_images=book_images)
+        return render_with_book_images('login.html')
 
     @app.route('/logout')
     def logout():
         session.clear()
         flash('You have been logged out', 'success')
-        book_images = get_book_images()  # Fetch book images again
-        return render_template('login.html', book_images=book_images)
+        return render_with_book_images('login.html')
 
     @app.route('/')
     def home():
-        return render_template('index.html')
+        return render_template('index.html', rating_buckets=RATING_BUCKETS, page_buckets=PAGE_BUCKETS)
 
     @app.route('/about')
     def about():
@@ -293,18 +680,15 @@ def create_app():
 
     @app.route('/book/<string:book_id>')
     def book_details(book_id):
-        # Find the book in the dataframe
-        matching_books = book_data[book_data['bookId'] == book_id]
-        if not matching_books.empty:
-            book = matching_books.iloc[0]
+        # Find the book in the catalog
+        book = current_catalog().get(book_id)
+        if book is not None:
             user_id = session.get('user_id')
             in_wishlist = False
             
             if user_id:
-                connection, cursor = getCursor()
-                cursor.execute('SELECT * FROM wishlist WHERE UserId = %s AND BookId = %s', (user_id, book_id))
-                in_wishlist = cursor.fetchone() is not None
-                cursor.close()
+                with timed_db_cursor() as (connection, cursor):
+                    in_wishlist = wishlist.contains(cursor, user_id, book_id)
             
             return render_template('book_details.html', book=book, in_wishlist=in_wishlist)
         else:
@@ -314,13 +698,12 @@ def create_app():
     # wishlist
     @app.route('/add_to_wishlist/<string:book_id>', methods=['GET', 'POST'])
     def add_to_wishlist(book_id):
-        # Retrieve book details using the existing logic from the book_details route
-        matching_books = book_data[book_data['bookId'] == book_id]
+        # Retrieve book details from the catalog, like the book_details route
+        book = current_catalog().get(book_id)
         
-        if not matching_books.empty:
-            book = matching_books.iloc[0]
-            title = book['title']  # Adjust to your actual column name for title
-            cover_img = book['coverImg']  # Adjust to your actual column name for cover image
+        if book is not None:
+            title = book.title
+            cover_img = book.coverImg
         else:
             flash('Book not found in our database.', 'danger')
             return redirect(url_for('dashboard'))
@@ -339,26 +722,18 @@ def create_app():
             return redirect(url_for('login'))
 
         user_id = session['user_id']
-        connection, cursor = getCursor()
-        try:
-            # Check if the book is already in the wishlist
-            cursor.execute('SELECT * FROM wishlist WHERE UserId = %s AND BookId = %s', (user_id, book_id))
-            existing_entry = cursor.fetchone()
-            if existing_entry:
-                flash('This book is already in your wishlist.', 'info')
-            else:
-                cursor.execute(
-                    'INSERT INTO wishlist (UserId, BookId, Title, CoverImg) VALUES (%s, %s, %s, %s)',
-                    (user_id, book_id, title, cover_img)
-                )
+        with timed_db_cursor() as (connection, cursor):
+            try:
+                # The unique (UserId, BookId) key skips books already in the wishlist
+                added = wishlist.add_books(cursor, user_id, [(book_id, title, cover_img)])
                 connection.commit()
-                flash('Book added to your wishlist successfully!', 'success')
-        except Exception as e:
-                connection.rollback()
-                flash(f'An error occurred: {str(e)}', 'danger')
-        finally:
-                cursor.close()
-                connection.close()
+                if added:
+                    flash('Book added to your wishlist successfully!', 'success')
+                else:
+                    flash('This book is already in your wishlist.', 'info')
+            except Exception as e:
+                    connection.rollback()
+                    flash(f'An error occurred: {str(e)}', 'danger')
         return redirect(url_for('book_details', book_id=book_id))
 
 
@@ -370,23 +745,19 @@ def create_app():
             return redirect(url_for('login'))
 
         user_id = session['user_id']
-        connection, cursor = getCursor()
-
-        try:
-            # Remove the book from the wishlist
-            cursor.execute('DELETE FROM wishlist WHERE UserId = %s AND BookId = %s', (user_id, book_id))
-            connection.commit()
-            # Check if the deletion was successful
-            if cursor.rowcount == 0:
-                flash('This book was not found in your wishlist.', 'info')
-            else:
-                flash('Book removed from your wishlist successfully!', 'danger')
-        except Exception as e:
-            connection.rollback()
-            flash(f'An error occurred: {str(e)}', 'danger')
-        finally:
-            cursor.close()
-            connection.close()
+        with timed_db_cursor() as (connection, cursor):
+            try:
+                # Remove the book from the wishlist
+                removed = wishlist.remove_books(cursor, user_id, [book_id])
+                connection.commit()
+                # Check if the deletion was successful
+                if removed == 0:
+                    flash('This book was not found in your wishlist.', 'info')
+                else:
+                    flash('Book removed from your wishlist successfully!', 'danger')
+            except Exception as e:
+                connection.rollback()
+                flash(f'An error occurred: {str(e)}', 'danger')
 
         # Redirect based on where the user came from
         if redirect_page == 'book_details':
@@ -405,31 +776,118 @@ def create_app():
         
         user_id = session['user_id']
         username = session.get('username', 'User') 
-        connection, cursor = getCursor()
-        try:
-            # Fetch the wishlist items for the user
-            cursor.execute('SELECT * FROM wishlist WHERE UserId = %s', (user_id,))
-            wishlist_books = cursor.fetchall()
-        except Exception as e:
-            flash(f'An error occurred: {str(e)}', 'danger')
-            wishlist_books = []
-        finally:
-            cursor.close()
-            connection.close()
+        with timed_db_cursor() as (connection, cursor):
+            try:
+                # Fetch the user's wishlist; titles and covers come from the catalog, or from
+                # the wishlist row for books since deleted from it, so they can still be removed
+                stored = wishlist.books(cursor, user_id)
+            except Exception as e:
+                flash(f'An error occurred: {str(e)}', 'danger')
+                stored = []
 
+        catalog = current_catalog()
+        wishlist_books = [catalog.get(book.bookId) or book for book in stored]
         return render_template('dashboard.html', wishlist_books=wishlist_books, username=username)
 
 
+    # Add or remove many books at once, in one statement: book_ids as a JSON list
+    # or as repeated book_id form fields. JSON requests get a JSON answer.
+    # None if the request does not carry a list of ids
+    def bulk_book_ids():
+        if request.is_json:
+            book_ids = (request.get_json(silent=True) or {}).get('book_ids', [])
+            if not isinstance(book_ids, list) or not all(isinstance(book_id, (str, int)) for book_id in book_ids):
+                return None
+            return [str(book_id) for book_id in book_ids]
+        return request.form.getlist('book_id')
+
+    def bulk_response(message, category, status=200, **counts):
+        if request.is_json:
+            return jsonify(counts), status
+        flash(message, category)
+        return redirect(url_for('dashboard'))
+
+    # The error response for a bad bulk request, or None if book_ids can be used
+    def bulk_error(book_ids):
+        if book_ids is None:
+            return bulk_response('Please choose the books to update.', 'danger', 400, error='book_ids must be a list of bookIds')
+        if len(book_ids) > wishlist.MAX_BULK_BOOKS:
+            message = f'at most {wishlist.MAX_BULK_BOOKS} books per request'
+            return bulk_response(f'You can update {message}.', 'danger', 400, error=message)
+        return None
+
+    @app.route('/wishlist/add', methods=['POST'])
+    def add_many_to_wishlist():
+        if 'user_id' not in session:
+            if request.is_json:
+                return jsonify({'error': 'login required'}), 401
+            flash('Please log in to add books to your wishlist.', 'danger')
+            return redirect(url_for('login'))
+        book_ids = bulk_book_ids()
+        error = bulk_error(book_ids)
+        if error is not None:
+            return error
+
+        books = current_catalog().get_many(dict.fromkeys(book_ids))
+        with timed_db_cursor() as (connection, cursor):
+            try:
+                added = wishlist.add_books(cursor, session['user_id'], [(book.bookId, book.title, book.coverImg) for book in books])
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                return bulk_response(f'An error occurred: {str(e)}', 'danger', 500, error=str(e))
+        return bulk_response(f'Added {added} books to your wishlist.', 'success',
+                             added=added, already=len(books) - added, unknown=len(set(book_ids)) - len(books))
+
+    @app.route('/wishlist/remove', methods=['POST'])
+    def remove_many_from_wishlist():
+        if 'user_id' not in session:
+            if request.is_json:
+                return jsonify({'error': 'login required'}), 401
+            flash('You need to be logged in to remove books from your wishlist.', 'danger')
+            return redirect(url_for('login'))
+        book_ids = bulk_book_ids()
+        error = bulk_error(book_ids)
+        if error is not None:
+            return error
+
+        with timed_db_cursor() as (connection, cursor):
+            try:
+                removed = wishlist.remove_books(cursor, session['user_id'], book_ids)
+                connection.commit()
+            except Exception as e:
+                connection.rollback()
+                return bulk_response(f'An error occurred: {str(e)}', 'danger', 500, error=str(e))
+        return bulk_response(f'Removed {removed} books from your wishlist.', 'danger', removed=removed)
+
+
+
+    # Books per page on the author page
+    app.config['AUTHOR_PAGE_SIZE'] = int(os.environ.get('AUTHOR_PAGE_SIZE', 24))
 
     @app.route('/author/<author_name>')
     def author_books(author_name):
-        # Filter the DataFrame to find books by the specific author
-        author_books = book_data[book_data['author'].str.contains(author_name, na=False)]
+        # Find the books by this author in the author index
+        snapshot = catalog_manager.current()
+        catalog = snapshot.catalog
+        rows = catalog.authors.lookup(author_name)
 
-        # Convert the filtered DataFrame to a list of dictionaries to pass to the template
-        books_list = author_books.to_dict(orient='records')
+        # Narrowed by the facet filters in the query string, counted per facet value
+        facet_filter = FacetFilter.from_args(request.args)
+        if facet_filter:
+            allowed = snapshot.facets.allowed(facet_filter)
+            rows = [row for row in rows if allowed[row]]
+        facet_counts = snapshot.facets.counts(snapshot.facets.bitmap(rows))
 
-        return render_template('author_books.html', author=author_name, books=books_list)
+        # Only render the requested page
+        per_page = app.config['AUTHOR_PAGE_SIZE']
+        pages = max((len(rows) + per_page - 1) // per_page, 1)
+        page = min(max(request.args.get('page', 1, type=int), 1), pages)
+        books_list = catalog.records(rows[(page - 1) * per_page:page * per_page])
+
+        return render_template('author_books.html', author=author_name, books=books_list,
+                               page=page, pages=pages, total=len(rows),
+                               facet_counts=facet_counts, facet_filter=facet_filter)
 
 
     def allowed_file(filename):
@@ -443,53 +901,85 @@ def create_app():
             return redirect(url_for('login'))
 
         user_id = session['user_id']
-        connection, cursor = getCursor()
-
-        try:
-            if request.method == 'POST':
-                # Update username and email
-                new_username = request.form.get('username')
-                new_email = request.form.get('email')
-
-                if new_username and new_email:
-                    cursor.execute(
-                        'UPDATE users SET UserName = %s, Email = %s WHERE UserId = %s',
-                        (new_username, new_email, user_id)
-                    )
-                    connection.commit()
-                    session['username'] = new_username
-                    flash('Profile updated successfully!', 'success')
-
-                # Update profile image if a new one is uploaded
-                if 'profile_image' in request.files:
-                    profile_image = request.files['profile_image']
-                    if profile_image and allowed_file(profile_image.filename):
-                        # Save the image to the uploads folder
-                        filename = secure_filename(profile_image.filename)
-                        profile_image_path = os.path.join('static/uploads', filename)
-
-                        # Create the uploads folder if it doesn't exist
-                        os.makedirs(os.path.dirname(profile_image_path), exist_ok=True)
-
-                        profile_image.save(profile_image_path)
-
-                        # Update the user's profile image in the database
-                        cursor.execute('UPDATE users SET ProfileImage = %s WHERE UserId = %s', (filename, user_id))
+        upload = None
+        with timed_db_cursor() as (connection, cursor):
+            try:
+                if request.method == 'POST':
+                    # Update username and email
+                    new_username = request.form.get('username')
+                    new_email = request.form.get('email')
+
+                    if new_username and new_email:
+                        cursor.execute(
+                            'UPDATE users SET UserName = %s, Email = %s WHERE UserId = %s',
+                            (new_username, new_email, user_id)
+                        )
                         connection.commit()
-                        flash('Profile image updated successfully!', 'success')
+                        session['username'] = new_username
+                        flash('Profile updated successfully!', 'success')
 
-            # Fetch user information
-            cursor.execute('SELECT UserName, Email, ProfileImage FROM users WHERE UserId = %s', (user_id,))
-            user = cursor.fetchone()
+                    # Update profile image if a new one is uploaded
+                    if 'profile_image' in request.files:
+                        profile_image = request.files['profile_image']
+                        if profile_image and allowed_file(profile_image.filename):
+                            upload = profile_image.read()
 
-        except Exception as e:
-            flash(f'An error occurred: {str(e)}', 'danger')
-            user = None
-        finally:
-            cursor.close()
-            connection.close()
+                # Fetch user information
+                cursor.execute('SELECT UserName, Email, ProfileImage FROM users WHERE UserId = %s', (user_id,))
+                user = cursor.fetchone()
+
+            except Exception as e:
+                flash(f'An error occurred: {str(e)}', 'danger')
+                user = None
+
+        # Thumbnails are made in the background; the user's row only switches to the
+        # content key once they exist, so a failed upload keeps the old image. Submitted
+        # after the connection above is back in the pool: for an image that is already
+        # stored, set_profile_image runs right here and needs a connection of its own
+        pending_image = None
+        if upload is not None and user is not None:
+            try:
+                pending_image = profile_images.submit(upload, on_ready=lambda key: set_profile_image(user_id, key))
+            except InvalidImage as e:
+                flash(f'Could not use that image: {e}.', 'danger')
+            else:
+                flash('Profile image uploaded, it will show once it is processed.', 'success')
+
+        # A just-uploaded image is shown straight away: its route waits for the
+        # thumbnails, or falls back to the default image if they fail
+        image = pending_image or (user[2] if user else None)
+        return render_template('profile.html', user=user, profile_image=profile_image_urls(image))
+
+    # Called once an upload's thumbnails exist: on the thumbnail thread, or in the
+    # request if they already did. Never while the request holds a connection
+    def set_profile_image(user_id, key):
+        with db_cursor() as (connection, cursor):
+            cursor.execute('UPDATE users SET ProfileImage = %s WHERE UserId = %s', (key, user_id))
+            connection.commit()
 
-        return render_template('profile.html', user=user)
+    # URLs of a profile image by format: the thumbnails for a content key, or the
+    # file in static/uploads for images uploaded before thumbnails were made
+    def profile_image_urls(value):
+        if is_content_key(value):
+            return {extension: url_for('profile_image', name=thumbnail_name(value, profile_images.size, extension))
+                    for extension in ('webp', 'jpg')}
+        return {'jpg': url_for('static', filename='uploads/' + (value or DEFAULT_PROFILE_IMAGE))}
+
+    # Thumbnails never change (the name is the content hash), so browsers and proxies may keep them for a year
+    @app.route('/profile_images/<name>')
+    def profile_image(name):
+        match = THUMBNAIL_PATTERN.fullmatch(name)
+        if match is None or int(match.group(2)) != profile_images.size:
+            return "Image not found", 404
+        # Just uploaded: the thumbnails may still be in the making
+        if not profile_images.wait(match.group(1), timeout=10):
+            response = redirect(url_for('static', filename='uploads/' + DEFAULT_PROFILE_IMAGE))
+            response.cache_control.no_store = True
+            return response
+        response = send_from_directory(profile_images.directory, name, max_age=365 * 24 * 3600)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        return response
 
     @app.errorhandler(404)
     def page_not_found(e):
@@ -505,10 +995,9 @@ def create_app():
     def forgot_password():
         if request.method == 'POST':
             email = request.form['email']
-            connection, cursor = getCursor()
-
-            cursor.execute('SELECT * FROM users WHERE Email = %s', (email,))
-            user = cursor.fetchone()
+            with timed_db_cursor() as (connection, cursor):
+                cursor.execute('SELECT * FROM users WHERE Email = %s', (email,))
+                user = cursor.fetchone()
 
             if user:
                 # Generate a secure token with the user's email
@@ -535,9 +1024,6 @@ def create_app():
             else:
                 flash('Email not found.', 'danger')
 
-            cursor.close()
-            connection.close()
-
         return render_template('forgot_password.html')
 
 
@@ -563,36 +1049,41 @@ def create_app():
             password_hash = generate_password_hash(password, method='pbkdf2:sha256')
             
             # Establish database connection
-            connection, cursor = getCursor()
-
-            try:
-                # Update the user's password in the database
-                cursor.execute('UPDATE users SET Password = %s WHERE Email = %s', (password_hash, email))
-                connection.commit()
+            with timed_db_cursor() as (connection, cursor):
+                try:
+                    # Update the user's password in the database
+                    cursor.execute('UPDATE users SET Password = %s WHERE Email = %s', (password_hash, email))
+                    connection.commit()
 
-                # Check if the update was successful
-                if cursor.rowcount == 0:
-                    flash('Error updating password. Please try again.', 'danger')
-                else:
-                    flash('Your password has been updated!', 'success')
-                    return redirect(url_for('login'))
-            except Exception as e:
-                connection.rollback()
-                flash(f'An error occurred while updating your password: {str(e)}', 'danger')
-            finally:
-                # Ensure resources are always cleaned up
-                cursor.close()
-                connection.close()
+                    # Check if the update was successful
+                    if cursor.rowcount == 0:
+                        flash('Error updating password. Please try again.', 'danger')
+                    else:
+                        flash('Your password has been updated!', 'success')
+                        return redirect(url_for('login'))
+                except Exception as e:
+                    connection.rollback()
+                    flash(f'An error occurred while updating your password: {str(e)}', 'danger')
 
         # Render the reset password form
         return render_template('reset_password.html', token=token)
 
 
+    if app.config['MODEL_LOADING'] == 'preload':
+        resources.load_all()
+    elif app.config['MODEL_LOADING'] == 'background':
+        resources.warm_up()
+
     return app
 
 
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the development server.')
+    parser.add_argument('--preload', action='store_true', help='load every model before serving')
+    args = parser.parse_args()
+    if args.preload:
+        os.environ['MODEL_LOADING'] = 'preload'
     init_db()
     app = create_app()
     app.run(debug=True)
@@ -0,0 +1,104 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    """Batches single-item calls from concurrent requests into one call of process_many.
+
+    A background thread takes the first waiting item, then keeps collecting
+    until it has max_batch items or max_wait seconds have passed, calls
+    process_many(items) and hands each caller its result through a Future.
+    The thread is started by the first submit(), so a scheduler created
+    before a fork works in the child.
+    """
+
+    def __init__(self, process_many, max_batch=8, max_wait=0.01, name='batch-scheduler'):
+        self.process_many = process_many
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.name = name
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.items = 0
+        self.total_queue_seconds = 0.0
+        self.max_queue_seconds = 0.0
+        self._thread = None
+        self._pid = None
+
+    def _start(self):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        if self._pid != os.getpid():
+            self._start()
+        self._queue.put((item, future, time.perf_counter()))
+        return future
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # stop after this batch
+                break
+            batch.append(item)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            started = time.perf_counter()
+            with self._lock:
+                self.batches += 1
+                self.items += len(batch)
+                for _, _, enqueued in batch:
+                    self.total_queue_seconds += started - enqueued
+                    self.max_queue_seconds = max(self.max_queue_seconds, started - enqueued)
+            try:
+                results = self.process_many([item for item, _, _ in batch])
+            except Exception as e:
+                for _, future, _ in batch:
+                    future.set_exception(e)
+            else:
+                for (_, future, _), result in zip(batch, results):
+                    future.set_result(result)
+
+    def shutdown(self):
+        if self._thread is not None and self._pid == os.getpid():
+            self._queue.put(None)
+            self._thread.join()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_batch': self.max_batch,
+                'max_wait_ms': self.max_wait * 1000,
+                'pending': self._queue.qsize(),
+                'batches': self.batches,
+                'avg_batch_size': self.items / self.batches if self.batches else 0.0,
+                'avg_batch_fill': self.items / (self.batches * self.max_batch) if self.batches else 0.0,
+                'avg_queue_ms': self.total_queue_seconds * 1000 / self.items if self.items else 0.0,
+                'max_queue_ms': self.max_queue_seconds * 1000,
+            }
@@ -0,0 +1,277 @@
+import argparse
+import json
+import platform
+import random
+import re
+import sys
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from catalog import Catalog, SamplePool
+from prefilter import CandidateRanker, TokenIndex, SAMPLE_QUERIES
+from scoring import RelevanceScorer
+
+
+DEFAULT_ROWS = [10000]
+
+# A result is a regression when its fastest call is this much slower than in the
+# baseline (the minimum is much less sensitive to other load on the machine)
+DEFAULT_TOLERANCE = 0.25
+# ... and at least this many milliseconds slower, so sub-microsecond noise is ignored
+MIN_DELTA_MS = 0.01
+
+# Index builds are slow, so they are timed fewer times
+BUILD_REPEAT = 3
+
+WORDS = np.array([
+    'dragon', 'magic', 'love', 'war', 'secret', 'house', 'night', 'king', 'queen', 'shadow', 'city', 'river',
+    'murder', 'detective', 'london', 'school', 'wizard', 'vampire', 'space', 'star', 'empire', 'girl', 'boy',
+    'summer', 'winter', 'family', 'island', 'ghost', 'heart', 'fire', 'blood', 'crown', 'garden', 'stone',
+    'journey', 'mystery', 'lost', 'dark', 'light', 'dream', 'ocean', 'forest', 'storm', 'world', 'history',
+])
+GENRES = np.array([
+    'Fantasy', 'Fiction', 'Romance', 'Mystery', 'Thriller', 'Science Fiction', 'Young Adult', 'Classics',
+    'Historical Fiction', 'Horror', 'Nonfiction', 'Paranormal', 'Dystopia', 'Adventure', 'Crime', 'Poetry',
+])
+FIRST_NAMES = np.array(['Anna', 'James', 'Maria', 'John', 'Elena', 'David', 'Sara', 'Peter', 'Lucy', 'Tom', 'Nora', 'Ivan'])
+LAST_NAMES = np.array(['Smith', 'Garcia', 'Rowling', 'King', 'Austen', 'Tolkien', 'Brown', 'Lee', 'Martin', 'Wilde', 'Hardy', 'Woolf'])
+
+USER_INPUTS = [
+    'I want a fantasy book with dragons and magic, something like The Lord of the Rings by J.R.R. Tolkien, set in a medieval kingdom.',
+    'Looking for a murder mystery with a clever detective in Victorian London, ideally part of a long series.',
+    'A young adult dystopian romance where the heroine fights against the government in a ruined city after a war.',
+    'Historical fiction about World War II told from the perspective of a family in Paris trying to survive.',
+]
+
+
+# DataFrame shaped like data.csv (the columns the app reads), with rows books
+def synthetic_catalog(rows, seed=0):
+    rng = np.random.default_rng(seed)
+
+    def phrases(count, length):
+        picks = WORDS[rng.integers(len(WORDS), size=(count, length))]
+        return [' '.join(words) for words in picks]
+
+    titles = [phrase.title() for phrase in phrases(rows, 3)]
+    genre_picks = GENRES[rng.integers(len(GENRES), size=(rows, 3))]
+    author_count = max(rows // 5, 1)
+    authors = [f'{first} {last} {i}' for i, (first, last) in enumerate(zip(
+        FIRST_NAMES[rng.integers(len(FIRST_NAMES), size=author_count)],
+        LAST_NAMES[rng.integers(len(LAST_NAMES), size=author_count)]))]
+    author_picks = rng.integers(author_count, size=rows)
+    illustrated = rng.random(rows) < 0.05
+    characters = phrases(rows, 2)
+    descriptions = phrases(rows, 40)
+    has_characters = rng.random(rows) < 0.6
+    has_description = rng.random(rows) < 0.97
+    return pd.DataFrame({
+        'bookId': [f'{i}.{title.lower().replace(" ", "_")}' for i, title in enumerate(titles)],
+        'title': titles,
+        'author': [authors[a] + (f', {authors[(a + 1) % author_count]} (Illustrator)' if extra else '')
+                   for a, extra in zip(author_picks, illustrated)],
+        'rating': np.round(rng.uniform(3.0, 5.0, rows), 2),
+        'description': [d if keep else np.nan for d, keep in zip(descriptions, has_description)],
+        'genres': [str(list(picks)) for picks in genre_picks],
+        'characters': [str([c.title()]) if keep else np.nan for c, keep in zip(characters, has_characters)],
+        'pages': rng.integers(80, 1200, rows),
+        'coverImg': [f'https://images.example.com/{i}.jpg' for i in range(rows)],
+    })
+
+
+# data.csv (or another catalog) resampled to rows books, with unique bookIds
+def sampled_catalog(csv_path, rows, seed=0):
+    book_data = pd.read_csv(csv_path)
+    book_data = book_data.sample(n=rows, replace=rows > len(book_data), random_state=seed).reset_index(drop=True)
+    book_data['bookId'] = [f'{i}.{book_id}' for i, book_id in enumerate(book_data['bookId'])]
+    book_data['coverImg'] = book_data['coverImg'].replace(np.nan, '', regex=True)
+    return book_data
+
+
+StubEntity = namedtuple('StubEntity', ['text', 'label_'])
+CAPITALIZED = re.compile(r'[A-Z][\w.]*(?:\s+[A-Z][\w.]*)+')
+
+
+class StubDoc:
+    def __init__(self, text):
+        self.ents = [StubEntity(match.group(), 'PERSON') for match in CAPITALIZED.finditer(text)]
+
+
+class StubNlp:
+    """Stands in for the spaCy pipeline: runs of capitalized words are PERSON entities."""
+
+    def __call__(self, text):
+        return StubDoc(text)
+
+    def pipe(self, texts, batch_size=None, n_process=None):
+        return (StubDoc(text) for text in texts)
+
+
+# Milliseconds per call of fn, over repeat calls after warmup
+def measure(fn, repeat, warmup=1):
+    for _ in range(warmup):
+        fn()
+    timings = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings[i] = time.perf_counter() - start
+    timings *= 1000
+    return {
+        'calls': repeat,
+        'mean_ms': float(timings.mean()),
+        'p50_ms': float(np.percentile(timings, 50)),
+        'p95_ms': float(np.percentile(timings, 95)),
+        'min_ms': float(timings.min()),
+    }
+
+
+# Time a setup step (building an index), returning its result and its timing
+def measure_build(fn, repeat=BUILD_REPEAT):
+    values = []
+    timing = measure(lambda: values.append(fn()), repeat, warmup=0)
+    return values[-1], timing
+
+
+def bench_catalog(book_data, repeat, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    catalog, results['catalog_build'] = measure_build(lambda: Catalog(book_data))
+
+    book_ids = [catalog.book_ids[rng.randrange(len(catalog))] for _ in range(repeat * 10)]
+    ids = iter(book_ids * 2)
+    results['catalog_get'] = measure(lambda: catalog.get(next(ids)), repeat * 10)
+    results['catalog_get_many_15'] = measure(lambda: catalog.get_many(rng.sample(book_ids, 15)), repeat)
+
+    names = catalog.authors.names
+    results['author_lookup_exact'] = measure(lambda: catalog.authors.lookup(rng.choice(names)), repeat)
+    results['author_lookup_prefix'] = measure(lambda: catalog.authors.lookup(rng.choice(names)[:6]), repeat)
+    results['author_lookup_fuzzy'] = measure(lambda: catalog.authors.lookup(rng.choice(names)[:-2] + 'xq'), max(repeat // 5, 5))
+
+    pool, results['sample_pool_build'] = measure_build(
+        lambda: SamplePool(catalog.column('coverImg'), catalog.column('bookId'), catalog.column('rating')))
+    results['get_book_images'] = measure(pool.sample, repeat * 10)
+    carousel = SamplePool(catalog.column('coverImg'), catalog.column('bookId'), catalog.column('rating'), rotate_seconds=300)
+    results['get_book_images_carousel'] = measure(lambda: carousel.carousel()[1], repeat * 10)
+    return results
+
+
+def bench_ranking(book_data, repeat):
+    results = {}
+    scorer, results['scorer_build'] = measure_build(lambda: RelevanceScorer.from_frame(book_data))
+    token_index, results['token_index_build'] = measure_build(
+        lambda: TokenIndex.from_columns(scorer.titles, scorer.genres, scorer.characters))
+    ranker = CandidateRanker(scorer, token_index)
+    queries = iter(SAMPLE_QUERIES * (repeat + 2))
+
+    # What find_relevant_books does for one search, with the query standing in for the T5 summary
+    def find_relevant_books(exhaustive):
+        query = next(queries)
+        rows, scores = ranker.rank([query], query, exhaustive=exhaustive)
+        return book_data.iloc[rows].assign(relevance_score=scores)
+
+    calls = max(repeat // 20, 5)
+    results['find_relevant_books'] = measure(lambda: find_relevant_books(False), calls)
+    results['find_relevant_books_exhaustive'] = measure(lambda: find_relevant_books(True), calls)
+    return results
+
+
+def bench_keywords(repeat):
+    try:
+        from keywords import KeywordExtractor
+        extractor = KeywordExtractor(nlp=StubNlp())
+    except (ImportError, LookupError) as e:  # spaCy / rake-nltk or the NLTK stopwords are missing
+        return {}, f'extract_keywords skipped: {e}'
+    inputs = iter(USER_INPUTS * (repeat + 2))
+    return {'extract_keywords': measure(lambda: extractor.extract(next(inputs)), repeat)}, None
+
+
+def run(rows_list, repeat=200, csv_path=None, seed=0):
+    results = {}
+    notes = []
+    keyword_results, note = bench_keywords(repeat)
+    if note:
+        notes.append(note)
+    for name, result in keyword_results.items():
+        results[name] = result
+    for rows in rows_list:
+        book_data, load = measure_build(
+            lambda: sampled_catalog(csv_path, rows, seed) if csv_path else synthetic_catalog(rows, seed), repeat=1)
+        size_results = {'catalog_load': load}
+        size_results.update(bench_catalog(book_data, repeat, seed))
+        size_results.update(bench_ranking(book_data, repeat))
+        for name, result in size_results.items():
+            results[f'{rows}/{name}'] = result
+    return {
+        'meta': {
+            'rows': rows_list,
+            'repeat': repeat,
+            'source': csv_path or 'synthetic',
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'machine': platform.machine(),
+            'processor': platform.processor(),
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'notes': notes,
+        },
+        'results': results,
+    }
+
+
+# Benchmarks whose fastest call got slower than the baseline by more than tolerance
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE, min_delta_ms=MIN_DELTA_MS):
+    comparisons = []
+    for name, result in current['results'].items():
+        base = baseline['results'].get(name)
+        if base is None:
+            continue
+        ratio = result['min_ms'] / base['min_ms'] if base['min_ms'] else float('inf')
+        comparisons.append({
+            'name': name,
+            'baseline_ms': base['min_ms'],
+            'current_ms': result['min_ms'],
+            'ratio': ratio,
+            'regression': ratio > 1 + tolerance and result['min_ms'] - base['min_ms'] > min_delta_ms,
+        })
+    return comparisons
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the search and recommendation hot paths.')
+    parser.add_argument('--rows', type=int, nargs='+', default=DEFAULT_ROWS, help='catalog sizes, e.g. 10000 100000 1000000')
+    parser.add_argument('--csv', help='resample this catalog instead of generating a synthetic one')
+    parser.add_argument('--repeat', type=int, default=200, help='calls per benchmark (scaled down for the slow ones)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', help='compare with results saved earlier; exits with 1 on a regression')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='allowed slowdown, 0.25 = 25%%')
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, repeat=args.repeat, csv_path=args.csv, seed=args.seed)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{'benchmark':45} {'p50 ms':>10} {'p95 ms':>10} {'calls':>6}")
+    for name, result in report['results'].items():
+        print(f"{name:45} {result['p50_ms']:10.3f} {result['p95_ms']:10.3f} {result['calls']:6d}")
+    for note in report['meta']['notes']:
+        print(note)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        comparisons = compare(report, baseline, tolerance=args.tolerance)
+        regressions = [c for c in comparisons if c['regression']]
+        for c in comparisons:
+            flag = 'REGRESSION' if c['regression'] else ''
+            print(f"{c['name']:45} {c['baseline_ms']:10.3f} -> {c['current_ms']:10.3f} ({c['ratio']:.2f}x) {flag}")
+        if regressions:
+            print(f'{len(regressions)} benchmark(s) slower than the baseline by more than {args.tolerance:.0%}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
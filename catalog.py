@@ -0,0 +1,363 @@
+import bisect
+import random
+import re
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+from rapidfuzz import fuzz, process
+from search_index import StringColumn
+
+
+# Role suffixes such as "(Goodreads Author)" or "(Illustrator)"
+ROLE_PATTERN = re.compile(r'\s*\([^)]*\)')
+
+
+def normalize_author(name):
+    return re.sub(r'\s+', ' ', ROLE_PATTERN.sub('', name)).strip().casefold()
+
+
+# "J.K. Rowling, Mary GrandPré (Illustrator)" -> ['j.k. rowling', 'mary grandpré']
+def split_authors(author):
+    if not isinstance(author, str):
+        return []
+    names = (normalize_author(name) for name in author.split(','))
+    return [name for name in names if name]
+
+
+class AuthorIndex:
+    """Normalized author name -> rows of their books, in catalog order."""
+
+    def __init__(self, authors):
+        rows = {}
+        for row, author in enumerate(authors):
+            for name in split_authors(author):
+                rows.setdefault(name, []).append(row)
+        self._rows = {name: tuple(name_rows) for name, name_rows in rows.items()}
+        self.names = sorted(rows)
+
+    def __len__(self):
+        return len(self.names)
+
+    # A new index with the books at these rows re-filed: removed maps row -> the
+    # author it was filed under, added maps row -> its new author. Only the
+    # names involved are touched
+    def updated(self, removed, added):
+        rows = dict(self._rows)
+        for row, author in removed.items():
+            for name in split_authors(author):
+                remaining = tuple(r for r in rows.get(name, ()) if r != row)
+                if remaining:
+                    rows[name] = remaining
+                else:
+                    rows.pop(name, None)
+        for row, author in added.items():
+            for name in split_authors(author):
+                rows[name] = tuple(sorted(set(rows.get(name, ())) | {row}))
+        index = AuthorIndex.__new__(AuthorIndex)
+        index._rows = rows
+        index.names = self.names if rows.keys() == self._rows.keys() else sorted(rows)
+        return index
+
+    # Author names starting with prefix
+    def prefix(self, prefix):
+        start = bisect.bisect_left(self.names, prefix)
+        end = bisect.bisect_left(self.names, prefix + '\U0010ffff')
+        return self.names[start:end]
+
+    # Closest author names, compared against the author vocabulary only
+    def fuzzy(self, name, limit=5, score_cutoff=85):
+        return [match for match, _, _ in process.extract(name, self.names, scorer=fuzz.WRatio, limit=limit, score_cutoff=score_cutoff)]
+
+    def rows_for_names(self, names):
+        rows = set()
+        for name in names:
+            rows.update(self._rows.get(name, ()))
+        return sorted(rows)
+
+    # Rows of the books by author_name: exact name match first, then names
+    # starting with it, then (if fuzzy) the closest names. A query naming
+    # several authors ("A, B (Illustrator)") matches books credited to all of them.
+    def lookup(self, author_name, fuzzy=True):
+        names = split_authors(author_name)
+        if not names:
+            return []
+        if len(names) > 1:
+            rows = set(self._rows.get(names[0], ()))
+            for name in names[1:]:
+                rows &= set(self._rows.get(name, ()))
+            if rows:
+                return sorted(rows)
+        name = names[0]
+        if name in self._rows:
+            return list(self._rows[name])
+        matches = self.prefix(name)
+        if not matches and fuzzy:
+            matches = self.fuzzy(name)
+        return self.rows_for_names(matches)
+
+
+class SamplePool:
+    """Covers of highly rated books, drawn at random for the login and signup pages.
+
+    The eligible rows (live books rated above min_rating) are picked once; each
+    draw only picks random positions and reads the cover and bookId of the
+    books drawn from the columns. With rotate_seconds set, carousel() returns
+    the same draw for everyone within a time window, so the page can be cached.
+    """
+
+    def __init__(self, covers, book_ids, ratings, live=None, min_rating=4.3, size=12, rotate_seconds=0, clock=time.time):
+        eligible = np.asarray(ratings, dtype=float) > min_rating
+        if live is not None:
+            eligible &= live
+        self.rows = np.flatnonzero(eligible)
+        self.rows.setflags(write=False)
+        self.covers = covers
+        self.book_ids = book_ids
+        self.size = size
+        self.rotate_seconds = rotate_seconds
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._carousel = (None, [])
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _pairs(self, positions):
+        return [(self.covers[row], self.book_ids[row]) for row in self.rows[list(positions)].tolist()]
+
+    def sample(self, rng=random):
+        if len(self) <= self.size:
+            return self._pairs(range(len(self)))
+        return self._pairs(rng.sample(range(len(self)), self.size))
+
+    # (window number, draw) for the current rotation window
+    def carousel(self):
+        window = int(self.clock() // self.rotate_seconds)
+        with self._lock:
+            if self._carousel[0] != window:
+                self._carousel = (window, self.sample(random.Random(window)))
+            return self._carousel
+
+    # Seconds until the carousel rotates
+    def seconds_left(self):
+        return int(self.rotate_seconds - self.clock() % self.rotate_seconds)
+
+
+class MappedColumn:
+    """A string column of a prebuilt search index, indexed like the column arrays
+    of a catalog loaded from the CSV: a row number gives one value, an array of
+    rows or a boolean mask gives an object array.
+
+    Values are decoded from the memory-mapped buffer when they are read, so
+    workers share the file's pages instead of each holding every string.
+    Missing values come back as NaN, as from the CSV. Values written by
+    catalog updates are kept in overrides, on top of the file.
+    """
+
+    def __init__(self, strings, size=None, overrides=None):
+        self.strings = strings
+        self.size = len(strings) if size is None else size
+        self.overrides = {} if overrides is None else overrides
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for row in range(self.size):
+            yield self.value(row)
+
+    def value(self, row):
+        if row in self.overrides:
+            return self.overrides[row]
+        if self.strings.missing is not None and self.strings.missing[row]:
+            return np.nan
+        return self.strings[row]
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            row = int(key) + self.size if key < 0 else int(key)
+            if not 0 <= row < self.size:
+                raise IndexError(f'row {key} is out of range for {self.size} rows')
+            return self.value(row)
+        if isinstance(key, slice):
+            rows = range(*key.indices(self.size))
+        else:
+            rows = np.asarray(key)
+            rows = np.flatnonzero(rows) if rows.dtype == bool else rows.astype(np.intp)
+            rows = np.where(rows < 0, rows + self.size, rows).tolist()
+        values = np.empty(len(rows), dtype=object)
+        values[:] = [self.value(row) for row in rows]
+        return values
+
+    # A column over size rows with values written at rows
+    def updated(self, size, rows, values):
+        overrides = dict(self.overrides)
+        overrides.update(zip(rows.tolist(), values))
+        return MappedColumn(self.strings, size, overrides)
+
+
+class _IndexRows:
+    """bookId -> row of a prebuilt search index, found by bisect over its sorted
+    bookIds, with the bookIds added or deleted since it was loaded kept in
+    changes. Used where a catalog loaded from the CSV keeps a dict.
+    """
+
+    def __init__(self, index, changes=None, size=None):
+        self.index = index
+        self.changes = {} if changes is None else changes
+        self.size = index.rows if size is None else size
+
+    def __len__(self):
+        return self.size
+
+    def get(self, book_id, default=None):
+        row = self.changes[book_id] if book_id in self.changes else self.index.row_for(book_id)
+        return default if row is None else row
+
+    def __contains__(self, book_id):
+        return self.get(book_id) is not None
+
+    def __getitem__(self, book_id):
+        row = self.get(book_id)
+        if row is None:
+            raise KeyError(book_id)
+        return row
+
+    def __setitem__(self, book_id, row):
+        if book_id not in self:
+            self.size += 1
+        self.changes[book_id] = row
+
+    def pop(self, book_id):
+        row = self[book_id]
+        self.changes[book_id] = None
+        self.size -= 1
+        return row
+
+    def copy(self):
+        return _IndexRows(self.index, dict(self.changes), self.size)
+
+
+class Catalog:
+    """Read-only access to the books by bookId.
+
+    The bookId -> row map is built once, so a lookup is a dict hit instead of
+    a scan over the DataFrame. Rows come back as BookRecord namedtuples, built
+    on demand from the column arrays. The arrays are read-only: the catalog is
+    shared by every request thread and never changes after it is built.
+    updated() returns a new catalog with changes applied instead.
+
+    Rows are stable across updates: a changed book keeps its row, new books
+    are appended and deleted books stay behind as tombstones (live is False),
+    so row positions held by the other indexes remain valid.
+
+    from_index() builds the catalog on a prebuilt search index instead: its
+    string columns stay memory-mapped and only the rows a request reads are
+    decoded.
+    """
+
+    def __init__(self, book_data):
+        self.columns = [name for name in book_data.columns if name.isidentifier()]
+        self.record_type = namedtuple('BookRecord', self.columns)
+        self._arrays = [book_data[name].to_numpy() for name in self.columns]
+        self.book_ids = book_data['bookId'].astype(str).to_numpy()
+        self.live = np.ones(len(self.book_ids), dtype=bool)
+        for array in self._arrays + [self.book_ids, self.live]:
+            array.setflags(write=False)
+        self._rows = {book_id: row for row, book_id in enumerate(self.book_ids)}
+        self.authors = AuthorIndex(book_data['author'])
+
+    @classmethod
+    def from_index(cls, index):
+        catalog = cls.__new__(cls)
+        catalog.columns = [name for name in index.manifest['columns'] if name.isidentifier()]
+        catalog.record_type = namedtuple('BookRecord', catalog.columns)
+        catalog._arrays = [MappedColumn(column) if isinstance(column, StringColumn) else column
+                           for column in (index.columns[name] for name in catalog.columns)]
+        catalog.book_ids = MappedColumn(index.columns['bookId'])
+        catalog.live = np.ones(index.rows, dtype=bool)
+        catalog.live.setflags(write=False)
+        catalog._rows = _IndexRows(index)
+        catalog.authors = AuthorIndex(catalog.column('author'))
+        return catalog
+
+    # Number of live books
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, book_id):
+        return book_id in self._rows
+
+    def column(self, name):
+        return self._arrays[self.columns.index(name)]
+
+    def row_for(self, book_id):
+        return self._rows.get(book_id)
+
+    def record(self, row):
+        return self.record_type._make(array[row] for array in self._arrays)
+
+    # The book with this id, or None
+    def get(self, book_id):
+        row = self._rows.get(book_id)
+        return None if row is None else self.record(row)
+
+    # Books for many ids in one call, in the given order; unknown ids are skipped
+    def get_many(self, book_ids):
+        rows = self._rows
+        return [self.record(rows[book_id]) for book_id in book_ids if book_id in rows]
+
+    def records(self, rows):
+        return [self.record(row) for row in rows]
+
+    # (catalog, changes) for this catalog with the upserts (a DataFrame with
+    # string bookIds) and deletions (bookIds) applied. changes.rows are the
+    # rows with new content, changes.removed the rows that became tombstones
+    def updated(self, upserts, deletions=()):
+        rows = self._rows.copy()
+        removed = [rows.pop(book_id) for book_id in dict.fromkeys(deletions) if book_id in rows]
+        size = len(self.book_ids)
+        upsert_rows = []
+        for book_id in upserts['bookId']:
+            if book_id not in rows:
+                rows[book_id] = size
+                size += 1
+            upsert_rows.append(rows[book_id])
+        upsert_rows = np.array(upsert_rows, dtype=np.intp)
+
+        upserts = upserts.reindex(columns=self.columns)
+        arrays = [_updated_column(array, size, upsert_rows, upserts[name].to_numpy())
+                  for name, array in zip(self.columns, self._arrays)]
+        book_ids = _updated_column(self.book_ids, size, upsert_rows, upserts['bookId'].to_numpy())
+        live = _updated_column(self.live, size, upsert_rows, np.ones(len(upsert_rows), dtype=bool))
+        live[removed] = False
+        for array in arrays + [book_ids, live]:
+            if isinstance(array, np.ndarray):
+                array.setflags(write=False)
+
+        changed = [row for row in upsert_rows.tolist() if row < len(self.book_ids)]
+        authors = self.column('author')
+        catalog = Catalog.__new__(Catalog)
+        catalog.columns = self.columns
+        catalog.record_type = self.record_type
+        catalog._arrays = arrays
+        catalog.book_ids = book_ids
+        catalog.live = live
+        catalog._rows = rows
+        catalog.authors = self.authors.updated({row: authors[row] for row in changed + removed},
+                                               dict(zip(upsert_rows.tolist(), upserts['author'])))
+        return catalog, CatalogChanges(np.unique(upsert_rows), np.array(sorted(removed), dtype=np.intp))
+
+
+CatalogChanges = namedtuple('CatalogChanges', ['rows', 'removed'])
+
+
+# Copy of a column grown to size, with values written at rows
+def _updated_column(array, size, rows, values):
+    if isinstance(array, MappedColumn):
+        return array.updated(size, rows, values)
+    column = np.empty(size, dtype=np.result_type(array.dtype, values.dtype))
+    column[:len(array)] = array
+    column[rows] = values
+    return column
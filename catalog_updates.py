@@ -0,0 +1,190 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+from embeddings import book_text
+from prefilter import CandidateRanker
+from scoring import text_column
+from search_index import tokenize
+
+
+logger = logging.getLogger(__name__)
+
+
+# Catalog deltas are JSON lines: {"upsert": {...a data.csv row...}} or {"delete": "<bookId>"}.
+# Later lines win, so a book upserted and then deleted in one file is deleted.
+DELTA_SUFFIX = '.jsonl'
+
+# Seconds between checks of CATALOG_DELTA_DIR for new delta files
+DEFAULT_POLL_SECONDS = 10
+
+CatalogDelta = namedtuple('CatalogDelta', ['upserts', 'deletions', 'digest'])
+
+# One consistent version of everything built from the catalog. ranker is None
+# until the first update, while the app's own lazily loaded ranker is current.
+CatalogSnapshot = namedtuple('CatalogSnapshot', ['generation', 'version', 'catalog', 'sample_pool', 'ranker', 'embedding_index', 'facets'])
+
+
+def make_delta(upserts=(), deletions=(), digest=''):
+    books = {}
+    for book in upserts:
+        books[str(book['bookId'])] = dict(book, bookId=str(book['bookId']))
+    deletions = [str(book_id) for book_id in deletions if str(book_id) not in books]
+    return CatalogDelta(pd.DataFrame(list(books.values()), columns=None if books else ['bookId']), deletions, digest)
+
+
+def read_delta(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    operations = {}
+    for number, line in enumerate(data.decode('utf-8').splitlines(), 1):
+        if not line.strip():
+            continue
+        entry = json.loads(line)
+        if 'upsert' in entry:
+            book = entry['upsert']
+            operations.pop(str(book['bookId']), None)
+            operations[str(book['bookId'])] = book
+        elif 'delete' in entry:
+            operations.pop(str(entry['delete']), None)
+            operations[str(entry['delete'])] = None
+        else:
+            raise ValueError(f'{path}:{number}: expected "upsert" or "delete"')
+    return make_delta([book for book in operations.values() if book is not None],
+                      [book_id for book_id, book in operations.items() if book is None],
+                      hashlib.sha1(data).hexdigest())
+
+
+# Token set of each row for the prefilter, as TokenIndex.from_columns builds them
+def row_tokens(scorer, rows):
+    return {row: set(tokenize(scorer.titles[row])) | set(tokenize(scorer.genres[row])) | set(tokenize(scorer.characters[row]))
+            for row in rows}
+
+
+# The ranker over the updated catalog: only the changed and removed rows are re-read and re-tokenized
+def updated_ranker(ranker, catalog, changes):
+    size = len(catalog.book_ids)
+    rows = np.concatenate([changes.rows, changes.removed])
+    values = [text_column(catalog.column(name)[changes.rows]).tolist() + [""] * len(changes.removed)
+              for name in ('title', 'genres', 'characters', 'description')]
+    scorer = ranker.scorer.updated(size, rows, *values)
+    token_index = ranker.token_index
+    if token_index is not None:
+        token_index = token_index.updated(size, row_tokens(ranker.scorer, rows[rows < len(ranker.scorer)]),
+                                          row_tokens(scorer, changes.rows))
+    return CandidateRanker(scorer, token_index, limit=ranker.limit, live=catalog.live)
+
+
+def updated_embeddings(embedding_index, catalog, changes):
+    texts = [book_text(*book) for book in zip(*(catalog.column(name)[changes.rows] for name in ('title', 'genres', 'description')))]
+    return embedding_index.updated(len(catalog.book_ids), changes.rows, texts, removed=changes.removed)
+
+
+def updated_facets(facets, catalog, changes):
+    values = [catalog.column(name)[changes.rows] for name in ('genres', 'rating', 'pages')]
+    return facets.updated(len(catalog.book_ids), changes.rows, *values, removed=changes.removed)
+
+
+class CatalogManager:
+    """Keeps the current catalog snapshot and swaps in updated ones.
+
+    apply() builds the next snapshot from the current one, touching only the
+    books in the delta, then publishes it with a single assignment. Requests
+    read current() once and use that snapshot throughout, so a search never
+    mixes two versions of the catalog. Updates run one at a time.
+    """
+
+    def __init__(self, catalog, build_sample_pool, load_ranker=None, embedding_index=None, facets=None, version=''):
+        self.build_sample_pool = build_sample_pool
+        self.load_ranker = load_ranker
+        self._snapshot = CatalogSnapshot(0, version, catalog, build_sample_pool(catalog), None, embedding_index, facets)
+        self._update_lock = threading.Lock()
+        self._poll_lock = threading.Lock()
+        self.next_poll = 0.0
+        self.applied = []
+        self.failed = {}
+        self.last_apply_seconds = 0.0
+
+    def current(self):
+        return self._snapshot
+
+    # The snapshot's ranker; before the first update that is the app's own, loaded on first use
+    def ranker(self, snapshot=None):
+        snapshot = snapshot or self._snapshot
+        if snapshot.ranker is None and self.load_ranker is not None:
+            return self.load_ranker()
+        return snapshot.ranker
+
+    def apply(self, delta, name=None):
+        with self._update_lock:
+            start = time.perf_counter()
+            base = self._snapshot
+            catalog, changes = base.catalog.updated(delta.upserts, delta.deletions)
+            ranker = self.ranker(base)
+            if ranker is not None:
+                ranker = updated_ranker(ranker, catalog, changes)
+            embedding_index = base.embedding_index
+            if embedding_index is not None:
+                embedding_index = updated_embeddings(embedding_index, catalog, changes)
+            facets = base.facets
+            if facets is not None:
+                facets = updated_facets(facets, catalog, changes)
+            version = hashlib.sha1(f'{base.version}:{delta.digest}'.encode()).hexdigest()[:16]
+            snapshot = CatalogSnapshot(base.generation + 1, version, catalog, self.build_sample_pool(catalog), ranker, embedding_index, facets)
+            self._snapshot = snapshot
+            self.applied.append(name or delta.digest)
+            self.last_apply_seconds = time.perf_counter() - start
+            return snapshot
+
+    # Apply the delta files in directory that have not been applied yet, in name order
+    def apply_pending(self, directory):
+        if not os.path.isdir(directory):
+            return []
+        applied = []
+        for name in sorted(os.listdir(directory)):
+            if not name.endswith(DELTA_SUFFIX) or name in self.applied or name in self.failed:
+                continue
+            # A bad file is recorded and skipped, never retried, and never stops the poll thread
+            try:
+                self.apply(read_delta(os.path.join(directory, name)), name)
+            except Exception as e:
+                logger.exception("catalog delta %s failed", name)
+                self.failed[name] = f'{type(e).__name__}: {e}'
+                continue
+            applied.append(name)
+        return applied
+
+    # Check directory for new deltas at most every interval seconds, applying them on a
+    # background thread. Cheap to call on every request; returns the thread if one started
+    def poll(self, directory, interval=DEFAULT_POLL_SECONDS):
+        now = time.monotonic()
+        if now < self.next_poll or not self._poll_lock.acquire(blocking=False):
+            return None
+        self.next_poll = now + interval
+
+        def run():
+            try:
+                self.apply_pending(directory)
+            finally:
+                self._poll_lock.release()
+
+        thread = threading.Thread(target=run, name='catalog-updates', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            'generation': snapshot.generation,
+            'version': snapshot.version,
+            'books': len(snapshot.catalog),
+            'tombstones': len(snapshot.catalog.book_ids) - len(snapshot.catalog),
+            'applied': list(self.applied),
+            'failed': dict(self.failed),
+            'last_apply_ms': self.last_apply_seconds * 1000,
+        }
@@ -1,3 +1,8 @@
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
 import mysql.connector
 
 # These details are available on the first MySQL Workbench screen
@@ -8,13 +13,180 @@ dbhost = "localhost"
 dbport = "3306"
 dbname = "BookSense"
 
-def getCursor():
-    connection = mysql.connector.connect(
+# Connection pool settings
+pool_size = int(os.environ.get('DB_POOL_SIZE', 5))
+pool_timeout = float(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+pool_recycle = float(os.environ.get('DB_POOL_RECYCLE', 3600))  # reconnect connections older than this
+
+
+def mysql_connection():
+    return mysql.connector.connect(
         user=dbuser,
         password=dbpass,
         host=dbhost,
+        port=int(dbport),
         database=dbname,
-        autocommit=True
+        autocommit=True,
+        buffered=True  # read results eagerly so a returned connection never has rows pending
     )
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    """Wraps a pooled connection so close() hands it back to the pool."""
+
+    def __init__(self, pool, connection, created):
+        self._pool = pool
+        self._connection = connection
+        self._created = created
+        self._closed = False
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._pool.release(self._connection, self._created)
+
+    # Close the underlying connection instead of reusing it, e.g. after an error
+    def invalidate(self):
+        if not self._closed:
+            self._closed = True
+            self._pool.discard(self._connection)
+
+
+class ConnectionPool:
+    """A fixed-size pool of database connections made by factory().
+
+    Connections are opened lazily up to size; when all are checked out,
+    acquire() waits up to timeout seconds for one to come back.
+    """
+
+    def __init__(self, factory, size=5, timeout=10, recycle=3600):
+        self.factory = factory
+        self.size = size
+        self.timeout = timeout
+        self.recycle = recycle
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        # Metrics
+        self.opened = 0
+        self.checkouts = 0
+        self.in_use = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self):
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f'No database connection free after {self.timeout}s')
+        waited = time.perf_counter() - start
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+
+        try:
+            try:
+                connection, created = self._idle.get_nowait()
+            except queue.Empty:
+                connection, created = self._open()
+            else:
+                if time.time() - created > self.recycle:
+                    self._discard(connection)
+                    connection, created = self._open()
+        except Exception:
+            self._checkin_slot()
+            raise
+        return PooledConnection(self, connection, created)
+
+    def _open(self):
+        connection = self.factory()
+        with self._lock:
+            self.opened += 1
+        return connection, time.time()
+
+    def _discard(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _checkin_slot(self):
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def discard(self, connection):
+        self._discard(connection)
+        self._checkin_slot()
+
+    def release(self, connection, created):
+        self._idle.put((connection, created))
+        self._checkin_slot()
+
+    @contextmanager
+    def cursor(self):
+        connection = self.acquire()
+        try:
+            cursor = connection.cursor()
+            yield connection, cursor
+            cursor.close()
+        except Exception:
+            # The connection may be broken, don't hand it to the next request
+            connection.invalidate()
+            raise
+        finally:
+            connection.close()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'opened': self.opened,
+                'in_use': self.in_use,
+                'idle': self._idle.qsize(),
+                'checkouts': self.checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': self.total_wait * 1000 / self.checkouts if self.checkouts else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ConnectionPool(mysql_connection, size=pool_size, timeout=pool_timeout, recycle=pool_recycle)
+        return _pool
+
+
+# Use a different pool, e.g. a local SQLite stand-in for tests
+def set_pool(pool):
+    global _pool
+    with _pool_lock:
+        _pool = pool
+
+
+# with db_cursor() as (connection, cursor): ... returns the connection to the pool afterwards
+def db_cursor():
+    return get_pool().cursor()
+
+
+def getCursor():
+    connection = get_pool().acquire()
     dbconn = connection.cursor()
     return connection, dbconn
@@ -44,7 +44,13 @@ CREATE TABLE `wishlist` (
   `CoverImg` VARCHAR(255),  -- To store the URL of the book's cover image
   `AddedDate` TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
   PRIMARY KEY (`WishlistId`),
+  UNIQUE KEY `UserBook` (`UserId`, `BookId`),
   KEY `UserId` (`UserId`),
   CONSTRAINT `FK_Wishlist_User` FOREIGN KEY (`UserId`) REFERENCES `users` (`UserId`) ON DELETE CASCADE ON UPDATE CASCADE
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_0900_ai_ci;
 
+
+-- Migration for an existing wishlist table: drop duplicate entries, then add the unique key
+-- DELETE w1 FROM wishlist w1 JOIN wishlist w2
+--   ON w1.UserId = w2.UserId AND w1.BookId = w2.BookId AND w1.WishlistId > w2.WishlistId;
+-- ALTER TABLE wishlist ADD UNIQUE KEY `UserBook` (`UserId`, `BookId`);
@@ -0,0 +1,175 @@
+import argparse
+import json
+import os
+import threading
+import time
+import numpy as np
+import pandas as pd
+from search_index import DEFAULT_CSV_PATH
+
+
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+DEFAULT_EMBEDDINGS_PATH = 'search_embeddings'
+
+# int8 embeddings are the float vectors (unit length) times this
+INT8_SCALE = 127.0
+
+# Rows converted to float32 at a time when scoring int8 embeddings
+CHUNK_ROWS = 8192
+
+
+# Text embedded for each book
+def book_text(title, genres, description):
+    parts = [str(value) for value in (title, genres, description) if pd.notna(value)]
+    return ' '.join(parts)
+
+
+# The sentence-transformers model is only imported and loaded when first needed
+_models = {}
+_models_lock = threading.Lock()
+
+
+def load_model(model_name=DEFAULT_MODEL):
+    with _models_lock:
+        if model_name not in _models:
+            from sentence_transformers import SentenceTransformer
+            _models[model_name] = SentenceTransformer(model_name, device='cpu')
+        return _models[model_name]
+
+
+def encode(texts, model_name=DEFAULT_MODEL, batch_size=64):
+    model = load_model(model_name)
+    return model.encode(texts, batch_size=batch_size, normalize_embeddings=True, convert_to_numpy=True).astype(np.float32)
+
+
+def quantize_int8(vectors):
+    return np.clip(np.rint(vectors * INT8_SCALE), -127, 127).astype(np.int8)
+
+
+def build_embeddings(csv_path=DEFAULT_CSV_PATH, out_path=DEFAULT_EMBEDDINGS_PATH, model_name=DEFAULT_MODEL, quantize=False, batch_size=64):
+    book_data = pd.read_csv(csv_path, usecols=['bookId', 'title', 'genres', 'description'])
+    texts = [book_text(*row) for row in zip(book_data['title'], book_data['genres'], book_data['description'])]
+    vectors = encode(texts, model_name=model_name, batch_size=batch_size)
+    if quantize:
+        vectors = quantize_int8(vectors)
+
+    os.makedirs(out_path, exist_ok=True)
+    np.save(os.path.join(out_path, 'embeddings.npy'), vectors)
+    meta = {
+        'model': model_name,
+        'rows': len(vectors),
+        'dims': int(vectors.shape[1]),
+        'dtype': str(vectors.dtype),
+    }
+    with open(os.path.join(out_path, 'embeddings.json'), 'w') as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class EmbeddingIndex:
+    """Memory-mapped book embeddings, searched with one matrix-vector product.
+
+    Catalog updates never touch the mapped vectors: re-embedded and new books
+    go into a small in-memory overlay (overlay_rows are their rows), and
+    deleted books are dropped by the live mask, like the ranker's.
+    """
+
+    def __init__(self, vectors, model_name=DEFAULT_MODEL, size=None, overlay=None, overlay_rows=None, live=None):
+        self.vectors = vectors
+        self.model_name = model_name
+        self.size = len(vectors) if size is None else size
+        self.overlay = np.empty((0, vectors.shape[1]), dtype=vectors.dtype) if overlay is None else overlay
+        self.overlay_rows = np.empty(0, dtype=np.intp) if overlay_rows is None else overlay_rows
+        self.live = live
+
+    @classmethod
+    def load(cls, path=DEFAULT_EMBEDDINGS_PATH):
+        with open(os.path.join(path, 'embeddings.json')) as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(path, 'embeddings.npy'), mmap_mode='r')
+        return cls(vectors, model_name=meta['model'])
+
+    def __len__(self):
+        return self.size
+
+    def embed(self, text):
+        return encode([text], model_name=self.model_name)[0]
+
+    # A new index over size books, with the books at rows re-embedded from texts
+    # and the rows in removed marked deleted. The mapped vectors are shared, not
+    # copied; only the overlay and the live mask are new
+    def updated(self, size, rows, texts, removed=()):
+        rows = np.asarray(rows, dtype=np.intp)
+        keep = ~np.isin(self.overlay_rows, rows)
+        encoded = np.empty((0, self.vectors.shape[1]), dtype=self.vectors.dtype)
+        if len(rows):
+            encoded = encode(list(texts), model_name=self.model_name)
+            encoded = quantize_int8(encoded) if self.vectors.dtype == np.int8 else encoded
+        overlay = np.concatenate([self.overlay[keep], encoded])
+        overlay_rows = np.concatenate([self.overlay_rows[keep], rows])
+        live = np.ones(size, dtype=bool)
+        if self.live is not None:
+            live[:len(self.live)] = self.live
+        live[np.asarray(removed, dtype=np.intp)] = False
+        live[rows] = True
+        for array in (overlay, overlay_rows, live):
+            array.setflags(write=False)
+        return EmbeddingIndex(self.vectors, model_name=self.model_name, size=size,
+                              overlay=overlay, overlay_rows=overlay_rows, live=live)
+
+    def _similarities(self, vectors, query_vector):
+        if vectors.dtype == np.float32:
+            return vectors @ query_vector
+        # int8: convert a chunk at a time so we never hold a float copy of the whole matrix
+        scores = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), CHUNK_ROWS):
+            chunk = np.asarray(vectors[start:start + CHUNK_ROWS], dtype=np.float32)
+            scores[start:start + CHUNK_ROWS] = chunk @ query_vector
+        return scores / INT8_SCALE
+
+    # Cosine similarity of every book with the query vector, the overlay's
+    # vectors taking the place of the mapped ones for their rows
+    def similarities(self, query_vector):
+        scores = self._similarities(self.vectors, query_vector)
+        if self.size == len(self.vectors) and not len(self.overlay_rows):
+            return scores
+        merged = np.zeros(self.size, dtype=scores.dtype)
+        merged[:len(scores)] = scores
+        merged[self.overlay_rows] = self._similarities(self.overlay, query_vector)
+        return merged
+
+    # Row positions and similarities of the k closest books, best first.
+    # Only rows where live is True are returned, when live is given, and
+    # never books deleted by an update
+    def search(self, text, k=15, live=None):
+        scores = self.similarities(self.embed(text))
+        if self.live is not None:
+            live = self.live if live is None else live & self.live
+        if live is not None:
+            scores = np.where(live, scores, -np.inf)
+            k = min(k, int(live.sum()))
+        k = min(k, len(scores))
+        if k == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+        rows = np.argpartition(-scores, k - 1)[:k]
+        rows = rows[np.argsort(-scores[rows], kind='stable')]
+        return rows, scores[rows]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Embed every book for semantic search.')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH, help='catalog CSV to embed')
+    parser.add_argument('--out', default=DEFAULT_EMBEDDINGS_PATH, help='directory to write embeddings.npy to')
+    parser.add_argument('--model', default=DEFAULT_MODEL, help='sentence-transformers model name')
+    parser.add_argument('--int8', action='store_true', help='store int8-quantized embeddings')
+    parser.add_argument('--batch-size', type=int, default=64)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    meta = build_embeddings(args.csv, args.out, model_name=args.model, quantize=args.int8, batch_size=args.batch_size)
+    print(f"Embedded {meta['rows']} books ({meta['dims']} dims, {meta['dtype']}) into {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+import math
+import re
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+
+# Names in a stringified genres list: "['Fantasy', \"Children's\"]" -> ['Fantasy', "Children's"]
+GENRE_PATTERN = re.compile(r"'([^'\\]*(?:\\.[^'\\]*)*)'|\"([^\"\\]*(?:\\.[^\"\\]*)*)\"")
+
+FacetBucket = namedtuple('FacetBucket', ['key', 'label', 'low', 'high'])
+
+# Ratings and page counts fall in [low, high); books without one are in no bucket
+RATING_BUCKETS = (
+    FacetBucket('4.5', '4.5 and up', 4.5, math.inf),
+    FacetBucket('4', '4 to 4.5', 4.0, 4.5),
+    FacetBucket('3.5', '3.5 to 4', 3.5, 4.0),
+    FacetBucket('0', 'Under 3.5', -math.inf, 3.5),
+)
+PAGE_BUCKETS = (
+    FacetBucket('short', 'Under 200 pages', 0, 200),
+    FacetBucket('medium', '200 to 400 pages', 200, 400),
+    FacetBucket('long', '400 to 600 pages', 400, 600),
+    FacetBucket('epic', '600 pages and up', 600, math.inf),
+)
+
+# Genres listed with counts on the results and author pages
+DEFAULT_TOP_GENRES = 12
+
+# Set bits in each byte value
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+
+def parse_genres(value):
+    if not isinstance(value, str):
+        return []
+    names = (single or double for single, double in GENRE_PATTERN.findall(value))
+    return [name.strip() for name in names if name.strip()]
+
+
+def numeric(values):
+    return pd.to_numeric(pd.Series(values, dtype=object), errors='coerce').to_numpy(dtype=float)
+
+
+def _unique(values):
+    return tuple(dict.fromkeys(values))
+
+
+class FacetFilter(namedtuple('FacetFilter', ['genres', 'ratings', 'pages'])):
+    """Facet values picked by the user. A book must have every selected genre,
+    and be in one of the selected rating buckets and one of the selected page
+    buckets. An empty filter is falsy and matches every book.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, genres=(), ratings=(), pages=()):
+        return super().__new__(cls, tuple(genres), tuple(ratings), tuple(pages))
+
+    def __bool__(self):
+        return any(len(values) for values in self)
+
+    # From request arguments: genre (repeated or comma-separated), rating and pages
+    # (bucket keys). Unknown bucket keys are dropped
+    @classmethod
+    def from_args(cls, args):
+        genres = [name.strip() for value in args.getlist('genre') for name in value.split(',') if name.strip()]
+        ratings = [key for key in args.getlist('rating') if key in {bucket.key for bucket in RATING_BUCKETS}]
+        pages = [key for key in args.getlist('pages') if key in {bucket.key for bucket in PAGE_BUCKETS}]
+        return cls(_unique(genres), _unique(ratings), _unique(pages))
+
+    # Request arguments for url_for
+    def to_args(self):
+        return {'genre': list(self.genres), 'rating': list(self.ratings), 'pages': list(self.pages)}
+
+    # This filter with one more value selected, or deselected if it already was
+    def toggled(self, facet, value):
+        values = getattr(self, facet)
+        values = tuple(v for v in values if v != value) if value in values else values + (value,)
+        return self._replace(**{facet: values})
+
+    # The selected values as shown to users
+    def labels(self):
+        ratings = [bucket.label for bucket in RATING_BUCKETS if bucket.key in self.ratings]
+        pages = [bucket.label for bucket in PAGE_BUCKETS if bucket.key in self.pages]
+        return list(self.genres) + ratings + pages
+
+    # Order-independent form, for cache keys
+    def key(self):
+        return [sorted(name.casefold() for name in self.genres), sorted(self.ratings), sorted(self.pages)]
+
+
+def _set_bits(bits, rows):
+    rows = np.asarray(rows, dtype=np.intp)
+    np.bitwise_or.at(bits, rows >> 3, (0x80 >> (rows & 7)).astype(np.uint8))
+
+
+def _clear_bits(matrix, rows):
+    rows = np.asarray(rows, dtype=np.intp)
+    masks = ~(0x80 >> (rows & 7)).astype(np.uint8)
+    np.bitwise_and.at(matrix, (slice(None), rows >> 3), masks)
+
+
+def _bucket_rows(values, bucket):
+    return np.flatnonzero((values >= bucket.low) & (values < bucket.high))
+
+
+class FacetIndex:
+    """One bitmap per genre, rating bucket and page-count bucket over the catalog rows.
+
+    The genres strings are parsed once, here. Bitmaps are packed 8 rows to a
+    byte, so a filter is a few vectorized ANDs over size / 8 bytes, and facet
+    counts are a byte popcount over the bytes a bitmap has set. Rows match
+    the catalog's, deleted books included: the live bitmap masks them out.
+    """
+
+    def __init__(self, genres, ratings, pages, live=None):
+        size = len(genres)
+        parsed = [parse_genres(value) for value in genres]
+        self._build(size, sorted({name for names in parsed for name in names}))
+        self._write(np.arange(size), parsed, numeric(ratings), numeric(pages))
+        self.live_bits = np.packbits(np.ones(size, dtype=bool) if live is None else np.asarray(live, dtype=bool))
+        self._freeze()
+
+    @classmethod
+    def from_catalog(cls, catalog):
+        return cls(catalog.column('genres'), catalog.column('rating'), catalog.column('pages'), live=catalog.live)
+
+    # From a data.csv frame; books without a rating or pages column are in no bucket
+    @classmethod
+    def from_frame(cls, book_data):
+        missing = pd.Series(np.nan, index=book_data.index)
+        return cls(book_data['genres'], book_data.get('rating', missing), book_data.get('pages', missing))
+
+    def _build(self, size, genres):
+        nbytes = (size + 7) // 8
+        self.size = size
+        self.genres = genres
+        self._genre_positions = {name.casefold(): position for position, name in enumerate(genres)}
+        self.genre_bits = np.zeros((len(genres), nbytes), dtype=np.uint8)
+        self.rating_bits = np.zeros((len(RATING_BUCKETS), nbytes), dtype=np.uint8)
+        self.page_bits = np.zeros((len(PAGE_BUCKETS), nbytes), dtype=np.uint8)
+
+    # Set the bits of rows (an array) from their parsed genres, ratings and page counts
+    def _write(self, rows, genres, ratings, pages):
+        genre_rows = {}
+        for row, names in zip(rows.tolist(), genres):
+            for name in names:
+                genre_rows.setdefault(name, []).append(row)
+        for name, name_rows in genre_rows.items():
+            _set_bits(self.genre_bits[self._genre_positions[name.casefold()]], name_rows)
+        for bits, buckets, values in ((self.rating_bits, RATING_BUCKETS, ratings), (self.page_bits, PAGE_BUCKETS, pages)):
+            for position, bucket in enumerate(buckets):
+                _set_bits(bits[position], rows[_bucket_rows(values, bucket)])
+
+    # Shared by concurrent searches, so nothing may write to them
+    def _freeze(self):
+        for array in (self.genre_bits, self.rating_bits, self.page_bits, self.live_bits):
+            array.setflags(write=False)
+
+    # A new index over size rows, with the books at rows re-filed from their new
+    # genres, ratings and pages and the removed rows dropped. Genres that lose
+    # their last book stay in the vocabulary with an empty bitmap
+    def updated(self, size, rows, genres, ratings, pages, removed=()):
+        rows = np.asarray(rows, dtype=np.intp)
+        removed = np.asarray(removed, dtype=np.intp)
+        parsed = [parse_genres(value) for value in genres]
+        index = FacetIndex.__new__(FacetIndex)
+        index._build(size, sorted(set(self.genres).union(*parsed)))
+        nbytes = (self.size + 7) // 8
+        index.genre_bits[[index._genre_positions[name.casefold()] for name in self.genres], :nbytes] = self.genre_bits
+        index.rating_bits[:, :nbytes] = self.rating_bits
+        index.page_bits[:, :nbytes] = self.page_bits
+        touched = np.concatenate([rows, removed])
+        for bits in (index.genre_bits, index.rating_bits, index.page_bits):
+            _clear_bits(bits, touched)
+        index._write(rows, parsed, numeric(ratings), numeric(pages))
+        live = np.zeros((1, (size + 7) // 8), dtype=np.uint8)
+        live[0, :nbytes] = self.live_bits
+        _clear_bits(live, removed)
+        _set_bits(live[0], rows)
+        index.live_bits = live[0]
+        index._freeze()
+        return index
+
+    def _genre_bits(self, name):
+        position = self._genre_positions.get(name.strip().casefold())
+        return self.genre_bits[position] if position is not None else np.zeros_like(self.live_bits)
+
+    # Packed bitmap of the live books matching the filter
+    def mask(self, facet_filter):
+        bits = self.live_bits.copy()
+        for name in facet_filter.genres:
+            bits &= self._genre_bits(name)
+        for selected, buckets, matrix in ((facet_filter.ratings, RATING_BUCKETS, self.rating_bits),
+                                          (facet_filter.pages, PAGE_BUCKETS, self.page_bits)):
+            positions = [position for position, bucket in enumerate(buckets) if bucket.key in selected]
+            if positions:
+                bits &= np.bitwise_or.reduce(matrix[positions], axis=0)
+        return bits
+
+    # Boolean array over the rows: True where the book matches the filter
+    def allowed(self, facet_filter):
+        return np.unpackbits(self.mask(facet_filter), count=self.size).view(bool)
+
+    # Packed bitmap of these rows
+    def bitmap(self, rows):
+        bits = np.zeros_like(self.live_bits)
+        _set_bits(bits, rows)
+        return bits
+
+    def count(self, bits):
+        return int(POPCOUNT[bits].sum(dtype=np.int64))
+
+    # Books in bits per facet value: {'total': n, 'genres': [(name, n)] for the
+    # top_genres most common genres, 'ratings' and 'pages': [(bucket, n)]}.
+    # Only the bytes set in bits are read
+    def counts(self, bits, top_genres=DEFAULT_TOP_GENRES):
+        columns = np.flatnonzero(bits)
+        bits = bits[columns]
+
+        def facet_counts(matrix):
+            return POPCOUNT[matrix[:, columns] & bits].sum(axis=1, dtype=np.int64)
+
+        genre_counts = facet_counts(self.genre_bits)
+        top = [position for position in np.argsort(-genre_counts, kind='stable')[:top_genres] if genre_counts[position]]
+        return {
+            'total': int(POPCOUNT[bits].sum(dtype=np.int64)),
+            'genres': [(self.genres[position], int(genre_counts[position])) for position in top],
+            'ratings': list(zip(RATING_BUCKETS, facet_counts(self.rating_bits).tolist())),
+            'pages': list(zip(PAGE_BUCKETS, facet_counts(self.page_bits).tolist())),
+        }
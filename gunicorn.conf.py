@@ -0,0 +1,36 @@
+# Production server settings: gunicorn -c gunicorn.conf.py 'app:create_app()'
+#
+# gthread workers serve several requests per process on threads. The catalog,
+# search index and scorer are built once per process and only read afterwards,
+# so the threads share them without locking.
+import glob
+import os
+import tempfile
+
+
+bind = os.environ.get('GUNICORN_BIND', '127.0.0.1:8000')
+worker_class = 'gthread'
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+
+# With MODEL_LOADING=preload the models load once in the master and the workers
+# share those pages after the fork. The other modes start loading threads,
+# which do not survive a fork, so each worker then builds its own app.
+preload_app = os.environ.get('MODEL_LOADING') == 'preload'
+
+# /metrics adds up the histograms of every worker: each writes its own to
+# PROMETHEUS_MULTIPROC_DIR (see metrics.MetricsRegistry). Counts from a previous
+# run are cleared at startup, and an exited worker's are kept under a name a
+# new worker reusing its pid will not overwrite.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', os.path.join(tempfile.gettempdir(), 'booksense-metrics'))
+
+
+def on_starting(server):
+    for path in glob.glob(os.path.join(os.environ['PROMETHEUS_MULTIPROC_DIR'], 'metrics-*.json')):
+        os.remove(path)
+
+
+def child_exit(server, worker):
+    from metrics import mark_process_dead
+    mark_process_dead(worker.pid, os.environ['PROMETHEUS_MULTIPROC_DIR'])
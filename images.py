@@ -0,0 +1,197 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+
+# Outside static/, so they are only served by the app's route with immutable cache headers
+DEFAULT_IMAGE_DIR = 'profile_images'
+
+# Edge of the square thumbnails, in pixels (the profile page shows them at 100px)
+DEFAULT_SIZE = 256
+
+# Uploads over this many bytes or pixels are refused before any decoding
+MAX_UPLOAD_BYTES = 20 * 1024 * 1024
+MAX_PIXELS = 50_000_000
+
+# Encoded thumbnails: file extension -> Pillow format and save options
+FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+# Content keys are the SHA-256 of the uploaded bytes
+KEY_PATTERN = re.compile(r'[0-9a-f]{64}')
+THUMBNAIL_PATTERN = re.compile(r'([0-9a-f]{64})-(\d+)\.(webp|jpg)')
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def content_key(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_content_key(value):
+    return bool(value) and KEY_PATTERN.fullmatch(value) is not None
+
+
+def thumbnail_name(key, size, extension):
+    return f'{key}-{size}.{extension}'
+
+
+# Check that data is an image we will decode, reading only its header
+def check_image(data, max_bytes=MAX_UPLOAD_BYTES, max_pixels=MAX_PIXELS):
+    if len(data) > max_bytes:
+        raise InvalidImage(f'images can be at most {max_bytes // (1024 * 1024)} MB')
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            width, height = image.size
+    except (UnidentifiedImageError, OSError) as e:
+        raise InvalidImage('not a supported image') from e
+    if width * height > max_pixels:
+        raise InvalidImage(f'images can be at most {max_pixels // 1_000_000} megapixels')
+
+
+# Square thumbnails of the image, upright and center-cropped: extension -> bytes
+def make_thumbnails(data, size=DEFAULT_SIZE):
+    with Image.open(io.BytesIO(data)) as image:
+        image.draft('RGB', (size, size))  # JPEGs decode at a reduced scale, much faster for phone photos
+        image = ImageOps.exif_transpose(image)
+        if image.mode != 'RGB':
+            background = Image.new('RGB', image.size, 'white')
+            image = image.convert('RGBA')
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        image = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    encoded = {}
+    for extension, (image_format, options) in FORMATS.items():
+        out = io.BytesIO()
+        image.save(out, image_format, **options)
+        encoded[extension] = out.getvalue()
+    return encoded
+
+
+def write_atomic(path, data):
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class ProfileImageStore:
+    """Thumbnails of uploaded profile images, stored under the upload's content hash.
+
+    submit() checks the upload and returns its key straight away; decoding,
+    resizing and encoding happen on a background thread, and on_ready(key) is
+    called once the thumbnails exist, so callers only switch to an image that
+    could be processed. Failures are logged. An image that was uploaded before
+    (by anyone) is not processed again. Thumbnail files never change once
+    written, so they can be cached forever.
+    """
+
+    def __init__(self, directory=DEFAULT_IMAGE_DIR, size=DEFAULT_SIZE, workers=1):
+        self.directory = os.path.abspath(directory)
+        self.size = size
+        os.makedirs(self.directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='images')
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.processed = 0
+        self.duplicates = 0
+        self.failed = 0
+        self.total_seconds = 0.0
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, thumbnail_name(key, self.size, extension))
+
+    def exists(self, key):
+        return all(os.path.exists(self.path(key, extension)) for extension in FORMATS)
+
+    # Key of the upload; raises InvalidImage for anything we won't process.
+    # on_ready(key) runs when the thumbnails are written, on the processing
+    # thread, or right away on the caller's thread if they already were; it is
+    # not called if they fail, and its own errors are logged, not raised
+    def submit(self, data, on_ready=None):
+        check_image(data)
+        key = content_key(data)
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None and not self.exists(key):
+                future = self._pending[key] = self._executor.submit(self._process, key, data)
+            else:
+                self.duplicates += 1
+        if on_ready is not None:
+            if future is None:
+                self._ready(key, on_ready)
+            else:
+                future.add_done_callback(lambda done: self._notify(key, done, on_ready))
+        return key
+
+    @classmethod
+    def _notify(cls, key, future, on_ready):
+        if future.exception() is None:
+            cls._ready(key, on_ready)
+
+    @staticmethod
+    def _ready(key, on_ready):
+        try:
+            on_ready(key)
+        except Exception:
+            logger.exception("on_ready for %s failed", key)
+
+    def _process(self, key, data):
+        start = time.perf_counter()
+        try:
+            for extension, encoded in make_thumbnails(data, self.size).items():
+                write_atomic(self.path(key, extension), encoded)
+        except Exception:
+            # Logged here, or the error would only live in the Future
+            logger.exception("thumbnails for %s failed", key)
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+        with self._lock:
+            self.processed += 1
+            self.total_seconds += time.perf_counter() - start
+
+    # Wait for a key submitted to this process to be written; False if it
+    # is unknown here or failed
+    def wait(self, key, timeout=None):
+        with self._lock:
+            future = self._pending.get(key)
+        if future is None:
+            return self.exists(key)
+        try:
+            future.result(timeout=timeout)
+        except Exception:
+            return False
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'pending': len(self._pending),
+                'processed': self.processed,
+                'duplicates': self.duplicates,
+                'failed': self.failed,
+                'avg_ms': self.total_seconds * 1000 / self.processed if self.processed else 0.0,
+            }
@@ -0,0 +1,140 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+import numpy as np
+
+
+DEFAULT_INTENTS_PATH = 'BookData/intents.json'
+
+# Lowest cosine similarity for the TF-IDF fallback to accept a pattern
+DEFAULT_THRESHOLD = 0.75
+
+# Longer inputs only match a pattern exactly; they are real book queries
+MAX_FALLBACK_TOKENS = 8
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+IntentMatch = namedtuple('IntentMatch', ['tag', 'kind', 'method', 'score', 'response'])
+
+
+def intent_tokens(text):
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+# Conversational intents answer with text; genre intents list books (dicts)
+def intent_kind(intent):
+    responses = intent.get('responses') or []
+    return 'conversation' if responses and all(isinstance(response, str) for response in responses) else 'genre'
+
+
+class IntentClassifier:
+    """Matches user input against the patterns in intents.json.
+
+    An input whose normalized tokens equal a pattern's is found in a dict.
+    Otherwise short inputs are compared with every pattern by TF-IDF cosine
+    similarity, and the closest pattern counts if it reaches threshold.
+    """
+
+    def __init__(self, intents, threshold=DEFAULT_THRESHOLD, max_fallback_tokens=MAX_FALLBACK_TOKENS):
+        self.threshold = threshold
+        self.max_fallback_tokens = max_fallback_tokens
+        self.intents = {intent['tag']: intent for intent in intents}
+        self.kinds = {tag: intent_kind(intent) for tag, intent in self.intents.items()}
+
+        self.exact = {}
+        pattern_tokens = []
+        pattern_tags = []
+        for intent in intents:
+            for pattern in intent['patterns']:
+                tokens = intent_tokens(pattern)
+                if tokens:
+                    self.exact.setdefault(' '.join(tokens), intent['tag'])
+                    pattern_tokens.append(tokens)
+                    pattern_tags.append(intent['tag'])
+        self.pattern_tags = pattern_tags
+
+        # TF-IDF matrix of the patterns, one L2-normalized row each
+        self.vocabulary = {token: i for i, token in enumerate(sorted({t for tokens in pattern_tokens for t in tokens}))}
+        document_counts = np.zeros(len(self.vocabulary))
+        for tokens in pattern_tokens:
+            for token in set(tokens):
+                document_counts[self.vocabulary[token]] += 1
+        self.idf = np.log((1 + len(pattern_tokens)) / (1 + document_counts)) + 1
+        self.unseen_idf = math.log(1 + len(pattern_tokens)) + 1
+        self.matrix = np.array([self._vector(tokens) for tokens in pattern_tokens]).reshape(len(pattern_tokens), len(self.vocabulary))
+
+        self._lock = threading.Lock()
+        self.counts = {'exact': 0, 'similar': 0, 'none': 0}
+        self.tags = {}
+        self.total_seconds = 0.0
+
+    @classmethod
+    def from_file(cls, path=DEFAULT_INTENTS_PATH, **kwargs):
+        with open(path) as f:
+            return cls(json.load(f)['intents'], **kwargs)
+
+    # L2-normalized TF-IDF vector over the pattern vocabulary. Tokens no
+    # pattern uses get the idf of an unseen word: they are not in the vector
+    # but still count in its norm, so they lower the similarity.
+    def _vector(self, tokens):
+        vector = np.zeros(len(self.vocabulary))
+        unknown = Counter()
+        for token in tokens:
+            i = self.vocabulary.get(token)
+            if i is None:
+                unknown[token] += 1
+            else:
+                vector[i] += 1
+        vector *= self.idf
+        norm = math.sqrt(vector @ vector + sum((count * self.unseen_idf) ** 2 for count in unknown.values()))
+        return vector / norm if norm else vector
+
+    # (tag, method, score) of the best pattern, or None
+    def _match(self, tokens):
+        tag = self.exact.get(' '.join(tokens))
+        if tag is not None:
+            return tag, 'exact', 1.0
+        if not tokens or len(tokens) > self.max_fallback_tokens or not len(self.matrix):
+            return None
+        similarities = self.matrix @ self._vector(tokens)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            return None
+        return self.pattern_tags[best], 'similar', float(similarities[best])
+
+    def classify(self, text, rng=random):
+        start = time.perf_counter()
+        match = self._match(intent_tokens(text))
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.total_seconds += elapsed
+            self.counts['none' if match is None else match[1]] += 1
+            if match is not None:
+                self.tags[match[0]] = self.tags.get(match[0], 0) + 1
+        if match is None:
+            return None
+        tag, method, score = match
+        kind = self.kinds[tag]
+        response = rng.choice(self.intents[tag]['responses']) if kind == 'conversation' else None
+        return IntentMatch(tag, kind, method, score, response)
+
+    def stats(self):
+        with self._lock:
+            total = sum(self.counts.values())
+            matched = total - self.counts['none']
+            answered = sum(count for tag, count in self.tags.items() if self.kinds[tag] == 'conversation')
+            return {
+                'patterns': len(self.pattern_tags),
+                'classified': total,
+                'matched': matched,
+                'match_rate': matched / total if total else 0.0,
+                'answered': answered,
+                'genre_shortcuts': matched - answered,
+                'by_method': dict(self.counts),
+                'by_tag': dict(self.tags),
+                'avg_us': self.total_seconds * 1e6 / total if total else 0.0,
+            }
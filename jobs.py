@@ -0,0 +1,127 @@
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """One recommendation request and its progress through the pipeline."""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'
+        self.stage = None
+        self.timings = {}
+        self.result = None
+        self.error = None
+        self.created = time.time()
+
+    # Time a pipeline stage; the elapsed seconds land in job.timings
+    @contextmanager
+    def timed(self, name):
+        self.stage = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'stage': self.stage,
+            'timings_ms': {name: seconds * 1000 for name, seconds in self.timings.items()},
+            'error': self.error,
+        }
+
+
+class JobQueue:
+    """Runs jobs on a bounded thread pool and keeps their results server-side.
+
+    At most max_pending jobs can be queued or running at once; submit() raises
+    QueueFull beyond that. Finished jobs are kept until max_finished newer ones
+    have completed.
+    """
+
+    def __init__(self, handler, workers=1, max_pending=32, max_finished=1000):
+        self.handler = handler
+        self.workers = workers
+        self.max_pending = max_pending
+        self.max_finished = max_finished
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='recommend')
+        self._lock = threading.Lock()
+        self._active = {}
+        self._finished = OrderedDict()
+        self._running = 0
+        # Totals per stage, for average timings
+        self._stage_totals = {}
+        self._stage_counts = {}
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+
+    def submit(self, *args):
+        with self._lock:
+            if len(self._active) >= self.max_pending:
+                self.rejected += 1
+                raise QueueFull(f'{len(self._active)} jobs already pending')
+            job = Job(secrets.token_urlsafe(12))
+            self._active[job.id] = job
+        self._executor.submit(self._run, job, args)
+        return job
+
+    def _run(self, job, args):
+        with self._lock:
+            self._running += 1
+        job.status = 'running'
+        start = time.perf_counter()
+        try:
+            job.result = self.handler(job, *args)
+            status = 'done'
+        except Exception as e:
+            job.error = str(e)
+            status = 'failed'
+        job.timings['total'] = time.perf_counter() - start
+        job.stage = None
+
+        with self._lock:
+            # Publish the status only once the job is in the finished store
+            job.status = status
+            self._running -= 1
+            del self._active[job.id]
+            self._finished[job.id] = job
+            while len(self._finished) > self.max_finished:
+                self._finished.popitem(last=False)
+            if status == 'done':
+                self.completed += 1
+            else:
+                self.failed += 1
+            for name, seconds in job.timings.items():
+                self._stage_totals[name] = self._stage_totals.get(name, 0.0) + seconds
+                self._stage_counts[name] = self._stage_counts.get(name, 0) + 1
+
+    def get(self, job_id):
+        with self._lock:
+            return self._active.get(job_id) or self._finished.get(job_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'queued': len(self._active) - self._running,
+                'running': self._running,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'avg_stage_ms': {name: self._stage_totals[name] * 1000 / self._stage_counts[name] for name in self._stage_totals},
+            }
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
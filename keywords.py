@@ -0,0 +1,53 @@
+import threading
+import spacy
+from rake_nltk import Rake
+
+
+# Common entity types to extract
+ENTITY_LABELS = {'PERSON', 'ORG', 'GPE', 'LOC', 'PRODUCT', 'DATE', 'TIME', 'MONEY', 'PERCENT', 'QUANTITY', 'EVENT', 'WORK_OF_ART'}
+
+# Only doc.ents is used, and en_core_web_sm's NER has its own tok2vec
+UNUSED_COMPONENTS = ['tok2vec', 'tagger', 'parser', 'senter', 'attribute_ruler', 'lemmatizer']
+
+
+class KeywordExtractor:
+    """Extracts keywords with spaCy NER and RAKE, for one text or a batch.
+
+    spaCy is loaded with only the NER component, and one RAKE instance is
+    reused (behind a lock, since it keeps per-call state). Pass nlp to use
+    another pipeline, such as a stand-in for benchmarks.
+    """
+
+    def __init__(self, model_name="en_core_web_sm", batch_size=32, n_process=1, nlp=None):
+        self.nlp = nlp if nlp is not None else spacy.load(model_name, exclude=UNUSED_COMPONENTS)
+        self.batch_size = batch_size
+        self.n_process = n_process
+        self.rake = Rake(min_length=1, max_length=3)  # Adjust lengths to capture longer phrases
+        self._rake_lock = threading.Lock()
+
+    def _rake_keywords(self, text):
+        with self._rake_lock:
+            self.rake.extract_keywords_from_text(text)
+            return set(self.rake.get_ranked_phrases())
+
+    def _keywords(self, text, doc):
+        # Step 1: Named Entities from SpaCy
+        named_entities = {ent.text for ent in doc.ents if ent.label_ in ENTITY_LABELS}
+
+        # Step 2: Extract keywords using RAKE
+        rake_keywords = self._rake_keywords(text)
+
+        # Step 3: Combine RAKE keywords and SpaCy Named Entities
+        combined_keywords = rake_keywords.union(named_entities)
+
+        # Filter out overly generic keywords and those not providing value
+        return [kw for kw in combined_keywords if len(kw.split()) > 1]
+
+    def extract(self, text):
+        return self._keywords(text, self.nlp(text))
+
+    # Keywords for many texts, running spaCy over them with nlp.pipe
+    def extract_many(self, texts, batch_size=None, n_process=None):
+        texts = list(texts)
+        docs = self.nlp.pipe(texts, batch_size=batch_size or self.batch_size, n_process=n_process or self.n_process)
+        return [self._keywords(text, doc) for text, doc in zip(texts, docs)]
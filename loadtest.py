@@ -0,0 +1,414 @@
+import argparse
+import http.cookiejar
+import json
+import os
+import random
+import re
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import namedtuple
+import numpy as np
+from werkzeug.security import generate_password_hash
+from werkzeug.serving import WSGIRequestHandler, make_server
+from benchmark import USER_INPUTS, synthetic_catalog
+from connect import ConnectionPool, set_pool
+
+
+# Relative weight of each kind of request
+DEFAULT_MIX = {
+    'login_page': 10,
+    'login': 5,
+    'book': 35,
+    'extract': 10,
+    'dashboard': 20,
+    'wishlist_add': 10,
+    'wishlist_remove': 10,
+    'forgot_password': 2,
+}
+
+PASSWORD = 'loadtest-password'
+
+# SQLite versions of the tables in create_database.sql
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS roles (
+        RoleId INTEGER PRIMARY KEY AUTOINCREMENT,
+        RoleName VARCHAR(50) NOT NULL,
+        Description VARCHAR(100) NOT NULL,
+        IsActive TINYINT DEFAULT 1
+    )''',
+    '''CREATE TABLE IF NOT EXISTS users (
+        UserId INTEGER PRIMARY KEY AUTOINCREMENT,
+        UserName VARCHAR(50) NOT NULL,
+        Email VARCHAR(50) NOT NULL,
+        Password VARCHAR(255) NOT NULL,
+        RoleId INT NOT NULL,
+        IsActive TINYINT DEFAULT 1,
+        ProfileImage VARCHAR(255) DEFAULT NULL
+    )''',
+    '''CREATE TABLE IF NOT EXISTS wishlist (
+        WishlistId INTEGER PRIMARY KEY AUTOINCREMENT,
+        UserId INT NOT NULL,
+        BookId VARCHAR(255),
+        Title VARCHAR(255),
+        CoverImg VARCHAR(255),
+        AddedDate TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )''',
+    'CREATE UNIQUE INDEX IF NOT EXISTS wishlist_user_book ON wishlist (UserId, BookId)',
+]
+
+
+# MySQL-only syntax used by the app, and its SQLite equivalent
+SQL_REWRITES = [
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\bINSERT\s+IGNORE\b', re.IGNORECASE), 'INSERT OR IGNORE'),
+]
+
+
+class StandInCursor:
+    """A sqlite3 cursor that accepts the app's MySQL-style queries."""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, query, params=()):
+        for pattern, replacement in SQL_REWRITES:
+            query = pattern.sub(replacement, query)
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, seq_of_params):
+        for pattern, replacement in SQL_REWRITES:
+            query = pattern.sub(replacement, query)
+        return self._cursor.executemany(query, seq_of_params)
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def close(self):
+        self._cursor.close()
+
+
+class StandInConnection:
+    """A local SQLite database standing in for the MySQL server."""
+
+    def __init__(self, path):
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+
+    def cursor(self):
+        return StandInCursor(self._connection.cursor())
+
+    def commit(self):
+        self._connection.commit()
+
+    def rollback(self):
+        self._connection.rollback()
+
+    def close(self):
+        self._connection.close()
+
+
+def create_stand_in_db(path, users):
+    connection = sqlite3.connect(path)
+    for statement in SCHEMA:
+        connection.execute(statement)
+    connection.execute("INSERT INTO roles (RoleId, RoleName, Description) VALUES (2, 'User', 'Regular user with basic access')")
+    password_hash = generate_password_hash(PASSWORD)  # one hash for everyone, hashing is slow
+    connection.executemany('INSERT INTO users (UserName, Email, Password, RoleId) VALUES (?, ?, ?, 2)',
+                           [(f'loadtest{i}', f'loadtest{i}@example.com', password_hash) for i in range(users)])
+    connection.commit()
+    connection.close()
+
+
+SendResponse = namedtuple('SendResponse', ['status_code', 'body', 'headers'])
+
+
+class StubSendGrid:
+    """Stands in for SendGridAPIClient; send() only waits for latency seconds."""
+
+    latency = 0.05
+    sent = 0
+    _lock = threading.Lock()
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key
+
+    def send(self, message):
+        time.sleep(self.latency)
+        with StubSendGrid._lock:
+            StubSendGrid.sent += 1
+        return SendResponse(202, '', {})
+
+
+class StubKeywordExtractor:
+    """Stands in for spaCy and RAKE: every pair of adjacent words is a keyword."""
+
+    def extract(self, text):
+        return re.findall(r'\b\w+\s+\w+\b', text)
+
+    def extract_many(self, texts):
+        return [self.extract(text) for text in texts]
+
+
+class StubSummarizer:
+    """Stands in for T5 (and its scheduler): the summary is the first words of the input."""
+
+    words = 25
+
+    def __init__(self):
+        self.summarizer = self
+        self.calls = 0
+
+    def summarize(self, text):
+        self.calls += 1
+        return ' '.join(text.split()[:self.words])
+
+    def stats(self):
+        return {'model': 'stub', 'calls': self.calls}
+
+
+# The search texts: the "body" of each line of a .jsonl file, or each line of a text file
+def load_queries(path):
+    if path is None or not os.path.exists(path):
+        return list(USER_INPUTS)
+    with open(path) as f:
+        if path.endswith('.jsonl'):
+            queries = [json.loads(line).get('body', '') for line in f if line.strip()]
+        else:
+            queries = [line.strip() for line in f]
+    return [query for query in queries if query] or list(USER_INPUTS)
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Client:
+    """One simulated user, with its own cookies, replaying the traffic mix."""
+
+    def __init__(self, base_url, username, book_ids, queries, mix, rng, search_timeout=60):
+        self.base_url = base_url
+        self.username = username
+        self.book_ids = book_ids
+        self.queries = queries
+        self.routes = list(mix)
+        self.weights = [mix[route] for route in self.routes]
+        self.rng = rng
+        self.search_timeout = search_timeout
+        self.opener = self._opener()
+        self.wishlist = []
+        # (route, seconds, status) per request
+        self.samples = []
+
+    @staticmethod
+    def _opener():
+        return urllib.request.build_opener(urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect)
+
+    # (status, headers, body) of one request; redirects are not followed
+    def request(self, path, form=None, opener=None):
+        data = urllib.parse.urlencode(form).encode() if form is not None else None
+        try:
+            with (opener or self.opener).open(self.base_url + path, data=data, timeout=60) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def timed(self, route, path, form=None, opener=None):
+        start = time.perf_counter()
+        try:
+            status, headers, body = self.request(path, form, opener)
+        except OSError:
+            status, headers, body = 0, {}, b''
+        self.samples.append((route, time.perf_counter() - start, status))
+        return status, headers, body
+
+    def login(self, opener=None):
+        return self.timed('login', '/login', {'username': self.username, 'password': PASSWORD}, opener)
+
+    def random_book(self):
+        return self.rng.choice(self.book_ids)
+
+    def run_route(self, route):
+        if route == 'login_page':
+            self.timed(route, '/login', opener=self._opener())
+        elif route == 'login':
+            self.login(self._opener())
+        elif route == 'book':
+            self.timed(route, '/book/' + quote(self.random_book()))
+        elif route == 'dashboard':
+            self.timed(route, '/dashboard')
+        elif route == 'wishlist_add':
+            book_id = self.random_book()
+            self.timed(route, '/add_to_wishlist/' + quote(book_id), {})
+            self.wishlist.append(book_id)
+        elif route == 'wishlist_remove':
+            book_id = self.wishlist.pop(self.rng.randrange(len(self.wishlist))) if self.wishlist else self.random_book()
+            self.timed(route, f'/remove_from_wishlist/{quote(book_id)}/dashboard', {})
+        elif route == 'extract':
+            self.search()
+        elif route == 'forgot_password':
+            self.timed(route, '/forgot_password', {'email': f'{self.username}@example.com'}, opener=self._opener())
+        else:
+            raise ValueError(f'Unknown route {route!r}')
+
+    # Submit a search, poll until it is done and fetch the results page
+    def search(self):
+        start = time.perf_counter()
+        status, headers, _ = self.timed('extract', '/extract', {'user_input': self.rng.choice(self.queries)})
+        location = headers.get('Location', '')
+        if status != 302 or '/loading/' not in location:
+            return  # rejected, e.g. the job queue is full
+        job_id = location.rsplit('/', 1)[-1]
+        deadline = time.time() + self.search_timeout
+        while time.time() < deadline:
+            status, _, body = self.timed('job_status', f'/results/{job_id}')
+            if status != 200 or json.loads(body)['status'] in ('done', 'failed'):
+                break
+            time.sleep(0.05)
+        status, _, _ = self.timed('results', '/results')
+        self.samples.append(('search_total', time.perf_counter() - start, status))
+
+    def run(self, deadline, max_requests=None):
+        self.login()
+        count = 0
+        while time.time() < deadline and (max_requests is None or count < max_requests):
+            self.run_route(self.rng.choices(self.routes, self.weights)[0])
+            count += 1
+
+
+def quote(book_id):
+    return urllib.parse.quote(str(book_id), safe='')
+
+
+# Latency percentiles and throughput per route
+def summarize(samples, elapsed):
+    by_route = {}
+    for route, seconds, status in samples:
+        by_route.setdefault(route, []).append((seconds, status))
+    report = {}
+    for route, values in sorted(by_route.items()):
+        latencies = np.array([seconds for seconds, _ in values]) * 1000
+        report[route] = {
+            'requests': len(values),
+            'errors': sum(1 for _, status in values if status == 0 or status >= 500),
+            'rps': len(values) / elapsed if elapsed else 0.0,
+            'p50_ms': float(np.percentile(latencies, 50)),
+            'p95_ms': float(np.percentile(latencies, 95)),
+            'p99_ms': float(np.percentile(latencies, 99)),
+            'max_ms': float(latencies.max()),
+        }
+    return report
+
+
+def parse_mix(text):
+    mix = dict(DEFAULT_MIX)
+    if text:
+        mix = {}
+        for part in text.split(','):
+            route, _, weight = part.partition('=')
+            if route not in DEFAULT_MIX:
+                raise ValueError(f'Unknown route {route!r}, expected one of {", ".join(DEFAULT_MIX)}')
+            mix[route] = float(weight)
+    return {route: weight for route, weight in mix.items() if weight > 0}
+
+
+# Build the app from create_app with a SQLite stand-in for MySQL, stubbed
+# SendGrid and (unless real_models) stand-ins for spaCy and T5, and serve it
+# on a local port. Returns (server, app).
+def start_app(workdir, users, real_models=False):
+    db_path = os.path.join(workdir, 'loadtest.sqlite3')
+    create_stand_in_db(db_path, users)
+    set_pool(ConnectionPool(lambda: StandInConnection(db_path), size=int(os.environ.get('DB_POOL_SIZE', 5))))
+
+    import app as app_module
+    app_module.SendGridAPIClient = StubSendGrid
+    os.environ.setdefault('MODEL_LOADING', 'lazy')
+    app = app_module.create_app()
+    if not real_models:
+        resources = app.extensions['resources']
+        resources.register('keyword_extractor', StubKeywordExtractor)
+        resources.register('summarizer', StubSummarizer)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, name='loadtest-server', daemon=True).start()
+    return server, app
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay a traffic mix against the app and report latency per route.')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent simulated users')
+    parser.add_argument('--duration', type=float, default=30, help='seconds to run for')
+    parser.add_argument('--requests', type=int, help='stop each client after this many requests')
+    parser.add_argument('--mix', help='route weights, e.g. book=50,dashboard=20,extract=5 (routes: %s)' % ', '.join(DEFAULT_MIX))
+    parser.add_argument('--rows', type=int, help='serve a synthetic catalog of this many books instead of data.csv')
+    parser.add_argument('--queries', default='requests.jsonl', help='search texts: .jsonl (the "body" of each line) or one per line')
+    parser.add_argument('--real-models', action='store_true', help='use spaCy and T5 instead of the stand-ins')
+    parser.add_argument('--sendgrid-latency', type=float, default=StubSendGrid.latency, help='seconds each stubbed email takes')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help='write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    mix = parse_mix(args.mix)
+    queries = load_queries(args.queries)
+    StubSendGrid.latency = args.sendgrid_latency
+
+    with tempfile.TemporaryDirectory() as workdir:
+        if args.rows:
+            csv_path = os.path.join(workdir, 'data.csv')
+            synthetic_catalog(args.rows, seed=args.seed).to_csv(csv_path, index=False)
+            os.environ['DATA_CSV_PATH'] = csv_path
+        server, app = start_app(workdir, args.clients, real_models=args.real_models)
+        book_ids = list(app.extensions['catalog_manager'].current().catalog.book_ids)
+        base_url = f'http://127.0.0.1:{server.server_port}'
+
+        clients = [Client(base_url, f'loadtest{i}', book_ids, queries, mix, random.Random(args.seed + i)) for i in range(args.clients)]
+        deadline = time.time() + args.duration
+        threads = [threading.Thread(target=client.run, args=(deadline, args.requests)) for client in clients]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        server.shutdown()
+
+    samples = [sample for client in clients for sample in client.samples]
+    report = {
+        'clients': args.clients,
+        'elapsed_s': elapsed,
+        'mix': mix,
+        'routes': summarize(samples, elapsed),
+        'total': summarize([('all', seconds, status) for route, seconds, status in samples if route != 'search_total'], elapsed)['all'],
+        'emails_sent': StubSendGrid.sent,
+    }
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    print(f"{args.clients} clients for {elapsed:.1f}s")
+    print(f"{'route':16} {'requests':>8} {'errors':>6} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for route, stats in list(report['routes'].items()) + [('total', report['total'])]:
+        print(f"{route:16} {stats['requests']:8d} {stats['errors']:6d} {stats['rps']:8.1f} "
+              f"{stats['p50_ms']:9.1f} {stats['p95_ms']:9.1f} {stats['p99_ms']:9.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
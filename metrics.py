@@ -0,0 +1,222 @@
+import atexit
+import cProfile
+import glob
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Seconds between writes of a process's histograms to the multiprocess directory
+DEFAULT_FLUSH_SECONDS = 1.0
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Histogram:
+    """Cumulative latency histogram per label set, in the Prometheus model."""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        self._lock = threading.Lock()
+        # label values -> [bucket counts..., sum]
+        self._series = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f'{self.name} expects labels {self.labelnames}, got {tuple(labels)}')
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * len(self.buckets) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-1] += value
+
+    # Time the block and observe the elapsed seconds
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    # (count, sum) for one label set
+    def totals(self, **labels):
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return (0, 0.0) if series is None else (series[-2], series[-1])
+
+    # Copy of every series: label values -> [bucket counts..., sum]
+    def snapshot(self):
+        with self._lock:
+            return {key: list(values) for key, values in self._series.items()}
+
+    # Text format lines for these series (by default this process's own)
+    def collect(self, series=None):
+        if series is None:
+            series = self.snapshot()
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        for key in sorted(series):
+            values = series[key]
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f'{self.name}_bucket{_format_labels(labels + [("le", _format_value(bound))])} {count}')
+            lines.append(f'{self.name}_sum{_format_labels(labels)} {values[-1]!r}')
+            lines.append(f'{self.name}_count{_format_labels(labels)} {values[-2]}')
+        return lines
+
+
+class MetricsRegistry:
+    """The histograms served on /metrics.
+
+    Histograms live in the process that observes them. Under several worker
+    processes (gunicorn), give every worker the same directory: each one then
+    writes its series to metrics-<pid>.json there every flush_seconds, and
+    render() adds up the files of all workers, live and exited, so any worker
+    answers a scrape with the totals. The gunicorn master calls
+    mark_process_dead() when a worker exits, so a new worker reusing its pid
+    does not overwrite its counts.
+    """
+
+    def __init__(self, directory=None, flush_seconds=DEFAULT_FLUSH_SECONDS):
+        self._metrics = {}
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self._lock = threading.Lock()
+        self._pid = None
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+            # Threads do not survive a fork, so every worker starts its own
+            os.register_at_fork(after_in_child=self._after_fork)
+            atexit.register(self._flush_quietly)
+            self._start()
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, documentation, labelnames, buckets)
+        return self._metrics[name]
+
+    # The parent's flush thread may have held the lock when it forked
+    def _after_fork(self):
+        self._lock = threading.Lock()
+        self._start()
+
+    def _start(self):
+        with self._lock:
+            if self.directory is None or self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+        threading.Thread(target=self._flush_forever, args=(self._pid,), name='metrics-flush', daemon=True).start()
+
+    def _flush_forever(self, pid):
+        while self._pid == pid:
+            time.sleep(self.flush_seconds)
+            self._flush_quietly()
+
+    # From the flush thread and at exit, where there is no one to raise to
+    def _flush_quietly(self):
+        try:
+            self.flush()
+        except OSError:
+            pass
+
+    # Write this process's series to directory/metrics-<pid>.json
+    def flush(self):
+        if self.directory is None:
+            return
+        data = {name: [[list(key), values] for key, values in metric.snapshot().items()]
+                for name, metric in self._metrics.items()}
+        path = os.path.join(self.directory, f'metrics-{os.getpid()}.json')
+        with self._lock:
+            with open(path + '.tmp', 'w') as f:
+                json.dump(data, f)
+            os.replace(path + '.tmp', path)
+
+    # Series of every process that wrote to the directory, added up: name -> {label values: values}
+    def _merged(self):
+        self.flush()
+        merged = {name: {} for name in self._metrics}
+        for path in sorted(glob.glob(os.path.join(self.directory, 'metrics-*.json'))):
+            try:
+                with open(path) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue  # renamed or replaced while we listed the directory
+            for name, series in data.items():
+                if name not in merged:
+                    continue
+                for key, values in series:
+                    total = merged[name].setdefault(tuple(key), [0] * len(values))
+                    for i, value in enumerate(values):
+                        total[i] += value
+        return merged
+
+    # Prometheus text exposition format
+    def render(self):
+        merged = self._merged() if self.directory is not None else {}
+        lines = []
+        for name, metric in self._metrics.items():
+            lines.extend(metric.collect(merged.get(name)))
+        return '\n'.join(lines) + '\n'
+
+
+# Keep an exited worker's counts under a name no new process will write to.
+# Called by the gunicorn master (child_exit in gunicorn.conf.py)
+def mark_process_dead(pid, directory):
+    path = os.path.join(directory, f'metrics-{pid}.json')
+    if os.path.exists(path):
+        os.replace(path, os.path.join(directory, f'metrics-exited-{pid}-{time.time_ns()}.json'))
+
+
+# cProfile can only profile one thing at a time per process
+_profile_lock = threading.Lock()
+
+
+# Run the block under cProfile and dump the stats to directory/<name>.prof
+# (read them with python -m pstats or snakeviz). Skipped when another
+# profile is running.
+@contextmanager
+def profiled(directory, name):
+    if not _profile_lock.acquire(blocking=False):
+        yield None
+        return
+    try:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            os.makedirs(directory, exist_ok=True)
+            profiler.dump_stats(os.path.join(directory, f'{name}.prof'))
+    finally:
+        _profile_lock.release()
@@ -0,0 +1,244 @@
+import argparse
+import math
+import time
+from collections import Counter, namedtuple
+import numpy as np
+import pandas as pd
+from scoring import RelevanceScorer, TOP_N
+from search_index import DEFAULT_CSV_PATH, DEFAULT_INDEX_PATH, SearchIndex, tokenize
+
+
+DEFAULT_CANDIDATES = 2000
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# Book count, per-token book counts and average token count of a whole catalog,
+# so an index over part of it (a search shard) scores books as the full index would
+CorpusStats = namedtuple('CorpusStats', ['rows', 'counts', 'average_length'])
+
+
+def corpus_stats(token_sets):
+    counts = Counter()
+    total = 0
+    for tokens in token_sets:
+        counts.update(tokens)
+        total += len(tokens)
+    return CorpusStats(len(token_sets), counts, total / len(token_sets) if token_sets else 0.0)
+
+
+# Each book's unique tokens over the given text columns
+def token_sets(*columns):
+    return [set().union(*(tokenize(text) for text in texts)) for texts in zip(*columns)]
+
+
+class TokenIndex:
+    """Inverted index from lowercased tokens to the books whose title, genres
+    or characters contain them, used to pick candidates before fuzzy scoring.
+
+    Books are ranked by BM25 over token presence (each token counts once per book).
+    With corpus set, IDF and length normalization come from those statistics
+    instead of the indexed books.
+    """
+
+    def __init__(self, token_sets, corpus=None):
+        postings = {}
+        lengths = np.zeros(len(token_sets), dtype=np.float32)
+        for row, tokens in enumerate(token_sets):
+            lengths[row] = len(tokens)
+            for token in tokens:
+                postings.setdefault(token, []).append(row)
+        self._set({token: np.array(rows, dtype=np.int32) for token, rows in postings.items()}, lengths, corpus)
+
+    def _set(self, postings, lengths, corpus=None):
+        self.rows = len(lengths)
+        self.postings = postings
+        self.lengths = lengths
+        self.corpus = corpus
+        average = corpus.average_length if corpus is not None else lengths.mean() if self.rows else 0.0
+        # BM25 length normalization per book, with tf = 1
+        self.weights = (K1 + 1) / (1 + K1 * (1 - B + B * lengths / (average or 1.0)))
+        # Shared by concurrent searches, so nothing may write to them
+        for array in [self.lengths, self.weights] + list(self.postings.values()):
+            array.setflags(write=False)
+
+    @classmethod
+    def from_columns(cls, *columns, corpus=None):
+        return cls(token_sets(*columns), corpus)
+
+    # The search index already stores each book's unique tokens
+    @classmethod
+    def from_search_index(cls, index):
+        return cls([index.tokens(row) for row in range(index.rows)])
+
+    # A new index over size books, with the token sets of some rows replaced:
+    # old and new map row -> tokens before and after. Only the postings of
+    # those tokens are rebuilt
+    def updated(self, size, old, new):
+        removed, added = {}, {}
+        for row, tokens in old.items():
+            for token in tokens:
+                removed.setdefault(token, []).append(row)
+        for row, tokens in new.items():
+            for token in tokens:
+                added.setdefault(token, []).append(row)
+        postings = dict(self.postings)
+        for token in removed.keys() | added.keys():
+            rows = postings.get(token, np.empty(0, dtype=np.int32))
+            rows = np.union1d(np.setdiff1d(rows, removed.get(token, [])), added.get(token, [])).astype(np.int32)
+            if len(rows):
+                postings[token] = rows
+            else:
+                postings.pop(token, None)
+        lengths = np.zeros(size, dtype=np.float32)
+        lengths[:self.rows] = self.lengths
+        lengths[list(old)] = 0
+        lengths[list(new)] = [len(tokens) for tokens in new.values()]
+        index = TokenIndex.__new__(TokenIndex)
+        index._set(postings, lengths, self.corpus)
+        return index
+
+    def idf(self, token):
+        if self.corpus is not None:
+            rows, count = self.corpus.rows, self.corpus.counts.get(token, 0)
+        else:
+            rows, count = self.rows, len(self.postings.get(token, ()))
+        return math.log(1 + (rows - count + 0.5) / (count + 0.5))
+
+    # BM25 score of every book for the query tokens
+    def scores(self, tokens):
+        scores = np.zeros(self.rows, dtype=np.float32)
+        for token in set(tokens):
+            rows = self.postings.get(token)
+            if rows is not None:
+                scores[rows] += self.idf(token) * self.weights[rows]
+        return scores
+
+    # Rows of up to limit books sharing tokens with the query, best first.
+    # With allowed (a boolean array over the rows), only rows it marks True
+    def candidates(self, tokens, limit=DEFAULT_CANDIDATES, allowed=None):
+        scores = self.scores(tokens)
+        if allowed is not None:
+            scores[~allowed] = 0
+        rows = np.flatnonzero(scores)
+        if len(rows) > limit:
+            rows = rows[np.argpartition(-scores[rows], limit - 1)[:limit]]
+        return np.sort(rows)
+
+
+def query_tokens(keywords):
+    return [token for keyword in keywords for token in tokenize(keyword)]
+
+
+class CandidateRanker:
+    """Ranks books by the fuzzy formula, scoring only the token-index candidates.
+
+    Falls back to scoring the whole catalog when the keywords match fewer
+    than TOP_N books, or when limit is 0. Rows that live marks False (deleted
+    books in an updated catalog) are never returned. rank() can be limited to
+    the rows a facet filter allows, before anything is scored.
+    """
+
+    def __init__(self, scorer, token_index, limit=DEFAULT_CANDIDATES, live=None):
+        self.scorer = scorer
+        self.token_index = token_index
+        self.limit = limit
+        self.live = live
+
+    def candidates(self, keywords, allowed=None):
+        if not self.limit:
+            return None
+        rows = self.token_index.candidates(query_tokens(keywords), self.limit, allowed)
+        return rows if len(rows) >= TOP_N else None
+
+    # (rows, scores) of the top books, best first, among the allowed rows if given
+    def rank(self, keywords, summary, exhaustive=False, allowed=None):
+        rows = None if exhaustive else self.candidates(keywords, allowed)
+        if rows is None and allowed is not None:
+            rows = np.flatnonzero(allowed)
+        scores = self.scorer.scores(keywords, summary, rows=rows)
+        if self.live is not None:
+            live = self.live if rows is None else self.live[rows]
+            scores = np.where(live, scores, -1.0)
+        order = self.scorer.top(scores)
+        if self.live is not None:
+            order = order[scores[order] >= 0]
+        return (order if rows is None else rows[order]), scores[order]
+
+
+# Share of the exhaustive top books that the candidate path also returns
+def recall(exhaustive_rows, candidate_rows):
+    if len(exhaustive_rows) == 0:
+        return 1.0
+    return len(set(exhaustive_rows.tolist()) & set(candidate_rows.tolist())) / len(exhaustive_rows)
+
+
+SAMPLE_QUERIES = [
+    'fantasy with dragons and magic',
+    'murder mystery detective in london',
+    'young adult dystopian romance',
+    'historical fiction world war ii',
+    'space opera science fiction',
+    'coming of age story',
+    'harry potter wizard school',
+    'vampire romance high school',
+]
+
+
+def benchmark(ranker, queries, repeat=3):
+    results = []
+    for query in queries:
+        keywords = [query]
+        timings = {}
+        rows = {}
+        for exhaustive in (True, False):
+            start = time.perf_counter()
+            for _ in range(repeat):
+                rows[exhaustive], _ = ranker.rank(keywords, query, exhaustive=exhaustive)
+            timings[exhaustive] = (time.perf_counter() - start) / repeat
+        candidates = ranker.candidates(keywords)
+        results.append({
+            'query': query,
+            'candidates': ranker.token_index.rows if candidates is None else len(candidates),
+            'exhaustive_ms': timings[True] * 1000,
+            'prefilter_ms': timings[False] * 1000,
+            'speedup': timings[True] / timings[False],
+            'recall': recall(rows[True], rows[False]),
+        })
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare the token prefilter with exhaustive fuzzy scoring.')
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help='search index to load (falls back to --csv)')
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES)
+    parser.add_argument('--queries', help='file with one query per line')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    try:
+        index = SearchIndex.load(args.index)
+        scorer, token_index = RelevanceScorer.from_index(index), TokenIndex.from_search_index(index)
+    except FileNotFoundError:
+        book_data = pd.read_csv(args.csv)
+        scorer = RelevanceScorer.from_frame(book_data)
+        token_index = TokenIndex.from_columns(scorer.titles, scorer.genres, scorer.characters)
+
+    queries = SAMPLE_QUERIES
+    if args.queries:
+        with open(args.queries) as f:
+            queries = [line.strip() for line in f if line.strip()]
+
+    results = benchmark(CandidateRanker(scorer, token_index, limit=args.candidates), queries, repeat=args.repeat)
+    print(f"{'query':40} {'cands':>6} {'full ms':>9} {'pre ms':>8} {'speedup':>8} {'recall':>7}")
+    for result in results:
+        print(f"{result['query'][:40]:40} {result['candidates']:6d} {result['exhaustive_ms']:9.1f} "
+              f"{result['prefilter_ms']:8.1f} {result['speedup']:7.1f}x {result['recall']:7.2f}")
+    print(f"mean speedup {np.mean([r['speedup'] for r in results]):.1f}x, "
+          f"mean recall@{TOP_N} {np.mean([r['recall'] for r in results]):.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,156 @@
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+# Lowercase and collapse whitespace so trivially different prompts share an entry
+def normalize_query(text):
+    return re.sub(r'\s+', ' ', text).strip().casefold()
+
+
+# Key for the ranking tier: the analysed query plus the catalog it was ranked against
+# and the facet filter it was limited to
+def ranking_key(keywords, summary, catalog_version='', facet_filter=None):
+    key = [catalog_version, list(keywords), summary]
+    if facet_filter:
+        key.append(facet_filter.key())
+    return json.dumps(key)
+
+
+class MemoryBackend:
+    """In-process LRU dictionary."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.evictions = 0
+
+    def get(self, namespace, key):
+        with self._lock:
+            value = self._entries.get((namespace, key))
+            if value is not None:
+                self._entries.move_to_end((namespace, key))
+            return value
+
+    def put(self, namespace, key, value):
+        with self._lock:
+            self._entries[(namespace, key)] = value
+            self._entries.move_to_end((namespace, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SqliteBackend:
+    """LRU cache in a sqlite file, so entries survive restarts and are shared
+    between gunicorn workers. Values are stored as JSON."""
+
+    def __init__(self, path, max_entries=10000):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self.evictions = 0
+        with self._connect() as connection:
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('''
+            CREATE TABLE IF NOT EXISTS query_cache (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            ''')
+            connection.execute('CREATE INDEX IF NOT EXISTS query_cache_accessed ON query_cache (accessed)')
+
+    # One connection per thread, sqlite connections can't be shared between threads
+    def _connect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5)
+            self._local.connection = connection
+        return connection
+
+    def get(self, namespace, key):
+        connection = self._connect()
+        row = connection.execute('SELECT value FROM query_cache WHERE namespace = ? AND key = ?', (namespace, key)).fetchone()
+        if row is None:
+            return None
+        with connection:
+            connection.execute('UPDATE query_cache SET accessed = ? WHERE namespace = ? AND key = ?', (time.time(), namespace, key))
+        return json.loads(row[0])
+
+    def put(self, namespace, key, value):
+        connection = self._connect()
+        with connection:
+            connection.execute('INSERT OR REPLACE INTO query_cache (namespace, key, value, accessed) VALUES (?, ?, ?, ?)',
+                               (namespace, key, json.dumps(value), time.time()))
+            count = connection.execute('SELECT COUNT(*) FROM query_cache').fetchone()[0]
+            if count > self.max_entries:
+                connection.execute('DELETE FROM query_cache WHERE rowid IN (SELECT rowid FROM query_cache ORDER BY accessed LIMIT ?)',
+                                   (count - self.max_entries,))
+                self.evictions += count - self.max_entries
+
+    def clear(self):
+        connection = self._connect()
+        with connection:
+            connection.execute('DELETE FROM query_cache')
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM query_cache').fetchone()[0]
+
+
+class QueryCache:
+    """One cache tier: a namespace in a backend, with hit/miss counters."""
+
+    def __init__(self, backend, namespace):
+        self.backend = backend
+        self.namespace = namespace
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(self.namespace, key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.backend.put(self.namespace, key, value)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+def make_backend(path=None, max_entries=1024):
+    if path:
+        return SqliteBackend(path, max_entries=max_entries)
+    return MemoryBackend(max_entries=max_entries)
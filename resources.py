@@ -0,0 +1,111 @@
+import logging
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+# How create_app loads the registered resources: 'background' starts a warm-up
+# thread, 'lazy' waits for the first request that needs each one, and 'preload'
+# loads everything before returning (for gunicorn --preload, so the workers
+# share the models with the master through fork)
+LOADING_MODES = ('background', 'lazy', 'preload')
+
+
+class Resource:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.value = None
+        self.loaded = False
+        self.seconds = None
+        self.error = None
+        self.lock = threading.Lock()
+
+
+class ResourceRegistry:
+    """Named resources built by their loader on first get(), once per process.
+
+    A failed load is kept in stats() and retried on the next get().
+    """
+
+    def __init__(self):
+        self._resources = {}
+
+    def register(self, name, loader):
+        self._resources[name] = Resource(name, loader)
+
+    def __contains__(self, name):
+        return name in self._resources
+
+    def is_loaded(self, name):
+        return self._resources[name].loaded
+
+    def get(self, name):
+        resource = self._resources[name]
+        if resource.loaded:
+            return resource.value
+        with resource.lock:
+            if not resource.loaded:
+                start = time.perf_counter()
+                try:
+                    resource.value = resource.loader()
+                except Exception as e:
+                    resource.error = str(e)
+                    raise
+                resource.seconds = time.perf_counter() - start
+                resource.error = None
+                resource.loaded = True
+                logger.info("loaded %s in %.1f ms", name, resource.seconds * 1000)
+        return resource.value
+
+    # The value if it has been loaded already, without loading it
+    def peek(self, name):
+        resource = self._resources[name]
+        return resource.value if resource.loaded else None
+
+    def load_all(self):
+        for name in list(self._resources):
+            self.get(name)
+
+    def _warm_up(self):
+        for name in list(self._resources):
+            try:
+                self.get(name)
+            except Exception:
+                logger.exception("warm-up of %s failed", name)
+
+    # Load everything in a daemon thread; requests that need a resource
+    # before then wait for (or do) its load
+    def warm_up(self):
+        thread = threading.Thread(target=self._warm_up, name='warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def stats(self):
+        return {
+            resource.name: {
+                'loaded': resource.loaded,
+                'load_ms': None if resource.seconds is None else resource.seconds * 1000,
+                'error': resource.error,
+            }
+            for resource in self._resources.values()
+        }
+
+
+# NLTK resource name -> path inside nltk_data
+NLTK_PATHS = {
+    'stopwords': 'corpora/stopwords',
+    'punkt': 'tokenizers/punkt',
+}
+
+
+# Download NLTK data only when it is not installed locally yet
+def ensure_nltk_data(*names):
+    import nltk
+    for name in names:
+        try:
+            nltk.data.find(NLTK_PATHS.get(name, name))
+        except LookupError:
+            logger.info("NLTK %s not found locally, downloading it", name)
+            nltk.download(name, quiet=True)
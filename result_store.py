@@ -0,0 +1,77 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+
+# A finished search: the ranked bookIds and their scores, not the book rows,
+# and the facet filter it was limited to, if any
+SearchResult = namedtuple('SearchResult', ['keywords', 'summary', 'book_ids', 'scores', 'facet_filter'], defaults=[None])
+
+
+# Rough memory footprint of a result, used for the byte budget
+def result_size(result):
+    size = 200 + len(result.summary) + sum(len(keyword) + 50 for keyword in result.keywords)
+    size += sum(len(book_id) + 50 for book_id in result.book_ids)
+    return size + 8 * len(result.scores)
+
+
+class ResultStore:
+    """Search results keyed by search id, with LRU, TTL and byte budget eviction."""
+
+    def __init__(self, max_entries=10000, max_bytes=16 * 1024 * 1024, ttl=3600, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # search id -> (expires at, size, result)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def put(self, search_id, keywords, summary, book_ids, scores, facet_filter=None):
+        result = SearchResult(list(keywords), summary, tuple(book_ids), tuple(float(score) for score in scores), facet_filter)
+        size = result_size(result)
+        with self._lock:
+            self._remove(search_id)
+            self._entries[search_id] = (self.clock() + self.ttl, size, result)
+            self.bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self.bytes > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return result
+
+    def get(self, search_id):
+        with self._lock:
+            entry = self._entries.get(search_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, _, result = entry
+            if expires_at <= self.clock():
+                self._remove(search_id)
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(search_id)
+            self.hits += 1
+            return result
+
+    def _remove(self, search_id):
+        entry = self._entries.pop(search_id, None)
+        if entry is not None:
+            self.bytes -= entry[1]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
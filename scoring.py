@@ -0,0 +1,93 @@
+import numpy as np
+import pandas as pd
+from rapidfuzz import fuzz, process
+
+
+# Number of books returned for a search
+TOP_N = 15
+
+
+# Turn a DataFrame column into a numpy array of strings (missing values become "")
+def text_column(column):
+    return np.array([str(value) if pd.notna(value) else "" for value in column], dtype=object)
+
+
+class RelevanceScorer:
+    """Scores every book in the catalog against a query in a handful of batched calls.
+
+    The formula is the one find_relevant_books has always used: the best keyword
+    match against title, genres and characters plus the summary match against the
+    description, averaged over the four fields.
+
+    The columns are read-only and scores() only allocates per-call arrays, so
+    one scorer can serve concurrent searches.
+    """
+
+    def __init__(self, titles, genres, characters, descriptions, scorer=fuzz.partial_ratio, workers=-1):
+        for column in (titles, genres, characters, descriptions):
+            column.setflags(write=False)
+        self.titles = titles
+        self.genres = genres
+        self.characters = characters
+        self.descriptions = descriptions
+        self.scorer = scorer
+        self.workers = workers
+
+    @classmethod
+    def from_frame(cls, book_data, **kwargs):
+        return cls(text_column(book_data['title']), text_column(book_data['genres']),
+                   text_column(book_data['characters']), text_column(book_data['description']), **kwargs)
+
+    # Build from a prebuilt search index, whose text columns are already cleaned
+    @classmethod
+    def from_index(cls, index, **kwargs):
+        return cls(index.text('title'), index.text('genres'), index.text('characters'), index.text('description'), **kwargs)
+
+    def __len__(self):
+        return len(self.titles)
+
+    # A scorer over size books, with the texts at rows replaced
+    def updated(self, size, rows, titles, genres, characters, descriptions):
+        columns = []
+        for column, values in zip((self.titles, self.genres, self.characters, self.descriptions),
+                                  (titles, genres, characters, descriptions)):
+            grown = np.full(size, "", dtype=object)
+            grown[:len(column)] = column
+            grown[rows] = values
+            columns.append(grown)
+        return RelevanceScorer(*columns, scorer=self.scorer, workers=self.workers)
+
+    # Similarity of every query against every entry of a column, rounded like fuzzywuzzy
+    def _match(self, queries, column):
+        matrix = process.cdist(queries, column, scorer=self.scorer, dtype=np.float64, workers=self.workers)
+        return np.rint(matrix)
+
+    # Best keyword match per book, 0 when there are no keywords
+    def _best_match(self, keywords, column):
+        if not keywords:
+            return np.zeros(len(column))
+        return self._match(keywords, column).max(axis=0)
+
+    # Scores for every book, or only for the given row positions
+    def scores(self, keywords, summary, rows=None):
+        keywords = list(keywords)
+        titles, genres, characters, descriptions = self.titles, self.genres, self.characters, self.descriptions
+        if rows is not None:
+            titles, genres, characters, descriptions = titles[rows], genres[rows], characters[rows], descriptions[rows]
+        title_score = self._best_match(keywords, titles)
+        genre_score = self._best_match(keywords, genres)
+        character_score = self._best_match(keywords, characters)
+        description_score = self._match([summary], descriptions)[0]
+        return (title_score + genre_score + character_score + description_score) / 4
+
+    # Row positions of the n best scores, highest first; ties keep catalog order
+    @staticmethod
+    def top(scores, n=TOP_N):
+        n = min(n, len(scores))
+        if n == 0:
+            return np.empty(0, dtype=np.intp)
+        cutoff = scores[np.argpartition(-scores, n - 1)[n - 1]]
+        above = np.flatnonzero(scores > cutoff)
+        ties = np.flatnonzero(scores == cutoff)[:n - len(above)]
+        candidates = np.concatenate([above, ties])
+        return candidates[np.lexsort((candidates, -scores[candidates]))]
@@ -0,0 +1,226 @@
+import argparse
+import bisect
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+
+# Bump when the on-disk layout changes so old artifacts are rebuilt
+INDEX_VERSION = 1
+
+DEFAULT_CSV_PATH = 'data.csv'
+DEFAULT_INDEX_PATH = 'search_index'
+
+# Columns whose words go into the per-book token lists
+TOKEN_COLUMNS = ['title', 'genres', 'characters']
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class StringColumn:
+    """A column of strings stored as one UTF-8 buffer plus row offsets.
+
+    Both arrays can be memory-mapped, so workers share the pages instead of
+    each holding their own Python strings. Rows are decoded on access.
+    """
+
+    def __init__(self, data, offsets, missing=None):
+        self.data = data
+        self.offsets = offsets
+        self.missing = missing
+        # Slicing a memoryview is much cheaper than slicing the array, and
+        # lookups decode a row per bisect step
+        self._buffer = memoryview(data)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        return str(self._buffer[self.offsets[i]:self.offsets[i + 1]], 'utf-8')
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def to_list(self):
+        return list(self)
+
+    @staticmethod
+    def encode(values):
+        chunks = [value.encode('utf-8') for value in values]
+        offsets = np.zeros(len(chunks) + 1, dtype=np.int64)
+        np.cumsum([len(chunk) for chunk in chunks], out=offsets[1:])
+        data = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+        return data, offsets
+
+
+# Rows of a string column in sorted order, so bisect can search it
+class _SortedView:
+
+    def __init__(self, column, order):
+        self.column = column
+        self.order = order
+
+    def __len__(self):
+        return len(self.order)
+
+    def __getitem__(self, i):
+        return self.column[self.order[i]]
+
+
+class SearchIndex:
+    """Precomputed, read-only view of data.csv.
+
+    Built offline by build_index() and loaded with memory-mapped arrays.
+    """
+
+    def __init__(self, path, manifest, mmap_mode='r'):
+        self.path = path
+        self.manifest = manifest
+        self.rows = manifest['rows']
+        # Changes with every build; indexes built before build_id existed use the manifest's mtime
+        self.build_id = manifest.get('build_id') or str(os.stat(os.path.join(path, 'manifest.json')).st_mtime_ns)
+        self.columns = {}
+        for name, kind in manifest['columns'].items():
+            if kind == 'string':
+                missing = self._load(name + '.missing', mmap_mode)
+                self.columns[name] = StringColumn(self._load(name + '.data', mmap_mode), self._load(name + '.offsets', mmap_mode), missing)
+            else:
+                self.columns[name] = self._load(name, mmap_mode)
+        self.vocabulary = StringColumn(self._load('tokens.vocabulary.data', mmap_mode), self._load('tokens.vocabulary.offsets', mmap_mode))
+        self.token_indptr = self._load('tokens.indptr', mmap_mode)
+        self.token_ids = self._load('tokens.ids', mmap_mode)
+        self._book_ids = _SortedView(self.columns['bookId'], self._load('bookId.order', mmap_mode))
+
+    # Mapped arrays are viewed as plain ndarrays: the mapping stays, but indexing
+    # skips np.memmap's Python-level __getitem__, which dominates per-row reads
+    def _load(self, name, mmap_mode):
+        array = np.load(os.path.join(self.path, name + '.npy'), mmap_mode=mmap_mode)
+        return array.view(np.ndarray) if isinstance(array, np.memmap) else array
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH, mmap_mode='r'):
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        if manifest.get('version') != INDEX_VERSION:
+            raise ValueError(f'Search index at {path} has version {manifest.get("version")}, expected {INDEX_VERSION}')
+        return cls(path, manifest, mmap_mode=mmap_mode)
+
+    # True when the CSV changed since the index was built
+    def is_stale(self, csv_path=DEFAULT_CSV_PATH):
+        if not os.path.exists(csv_path):
+            return False
+        source = self.manifest['source']
+        stat = os.stat(csv_path)
+        return stat.st_size != source['size'] or int(stat.st_mtime) != source['mtime']
+
+    # Text of a column with missing values as "", ready for scoring. This decodes
+    # every row: rapidfuzz compares Python strings, so the scorer keeps its own copy
+    def text(self, name):
+        return np.array(self.columns[name].to_list(), dtype=object)
+
+    # Lowercased tokens of a book's title, genres and characters
+    def tokens(self, row):
+        ids = self.token_ids[self.token_indptr[row]:self.token_indptr[row + 1]]
+        return [self.vocabulary[i] for i in ids]
+
+    # Row number of a bookId, or None
+    def row_for(self, book_id):
+        position = bisect.bisect_left(self._book_ids, book_id)
+        if position < len(self._book_ids) and self._book_ids[position] == book_id:
+            return int(self._book_ids.order[position])
+        return None
+
+
+
+def _save(path, name, array):
+    np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(array))
+
+
+def _save_strings(path, name, values):
+    data, offsets = StringColumn.encode(values)
+    _save(path, name + '.data', data)
+    _save(path, name + '.offsets', offsets)
+
+
+def build_index(csv_path=DEFAULT_CSV_PATH, out_path=DEFAULT_INDEX_PATH):
+    book_data = pd.read_csv(csv_path)
+    book_data['coverImg'] = book_data['coverImg'].replace(np.nan, '', regex=True)
+    rows = len(book_data)
+
+    # Write into a scratch directory and swap it in at the end
+    tmp_path = out_path + '.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+
+    columns = {}
+    for name in book_data.columns:
+        column = book_data[name]
+        if pd.api.types.is_numeric_dtype(column):
+            _save(tmp_path, name, column.to_numpy())
+            columns[name] = 'numeric'
+        else:
+            missing = column.isna().to_numpy()
+            _save_strings(tmp_path, name, ['' if is_missing else str(value) for value, is_missing in zip(column, missing)])
+            _save(tmp_path, name + '.missing', missing)
+            columns[name] = 'string'
+
+    # bookId -> row map, stored as the rows sorted by bookId
+    book_ids = [str(book_id) for book_id in book_data['bookId']]
+    _save(tmp_path, 'bookId.order', np.array(sorted(range(rows), key=book_ids.__getitem__), dtype=np.int64))
+
+    # Lowercased tokens per book, as ids into a shared vocabulary
+    vocabulary = {}
+    indptr = np.zeros(rows + 1, dtype=np.int64)
+    ids = []
+    for row in range(rows):
+        words = set()
+        for name in TOKEN_COLUMNS:
+            value = book_data[name].iat[row]
+            if pd.notna(value):
+                words.update(tokenize(str(value)))
+        ids.extend(sorted(vocabulary.setdefault(word, len(vocabulary)) for word in words))
+        indptr[row + 1] = len(ids)
+    _save_strings(tmp_path, 'tokens.vocabulary', list(vocabulary))
+    _save(tmp_path, 'tokens.indptr', indptr)
+    _save(tmp_path, 'tokens.ids', np.array(ids, dtype=np.int32))
+
+    stat = os.stat(csv_path)
+    manifest = {
+        'version': INDEX_VERSION,
+        'build_id': uuid.uuid4().hex,
+        'rows': rows,
+        'columns': columns,
+        'source': {'path': csv_path, 'size': stat.st_size, 'mtime': int(stat.st_mtime)},
+    }
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    shutil.rmtree(out_path, ignore_errors=True)
+    os.replace(tmp_path, out_path)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the precomputed search index for the book catalog.')
+    parser.add_argument('command', choices=['build'])
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH, help='catalog CSV to index')
+    parser.add_argument('--out', default=DEFAULT_INDEX_PATH, help='directory to write the index to')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    manifest = build_index(args.csv, args.out)
+    print(f"Indexed {manifest['rows']} books into {args.out} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == '__main__':
+    main()
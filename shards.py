@@ -0,0 +1,317 @@
+import argparse
+import json
+import multiprocessing
+import threading
+import time
+import urllib.request
+import zlib
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
+import pandas as pd
+from flask import Flask, jsonify, request
+from werkzeug.serving import make_server
+from facets import FacetFilter, FacetIndex
+from prefilter import CandidateRanker, DEFAULT_CANDIDATES, TokenIndex, corpus_stats, token_sets
+from scoring import RelevanceScorer, TOP_N, text_column
+from search_index import DEFAULT_CSV_PATH, TOKEN_COLUMNS
+
+
+# Milliseconds the coordinator waits for the shards before answering with what it has
+DEFAULT_TIMEOUT_MS = 2000
+
+# One shard's best books: catalog row positions (for catalog-order tie breaks), bookIds and scores
+ShardHits = namedtuple('ShardHits', ['rows', 'book_ids', 'scores'])
+
+
+class ShardsUnavailable(Exception):
+    pass
+
+
+# Shard that owns a book. crc32 rather than hash(), which differs between processes
+def shard_of(book_id, shards):
+    return zlib.crc32(str(book_id).encode()) % shards
+
+
+class SearchShard:
+    """The fuzzy ranker over the books of one shard.
+
+    Books are assigned by bookId hash, so every process that reads the same
+    CSV agrees on the split without talking to the others. Hits carry the
+    book's row in the full catalog so merged ties keep catalog order, the
+    same as a single-process search.
+
+    The token prefilter scores books with the whole catalog's BM25 statistics,
+    so a book gets the same prefilter score on its shard as in a single
+    process, and each shard's up to limit candidates include every book of
+    the shard among the single-process candidates. Sharded searches therefore
+    fuzzy-score a superset of the books a single process would: the merged
+    top books are the same or better scoring, but not always identical. With
+    limit=0 (no prefilter) they are identical.
+    """
+
+    def __init__(self, book_data, index=0, shards=1, limit=DEFAULT_CANDIDATES):
+        book_ids = book_data['bookId'].astype(str).to_numpy()
+        owned = np.array([shard_of(book_id, shards) == index for book_id in book_ids], dtype=bool)
+        self.index = index
+        self.shards = shards
+        self.rows = np.flatnonzero(owned)
+        self.book_ids = book_ids[owned]
+        self.rows.setflags(write=False)
+        self.book_ids.setflags(write=False)
+        scorer = RelevanceScorer.from_frame(book_data.iloc[self.rows])
+        token_index = None
+        if limit:
+            tokens = token_sets(*(text_column(book_data[name]) for name in TOKEN_COLUMNS))
+            token_index = TokenIndex([tokens[row] for row in self.rows], corpus=corpus_stats(tokens))
+        self.ranker = CandidateRanker(scorer, token_index, limit=limit)
+        self.facets = FacetIndex.from_frame(book_data.iloc[self.rows])
+
+    @classmethod
+    def from_csv(cls, path, index=0, shards=1, limit=DEFAULT_CANDIDATES):
+        return cls(pd.read_csv(path), index, shards, limit)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # timeout is not enforced here: a search in this process runs to the end.
+    # ShardCoordinator stops waiting for it and skips this shard while it is busy
+    def search(self, keywords, summary, k=TOP_N, timeout=None, facet_filter=None):
+        allowed = self.facets.allowed(facet_filter) if facet_filter else None
+        local, scores = self.ranker.rank(keywords, summary, allowed=allowed)
+        local, scores = local[:k], scores[:k]
+        return ShardHits(self.rows[local].tolist(), self.book_ids[local].tolist(), scores.tolist())
+
+
+class HttpShardClient:
+    """Talks to a shard served by create_shard_app, e.g. http://10.0.0.5:8101."""
+
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def search(self, keywords, summary, k=TOP_N, timeout=None, facet_filter=None):
+        query = {'keywords': list(keywords), 'summary': summary, 'k': k}
+        if facet_filter:
+            query['filter'] = facet_filter
+        body = json.dumps(query).encode()
+        search_request = urllib.request.Request(self.url + '/search', data=body, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(search_request, timeout=timeout) as response:
+            hits = json.loads(response.read())
+        return ShardHits(hits['rows'], hits['book_ids'], hits['scores'])
+
+    def __repr__(self):
+        return f'HttpShardClient({self.url!r})'
+
+
+# Best k of the shards' hits: highest score first, ties in catalog order
+def merge_hits(hits, k=TOP_N):
+    rows = np.array([row for hit in hits for row in hit.rows], dtype=np.int64)
+    book_ids = [book_id for hit in hits for book_id in hit.book_ids]
+    scores = np.array([score for hit in hits for score in hit.scores], dtype=np.float64)
+    order = np.lexsort((rows, -scores))[:k]
+    return [book_ids[i] for i in order], scores[order].tolist()
+
+
+class ShardedResult(namedtuple('ShardedResult', ['book_ids', 'scores', 'answered', 'failed', 'timed_out'])):
+    # Some shards did not answer, so better books may be missing
+    @property
+    def partial(self):
+        return bool(self.failed or self.timed_out)
+
+
+class ShardCoordinator:
+    """Fans a search out to every shard in parallel and merges their top books.
+
+    Shards are anything with search(keywords, summary, k, timeout, facet_filter): a
+    SearchShard in this process or an HttpShardClient. Shards that fail or
+    miss the timeout are left out and the result is marked partial; only
+    when none answer does search() raise ShardsUnavailable.
+
+    Each shard has its own pool of workers threads, one per concurrent
+    search. A call that outlives the timeout keeps its thread until it ends,
+    so a stuck shard can only use up its own threads; while all of them are
+    busy the shard is skipped (reported as timed out) instead of queueing
+    searches behind it.
+    """
+
+    def __init__(self, shards, timeout=DEFAULT_TIMEOUT_MS / 1000, workers=4):
+        self.shards = list(shards)
+        self.timeout = timeout
+        self._executors = [ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'shard-{i}')
+                           for i in range(len(self.shards))]
+        self._slots = [threading.BoundedSemaphore(workers) for _ in self.shards]
+        self._lock = threading.Lock()
+        self.searches = 0
+        self.partial = 0
+        self.unavailable = 0
+        self.errors = [0] * len(self.shards)
+        self.timeouts = [0] * len(self.shards)
+        self.busy = [0] * len(self.shards)
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    # Start shard i's search on one of its free threads; None if they are all busy
+    def _submit(self, i, *args):
+        slot = self._slots[i]
+        if not slot.acquire(blocking=False):
+            return None
+        try:
+            future = self._executors[i].submit(self.shards[i].search, *args)
+        except BaseException:
+            slot.release()
+            raise
+        future.add_done_callback(lambda _: slot.release())
+        return future
+
+    def search(self, keywords, summary, k=TOP_N, facet_filter=None):
+        start = time.perf_counter()
+        futures, busy = {}, []
+        for i in range(len(self.shards)):
+            future = self._submit(i, keywords, summary, k, self.timeout, facet_filter)
+            if future is None:
+                busy.append(i)
+            else:
+                futures[future] = i
+        done, not_done = wait(futures, timeout=self.timeout)
+        hits = [future.result() for future in done if future.exception() is None]
+        failed = sorted(futures[future] for future in done if future.exception() is not None)
+        timed_out = sorted([futures[future] for future in not_done] + busy)
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self.searches += 1
+            self.total_seconds += elapsed
+            self.max_seconds = max(self.max_seconds, elapsed)
+            for i in failed:
+                self.errors[i] += 1
+            for i in timed_out:
+                self.timeouts[i] += 1
+            for i in busy:
+                self.busy[i] += 1
+            if not hits:
+                self.unavailable += 1
+            elif failed or timed_out:
+                self.partial += 1
+        if not hits:
+            raise ShardsUnavailable(f'none of the {len(self.shards)} search shards answered')
+        book_ids, scores = merge_hits(hits, k)
+        return ShardedResult(book_ids, scores, len(hits), failed, timed_out)
+
+    def shutdown(self):
+        for executor in self._executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'shards': [repr(shard) for shard in self.shards],
+                'searches': self.searches,
+                'partial': self.partial,
+                'unavailable': self.unavailable,
+                'errors': list(self.errors),
+                'timeouts': list(self.timeouts),
+                'busy': list(self.busy),
+                'avg_ms': self.total_seconds * 1000 / self.searches if self.searches else 0.0,
+                'max_ms': self.max_seconds * 1000,
+            }
+
+
+def create_shard_app(shard):
+    app = Flask(__name__)
+
+    @app.route('/search', methods=['POST'])
+    def search():
+        query = request.get_json()
+        facet_filter = FacetFilter(*query['filter']) if query.get('filter') else None
+        hits = shard.search(query.get('keywords', []), query.get('summary', ''), int(query.get('k', TOP_N)),
+                            facet_filter=facet_filter)
+        return jsonify(shard=shard.index, rows=hits.rows, book_ids=hits.book_ids, scores=hits.scores)
+
+    @app.route('/health')
+    def health():
+        return jsonify(shard=shard.index, shards=shard.shards, books=len(shard))
+
+    return app
+
+
+# Build one shard and serve it; the bound port is sent on ready once it is listening
+def serve_shard(csv_path, index, shards, limit=DEFAULT_CANDIDATES, host='127.0.0.1', port=0, ready=None):
+    shard = SearchShard.from_csv(csv_path, index, shards, limit)
+    server = make_server(host, port, create_shard_app(shard), threaded=True)
+    if ready is not None:
+        ready.send(server.server_port)
+        ready.close()
+    server.serve_forever()
+
+
+class LocalShardCluster:
+    """Runs shards as child processes on this machine, each on its own port.
+
+    For development and tests: SEARCH_SHARDS=local:4 has the app start one
+    of these instead of talking to shard servers elsewhere.
+    """
+
+    def __init__(self, csv_path, shards, limit=DEFAULT_CANDIDATES, host='127.0.0.1', start_timeout=120):
+        context = multiprocessing.get_context('spawn')
+        self.processes = []
+        self.urls = []
+        try:
+            for index in range(shards):
+                receiver, sender = context.Pipe(duplex=False)
+                process = context.Process(target=serve_shard, args=(csv_path, index, shards, limit, host, 0, sender),
+                                          name=f'search-shard-{index}', daemon=True)
+                process.start()
+                sender.close()
+                self.processes.append((process, receiver))
+            for process, receiver in self.processes:
+                if not receiver.poll(start_timeout):
+                    raise RuntimeError(f'{process.name} did not start')
+                self.urls.append(f'http://{host}:{receiver.recv()}')
+        except BaseException:
+            self.close()
+            raise
+
+    def clients(self):
+        return [HttpShardClient(url) for url in self.urls]
+
+    def close(self):
+        for process, receiver in self.processes:
+            process.terminate()
+            process.join()
+            receiver.close()
+        self.processes = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+# Shards from SEARCH_SHARDS: comma-separated shard URLs, or local:N for N
+# child processes over csv_path. Returns (shards, cluster); cluster is None
+# unless local processes were started.
+def shards_from_config(value, csv_path, limit=DEFAULT_CANDIDATES):
+    if value.startswith('local:'):
+        cluster = LocalShardCluster(csv_path, int(value.split(':', 1)[1]), limit=limit)
+        return cluster.clients(), cluster
+    return [HttpShardClient(url.strip()) for url in value.split(',') if url.strip()], None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve one search shard of the catalog.')
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH)
+    parser.add_argument('--shard', type=int, required=True, help='index of this shard, from 0')
+    parser.add_argument('--shards', type=int, required=True, help='total number of shards')
+    parser.add_argument('--candidates', type=int, default=DEFAULT_CANDIDATES, help='prefilter limit, 0 scores every book')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8100)
+    args = parser.parse_args(argv)
+    if not 0 <= args.shard < args.shards:
+        parser.error('--shard must be between 0 and --shards - 1')
+    print(f'Serving shard {args.shard}/{args.shards} of {args.csv} on {args.host}:{args.port}')
+    serve_shard(args.csv, args.shard, args.shards, args.candidates, args.host, args.port)
+
+
+if __name__ == '__main__':
+    main()
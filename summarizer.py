@@ -0,0 +1,108 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+import torch
+from transformers import T5ForConditionalGeneration, T5Tokenizer
+from batching import BatchScheduler
+
+
+logger = logging.getLogger(__name__)
+
+# Inputs shorter than this (in words) are returned as they are
+MIN_WORDS = 15
+
+
+class T5Summarizer:
+    """Holds one T5 model in eval mode and summarizes user input with it.
+
+    With quantize=True the Linear layers are dynamically quantized to int8,
+    which is faster on CPU at a small cost in output quality.
+    """
+
+    def __init__(self, model_name="t5-base", quantize=False):
+        self.model_name = model_name
+        self.quantize = quantize
+        self.tokenizer = T5Tokenizer.from_pretrained(model_name)
+        model = T5ForConditionalGeneration.from_pretrained(model_name)
+        model.eval()
+        if quantize:
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.model = model
+
+        # Per-call timing
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+
+    def summarize(self, text):
+        return self.summarize_many([text])[0]
+
+    # Summarize several texts with one padded generate call
+    def summarize_many(self, texts):
+        summaries = list(texts)
+        long_texts = [i for i, text in enumerate(texts) if len(text.split()) >= MIN_WORDS]  # Skip summarization for short texts
+        if not long_texts:
+            return summaries
+
+        start = time.perf_counter()
+        inputs = self.tokenizer(["summarize: " + texts[i][:512] for i in long_texts], return_tensors="pt",
+                                max_length=512, truncation=True, padding=True)
+        with torch.inference_mode():
+            summary_ids = self.model.generate(**inputs, max_length=60, min_length=5, length_penalty=2.0, num_beams=3, early_stopping=True)
+        for i, summary in zip(long_texts, self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)):
+            summaries[i] = summary
+        self._record(time.perf_counter() - start)
+        return summaries
+
+    def _record(self, seconds):
+        with self._lock:
+            self.calls += 1
+            self.total_seconds += seconds
+            self.last_seconds = seconds
+        logger.info("t5 generate took %.1f ms", seconds * 1000)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'model': self.model_name,
+                'quantized': self.quantize,
+                'calls': self.calls,
+                'last_ms': self.last_seconds * 1000,
+                'avg_ms': self.total_seconds * 1000 / self.calls if self.calls else 0.0,
+            }
+
+
+class SummarizationScheduler(BatchScheduler):
+    """Batches summarize() calls from concurrent requests into one generate call.
+
+    See BatchScheduler; texts too short to summarize are answered right away.
+    """
+
+    def __init__(self, summarizer, max_batch=8, max_wait=0.01):
+        super().__init__(lambda texts: self.summarizer.summarize_many(texts), max_batch, max_wait, name='t5-scheduler')
+        self.summarizer = summarizer
+
+    def submit(self, text):
+        if len(text.split()) < MIN_WORDS:  # Nothing to generate
+            future = Future()
+            future.set_result(text)
+            return future
+        return super().submit(text)
+
+    def summarize(self, text):
+        return self.submit(text).result()
+
+
+# One summarizer per process and configuration
+_summarizers = {}
+_summarizers_lock = threading.Lock()
+
+
+def get_summarizer(model_name="t5-base", quantize=False):
+    key = (model_name, quantize)
+    with _summarizers_lock:
+        if key not in _summarizers:
+            _summarizers[key] = T5Summarizer(model_name, quantize=quantize)
+        return _summarizers[key]
@@ -172,6 +172,22 @@ class FlaskAppTests(unittest.TestCase):
         # self.assertIn(b'<li>keyword1</li>', response.data)
         # self.assertIn(b'<li>keyword2</li>', response.data)
 
+    def test_results_page_shows_the_job_in_the_url(self):
+        result_store = self.app.extensions['result_store']
+        catalog = self.app.extensions['catalog_manager'].current().catalog
+        first, second = catalog.get(catalog.book_ids[0]), catalog.get(catalog.book_ids[1])
+        result_store.put('job-a', ['dragons'], 'First search.', [first.bookId], [90.0])
+        result_store.put('job-b', ['space'], 'Second search.', [second.bookId], [80.0])
+        with self.client.session_transaction() as sess:
+            sess['job_id'] = 'job-b'
+            sess['job_ids'] = ['job-a', 'job-b']
+        self.assertIn(first.title, self.client.get('/results?job_id=job-a').get_data(as_text=True))
+        self.assertIn(second.title, self.client.get('/results').get_data(as_text=True))
+        # another session's search is not shown
+        with self.client.session_transaction() as sess:
+            sess['job_ids'] = ['job-b']
+        self.assertNotIn(first.title, self.client.get('/results?job_id=job-a').get_data(as_text=True))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,37 @@
+import threading
+import unittest
+from batching import BatchScheduler
+
+
+class BatchSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.batches = []
+        self.release = threading.Event()
+        self.scheduler = BatchScheduler(self.process_many, max_batch=3, max_wait=0.05)
+
+    def tearDown(self):
+        self.release.set()
+        self.scheduler.shutdown()
+
+    def process_many(self, items):
+        self.release.wait(5)
+        self.batches.append(list(items))
+        return [item * 2 for item in items]
+
+    def test_waiting_items_share_a_batch_up_to_max_batch(self):
+        futures = [self.scheduler.submit(i) for i in range(5)]
+        self.release.set()
+        self.assertEqual([future.result(5) for future in futures], [0, 2, 4, 6, 8])
+        self.assertEqual([len(batch) for batch in self.batches], [3, 2])
+        self.assertEqual(self.scheduler.stats()['avg_batch_size'], 2.5)
+
+    def test_errors_reach_every_caller(self):
+        self.scheduler.process_many = lambda items: 1 / 0
+        futures = [self.scheduler.submit(i) for i in range(2)]
+        for future in futures:
+            with self.assertRaises(ZeroDivisionError):
+                future.result(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+from benchmark import compare, run, synthetic_catalog
+from catalog import Catalog
+
+
+class SyntheticCatalogTest(unittest.TestCase):
+    def test_shape_and_unique_ids(self):
+        book_data = synthetic_catalog(500, seed=1)
+        self.assertEqual(len(book_data), 500)
+        self.assertTrue(book_data['bookId'].is_unique)
+        for column in ('title', 'author', 'rating', 'genres', 'characters', 'description', 'coverImg'):
+            self.assertIn(column, book_data.columns)
+        catalog = Catalog(book_data)
+        self.assertGreater(len(catalog.authors), 50)
+
+    def test_same_seed_same_catalog(self):
+        self.assertTrue(synthetic_catalog(50, seed=3).equals(synthetic_catalog(50, seed=3)))
+
+
+class RunTest(unittest.TestCase):
+    def test_reports_every_benchmark_per_size(self):
+        report = run([300], repeat=5)
+        self.assertEqual(report['meta']['rows'], [300])
+        for name in ('catalog_get', 'author_lookup_exact', 'author_lookup_fuzzy', 'get_book_images', 'find_relevant_books'):
+            result = report['results'][f'300/{name}']
+            self.assertGreater(result['calls'], 0)
+            self.assertLessEqual(result['min_ms'], result['p50_ms'])
+
+
+class CompareTest(unittest.TestCase):
+    def report(self, **timings):
+        return {'results': {name: {'min_ms': ms, 'p50_ms': ms} for name, ms in timings.items()}}
+
+    def test_flags_only_slowdowns_beyond_tolerance(self):
+        baseline = self.report(fast=10.0, slow=10.0, tiny=0.001, gone=1.0)
+        current = self.report(fast=11.0, slow=14.0, tiny=0.005, new=1.0)
+        comparisons = {c['name']: c for c in compare(current, baseline, tolerance=0.25)}
+        self.assertEqual(set(comparisons), {'fast', 'slow', 'tiny'})
+        self.assertFalse(comparisons['fast']['regression'])
+        self.assertTrue(comparisons['slow']['regression'])
+        # 5x slower, but below the noise floor
+        self.assertFalse(comparisons['tiny']['regression'])
+
+
+if __name__ == '__main__':
+    unittest.main()
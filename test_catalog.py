@@ -0,0 +1,169 @@
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from catalog import AuthorIndex, Catalog, MappedColumn, SamplePool, split_authors
+from search_index import SearchIndex, build_index
+
+
+class CatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.catalog = Catalog(pd.DataFrame({
+            'bookId': ['2767052-the-hunger-games', '1.Harry_Potter', '41865.Twilight'],
+            'title': ['The Hunger Games', 'Harry Potter and the Order of the Phoenix', 'Twilight'],
+            'author': ['Suzanne Collins', 'J.K. Rowling, Mary GrandPré (Illustrator)', 'Stephenie Meyer'],
+            'rating': [4.33, 4.5, 3.6],
+            'description': ['WINNING MEANS FAME AND FORTUNE.', np.nan, 'About three things I was absolutely positive.'],
+        }))
+
+    def test_get(self):
+        book = self.catalog.get('1.Harry_Potter')
+        self.assertEqual(book.title, 'Harry Potter and the Order of the Phoenix')
+        self.assertEqual(book.rating, 4.5)
+        self.assertTrue(np.isnan(book.description))
+        self.assertIsNone(self.catalog.get('missing'))
+
+    def test_get_many_keeps_order_and_skips_unknown(self):
+        books = self.catalog.get_many(['41865.Twilight', 'missing', '2767052-the-hunger-games'])
+        self.assertEqual([book.bookId for book in books], ['41865.Twilight', '2767052-the-hunger-games'])
+
+    def test_contains(self):
+        self.assertIn('41865.Twilight', self.catalog)
+        self.assertNotIn('41865', self.catalog)
+        self.assertEqual(len(self.catalog), 3)
+
+    def test_books_by_author(self):
+        books = self.catalog.records(self.catalog.authors.lookup('Mary GrandPré'))
+        self.assertEqual([book.bookId for book in books], ['1.Harry_Potter'])
+
+
+class IndexedCatalogTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        csv_path = os.path.join(self.tmp, 'data.csv')
+        pd.DataFrame({
+            'bookId': ['2767052-the-hunger-games', '1.Harry_Potter', '41865.Twilight', '2657.To_Kill_a_Mockingbird'],
+            'title': ['The Hunger Games', 'Harry Potter and the Order of the Phoenix', 'Twilight', 'To Kill a Mockingbird'],
+            'author': ['Suzanne Collins', 'J.K. Rowling, Mary GrandPré (Illustrator)', 'Stephenie Meyer', np.nan],
+            'rating': [4.33, 4.5, 3.6, 4.4],
+            'description': ['WINNING MEANS FAME AND FORTUNE.', np.nan, 'About three things I was absolutely positive.', 'The unforgettable novel.'],
+            'genres': ["['Young Adult']", "['Fantasy']", "['Romance']", "['Classics']"],
+            'characters': ["['Katniss Everdeen']", np.nan, "['Bella Swan']", "['Scout Finch']"],
+            'coverImg': ['https://img/1.jpg', np.nan, 'https://img/3.jpg', 'https://img/4.jpg'],
+        }).to_csv(csv_path, index=False)
+        build_index(csv_path, os.path.join(self.tmp, 'search_index'))
+        book_data = pd.read_csv(csv_path)
+        book_data['coverImg'] = book_data['coverImg'].replace(np.nan, '', regex=True)
+        self.loaded = Catalog(book_data)
+        self.mapped = Catalog.from_index(SearchIndex.load(os.path.join(self.tmp, 'search_index')))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def assertSameBooks(self, books, expected):
+        self.assertEqual([[None if pd.isna(value) else value for value in book] for book in books],
+                         [[None if pd.isna(value) else value for value in book] for book in expected])
+
+    def test_matches_the_catalog_read_from_the_csv(self):
+        self.assertIsInstance(self.mapped.column('description'), MappedColumn)
+        ids = ['41865.Twilight', 'missing', '1.Harry_Potter', '2657.To_Kill_a_Mockingbird']
+        self.assertSameBooks(self.mapped.get_many(ids), self.loaded.get_many(ids))
+        self.assertSameBooks(self.mapped.records(range(4)), self.loaded.records(range(4)))
+        self.assertIsNone(self.mapped.get('missing'))
+        self.assertEqual(len(self.mapped), 4)
+        self.assertEqual(self.mapped.authors.names, self.loaded.authors.names)
+        mask = np.array([True, False, True, True])
+        self.assertEqual(self.mapped.column('coverImg')[mask].tolist(), self.loaded.column('coverImg')[mask].tolist())
+        self.assertEqual(self.mapped.book_ids[[3, 0]].tolist(), self.loaded.book_ids[[3, 0]].tolist())
+
+    def test_updated_matches_the_catalog_read_from_the_csv(self):
+        upserts = pd.DataFrame({'bookId': ['41865.Twilight', 'new-1'], 'title': ['Twilight (Revised)', 'New Book'],
+                                'author': ['Stephenie Meyer', 'New Writer'], 'rating': [3.9, 4.8],
+                                'description': [np.nan, 'Brand new.'], 'genres': ["['Romance']", "['Drama']"],
+                                'characters': [np.nan, np.nan], 'coverImg': ['https://img/3b.jpg', 'https://img/5.jpg']})
+        mapped, mapped_changes = self.mapped.updated(upserts, ['1.Harry_Potter'])
+        loaded, loaded_changes = self.loaded.updated(upserts, ['1.Harry_Potter'])
+        self.assertEqual(mapped_changes.rows.tolist(), loaded_changes.rows.tolist())
+        self.assertSameBooks(mapped.records(range(5)), loaded.records(range(5)))
+        self.assertEqual((len(mapped), mapped.row_for('new-1'), mapped.get('1.Harry_Potter')), (4, 4, None))
+        self.assertEqual(mapped.authors.lookup('New Writer'), [4])
+        # the catalog it was updated from is unchanged
+        self.assertEqual(self.mapped.get('41865.Twilight').title, 'Twilight')
+        self.assertIn('1.Harry_Potter', self.mapped)
+
+    def test_sample_pool_reads_only_the_books_drawn(self):
+        pools = [SamplePool(catalog.column('coverImg'), catalog.column('bookId'), catalog.column('rating'),
+                            live=catalog.live, min_rating=4.3, size=2) for catalog in (self.mapped, self.loaded)]
+        self.assertEqual(pools[0].sample(random.Random(1)), pools[1].sample(random.Random(1)))
+        self.assertEqual(len(pools[0]), 3)
+
+
+class AuthorIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = AuthorIndex([
+            'Suzanne Collins (Goodreads Author)',
+            'J.K. Rowling, Mary GrandPré (Illustrator)',
+            'Stephenie Meyer',
+            'J.K. Rowling',
+            'Mary GrandPré (Illustrator), Someone Else',
+            np.nan,
+        ])
+
+    def test_split_authors(self):
+        self.assertEqual(split_authors('J.K. Rowling, Mary GrandPré (Illustrator)'), ['j.k. rowling', 'mary grandpré'])
+        self.assertEqual(split_authors(np.nan), [])
+
+    def test_exact_match_ignores_case_and_roles(self):
+        self.assertEqual(self.index.lookup('Suzanne Collins'), [0])
+        self.assertEqual(self.index.lookup('j.k. rowling'), [1, 3])
+
+    def test_multi_author_query_matches_books_by_all(self):
+        self.assertEqual(self.index.lookup('J.K. Rowling, Mary GrandPré (Illustrator)'), [1])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.index.lookup('Stephenie'), [2])
+
+    def test_regex_characters_are_literal(self):
+        self.assertEqual(self.index.lookup('J.K.*'), [])
+
+    def test_fuzzy_match(self):
+        self.assertEqual(self.index.lookup('Suzane Colins'), [0])
+        self.assertEqual(self.index.lookup('Suzane Colins', fuzzy=False), [])
+
+
+class SamplePoolTests(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        ratings = [4.5 if i % 2 else 3.0 for i in range(40)]
+        self.pool = SamplePool([f'cover{i}' for i in range(40)], [str(i) for i in range(40)], ratings,
+                               size=12, rotate_seconds=60, clock=lambda: self.now)
+
+    def test_only_high_ratings_are_drawn(self):
+        self.assertEqual(len(self.pool), 20)
+        images = self.pool.sample()
+        self.assertEqual(len(images), 12)
+        self.assertEqual(len(set(images)), 12)
+        self.assertTrue(all(int(book_id) % 2 for _, book_id in images))
+
+    def test_small_pool_returns_everything(self):
+        pool = SamplePool(['a', 'b'], ['1', '2'], [4.4, 4.9])
+        self.assertEqual(pool.sample(), [('a', '1'), ('b', '2')])
+
+    def test_carousel_rotates_per_window(self):
+        first = self.pool.carousel()
+        self.now = 59
+        self.assertEqual(self.pool.carousel(), first)
+        self.assertEqual(self.pool.seconds_left(), 1)
+        self.now = 61
+        self.assertEqual(self.pool.carousel()[0], first[0] + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,149 @@
+import json
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from catalog import Catalog, SamplePool
+from catalog_updates import CatalogManager, make_delta, read_delta
+from prefilter import CandidateRanker, TokenIndex
+from scoring import RelevanceScorer
+from test_scoring import make_books
+
+
+def make_catalog_books(count):
+    books = make_books(count)
+    books['author'] = [f'Author {i % 7}' for i in range(count)]
+    books['rating'] = [4.0 + (i % 10) / 10 for i in range(count)]
+    books['coverImg'] = [f'https://covers.example/{i}.jpg' for i in range(count)]
+    return books
+
+
+def build_ranker(books, limit):
+    scorer = RelevanceScorer.from_frame(books)
+    return CandidateRanker(scorer, TokenIndex.from_columns(scorer.titles, scorer.genres, scorer.characters), limit=limit)
+
+
+def sample_pool(catalog):
+    return SamplePool(catalog.column('coverImg'), catalog.column('bookId'), catalog.column('rating'), live=catalog.live, min_rating=4.5)
+
+
+NEW_BOOK = {'bookId': 'new-1', 'title': 'dragon war', 'genres': "['Dragon', 'War']", 'characters': 'king',
+            'description': 'dragon war at sea', 'author': 'Author 3, New Writer', 'rating': 4.9, 'coverImg': 'new.jpg'}
+
+
+class DeltaFileTests(unittest.TestCase):
+    def test_later_lines_win(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, '001.jsonl')
+            with open(path, 'w') as f:
+                f.write(json.dumps({'upsert': {'bookId': 1, 'title': 'first'}}) + '\n\n')
+                f.write(json.dumps({'delete': '1'}) + '\n')
+                f.write(json.dumps({'delete': '2'}) + '\n')
+                f.write(json.dumps({'upsert': {'bookId': '2', 'title': 'back'}}) + '\n')
+            delta = read_delta(path)
+        self.assertEqual(delta.deletions, ['1'])
+        self.assertEqual(delta.upserts.to_dict('records'), [{'bookId': '2', 'title': 'back'}])
+        self.assertEqual(len(delta.digest), 40)
+
+
+class CatalogUpdateTests(unittest.TestCase):
+    def setUp(self):
+        self.books = make_catalog_books(60)
+        self.catalog = Catalog(self.books)
+
+    def test_upsert_keeps_row_and_appends_new_books(self):
+        changed = dict(self.books.iloc[5], title='retitled', author='Someone Else')
+        catalog, changes = self.catalog.updated(make_delta([changed, NEW_BOOK]).upserts)
+        self.assertEqual(catalog.row_for('5'), 5)
+        self.assertEqual(catalog.get('5').title, 'retitled')
+        self.assertEqual(catalog.row_for('new-1'), 60)
+        self.assertEqual(catalog.get('new-1').rating, 4.9)
+        self.assertEqual(changes.rows.tolist(), [5, 60])
+        self.assertEqual(len(catalog), 61)
+        # the old catalog is untouched
+        self.assertEqual(self.catalog.get('5').title, self.books['title'][5])
+        self.assertIsNone(self.catalog.get('new-1'))
+
+    def test_deleted_books_become_tombstones(self):
+        catalog, changes = self.catalog.updated(make_delta(deletions=['3', 'missing']).upserts, ['3', 'missing'])
+        self.assertIsNone(catalog.get('3'))
+        self.assertEqual(catalog.row_for('4'), 4)
+        self.assertFalse(catalog.live[3])
+        self.assertEqual(changes.removed.tolist(), [3])
+        self.assertEqual(len(catalog), 59)
+        self.assertNotIn(3, catalog.authors.lookup('Author 3'))
+
+    def test_author_index_follows_updates(self):
+        changed = dict(self.books.iloc[0], author='New Writer')
+        catalog, _ = self.catalog.updated(make_delta([changed, NEW_BOOK]).upserts)
+        self.assertNotIn(0, catalog.authors.lookup('Author 0'))
+        self.assertEqual(catalog.authors.lookup('New Writer'), [0, 60])
+        self.assertIn(60, catalog.authors.lookup('Author 3'))
+        self.assertIn('new writer', catalog.authors.prefix('new'))
+
+
+class CatalogManagerTests(unittest.TestCase):
+    def setUp(self):
+        self.books = make_catalog_books(300)
+        self.manager = CatalogManager(Catalog(self.books), sample_pool, load_ranker=lambda: build_ranker(self.books, 300), version='v0')
+        changed = dict(self.books.iloc[10], title='dragon magic sea king', genres="['Sea']")
+        self.delta = make_delta([changed, NEW_BOOK], deletions=['20', '21'], digest='abc')
+        # The same books, built from scratch
+        expected = self.books.set_index('bookId').drop(['20', '21'])
+        expected.loc['10', ['title', 'genres']] = ['dragon magic sea king', "['Sea']"]
+        self.expected_books = pd.concat([expected.reset_index(), pd.DataFrame([NEW_BOOK])], ignore_index=True)
+
+    def test_updated_ranker_matches_a_rebuild(self):
+        snapshot = self.manager.apply(self.delta)
+        fresh = build_ranker(self.expected_books, 300)
+        fresh_ids = self.expected_books['bookId'].to_numpy()
+        for keywords, summary in [(['dragon magic', 'sea king'], 'dragon war at sea'), (['love war'], 'space war'), ([], 'magic')]:
+            rows, scores = snapshot.ranker.rank(keywords, summary)
+            expected_rows, expected_scores = fresh.rank(keywords, summary)
+            self.assertEqual(snapshot.catalog.book_ids[rows].tolist(), fresh_ids[expected_rows].tolist())
+            np.testing.assert_array_equal(scores, expected_scores)
+            self.assertFalse({'20', '21'} & set(snapshot.catalog.book_ids[rows]))
+
+    def test_updated_token_index_matches_a_rebuild(self):
+        ranker = self.manager.apply(self.delta).ranker
+        fresh = build_ranker(self.expected_books, 300).token_index
+        live_rows = np.flatnonzero(self.manager.current().catalog.live)
+        for token, rows in fresh.postings.items():
+            self.assertEqual(live_rows[rows].tolist(), ranker.token_index.postings[token].tolist(), token)
+        self.assertEqual(set(ranker.token_index.postings), set(fresh.postings))
+
+    def test_snapshots_are_swapped_whole(self):
+        before = self.manager.current()
+        after = self.manager.apply(self.delta, 'delta-1')
+        self.assertIs(self.manager.current(), after)
+        self.assertEqual((before.generation, after.generation), (0, 1))
+        self.assertNotEqual(after.version, before.version)
+        # a request holding the old snapshot still sees the old books
+        self.assertIsNotNone(before.catalog.get('20'))
+        self.assertIsNone(before.catalog.get('new-1'))
+        pool_ids = after.sample_pool.book_ids[after.sample_pool.rows]
+        self.assertNotIn('20', pool_ids)
+        self.assertIn('new-1', pool_ids)
+        stats = self.manager.stats()
+        self.assertEqual((stats['generation'], stats['books'], stats['tombstones'], stats['applied']), (1, 299, 2, ['delta-1']))
+
+    def test_apply_pending_in_name_order_once(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for name, lines in [('002.jsonl', [{'delete': 'new-1'}]), ('001.jsonl', [{'upsert': NEW_BOOK}]),
+                                ('003.jsonl', ['not json']), ('004.jsonl', [{'upsert': 'x'}]), ('notes.txt', [])]:
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(''.join(json.dumps(line) if isinstance(line, dict) else line + '\n' for line in lines))
+            with self.assertLogs('catalog_updates', 'ERROR'):
+                self.assertEqual(self.manager.apply_pending(directory), ['001.jsonl', '002.jsonl'])
+            self.assertEqual(self.manager.apply_pending(directory), [])
+            self.manager.poll(directory, interval=0).join()
+        snapshot = self.manager.current()
+        self.assertEqual(snapshot.generation, 2)
+        self.assertIsNone(snapshot.catalog.get('new-1'))
+        self.assertEqual(list(self.manager.failed), ['003.jsonl', '004.jsonl'])
+        self.assertTrue(self.manager.failed['004.jsonl'].startswith('TypeError'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import importlib.util
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+import numpy as np
+from catalog import Catalog
+from prefilter import CandidateRanker, TokenIndex
+from scoring import RelevanceScorer
+from test_scoring import WORDS, make_books
+
+
+def random_queries(count, seed=0):
+    rng = random.Random(seed)
+    return [([' '.join(rng.sample(WORDS, 2)) for _ in range(rng.randint(0, 3))], ' '.join(rng.choices(WORDS, k=8)))
+            for _ in range(count)]
+
+
+class SharedStateTests(unittest.TestCase):
+    def setUp(self):
+        self.books = make_books(300)
+        self.scorer = RelevanceScorer.from_frame(self.books)
+        self.ranker = CandidateRanker(self.scorer, TokenIndex.from_columns(self.scorer.titles, self.scorer.genres, self.scorer.characters), limit=50)
+
+    def test_shared_arrays_are_read_only(self):
+        arrays = [self.scorer.titles, self.scorer.genres, self.scorer.characters, self.scorer.descriptions,
+                  self.ranker.token_index.weights, next(iter(self.ranker.token_index.postings.values())),
+                  Catalog(self.books.assign(author='a')).book_ids]
+        for array in arrays:
+            with self.assertRaises(ValueError):
+                array[0] = array[1]
+
+    def test_concurrent_searches_match_sequential(self):
+        queries = random_queries(40) * 5
+        expected = [self.ranker.rank(keywords, summary) for keywords, summary in queries]
+        with ThreadPoolExecutor(max_workers=16) as executor:
+            results = list(executor.map(lambda query: self.ranker.rank(*query), queries))
+        for (expected_rows, expected_scores), (rows, scores) in zip(expected, results):
+            np.testing.assert_array_equal(rows, expected_rows)
+            np.testing.assert_array_equal(scores, expected_scores)
+
+
+# Many searches at once against the whole app, served on threads the way gunicorn's
+# gthread workers serve it. The query cache is off, so every search really ranks.
+@unittest.skipUnless(importlib.util.find_spec('sendgrid'), 'the app needs sendgrid')
+class AppStressTest(unittest.TestCase):
+    clients = 16
+    searches = 4
+
+    def test_repeated_searches_return_the_same_books(self):
+        from benchmark import USER_INPUTS, synthetic_catalog
+        from loadtest import Client, start_app
+
+        with tempfile.TemporaryDirectory() as workdir:
+            csv_path = os.path.join(workdir, 'data.csv')
+            synthetic_catalog(500).to_csv(csv_path, index=False)
+            environ = {'DATA_CSV_PATH': csv_path, 'QUERY_CACHE_SIZE': '0', 'RECOMMENDATION_WORKERS': '8',
+                       'RECOMMENDATION_MAX_PENDING': str(self.clients * self.searches), 'MODEL_LOADING': 'lazy'}
+            with patch.dict(os.environ, environ):
+                server, app = start_app(workdir, self.clients)
+            try:
+                base_url = f'http://127.0.0.1:{server.server_port}'
+                result_store = app.extensions['result_store']
+                results = {}
+                lock = threading.Lock()
+
+                def run(i):
+                    client = Client(base_url, f'loadtest{i}', [], USER_INPUTS, {'extract': 1}, random.Random(i))
+                    client.login()
+                    for n in range(self.searches):
+                        query = USER_INPUTS[(i + n) % len(USER_INPUTS)]
+                        _, headers, _ = client.request('/extract', {'user_input': query})
+                        job_id = headers.get('Location', '').rsplit('/', 1)[-1]
+                        deadline = time.time() + 60
+                        while time.time() < deadline:
+                            if json.loads(client.request(f'/results/{job_id}')[2])['status'] in ('done', 'failed'):
+                                break
+                            time.sleep(0.02)
+                        result = result_store.get(job_id)
+                        with lock:
+                            results.setdefault(query, []).append(result and (result.book_ids, result.scores))
+
+                threads = [threading.Thread(target=run, args=(i,)) for i in range(self.clients)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            finally:
+                server.shutdown()
+
+        self.assertEqual(sum(len(rankings) for rankings in results.values()), self.clients * self.searches)
+        for query, rankings in results.items():
+            self.assertIsNotNone(rankings[0], query)
+            self.assertEqual(len(rankings[0][0]), 15)
+            self.assertEqual(set(rankings), {rankings[0]}, query)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,62 @@
+import sqlite3
+import threading
+import unittest
+from connect import ConnectionPool, PoolTimeout
+
+
+# A local SQLite stand-in for MySQL
+def sqlite_connection():
+    return sqlite3.connect(':memory:', check_same_thread=False)
+
+
+class ConnectionPoolTests(unittest.TestCase):
+
+    def test_connections_are_reused(self):
+        pool = ConnectionPool(sqlite_connection, size=2)
+        for _ in range(5):
+            with pool.cursor() as (connection, cursor):
+                cursor.execute('SELECT 1')
+                self.assertEqual(cursor.fetchone(), (1,))
+        stats = pool.stats()
+        self.assertEqual(stats['opened'], 1)
+        self.assertEqual(stats['checkouts'], 5)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_connection_returned_after_error(self):
+        pool = ConnectionPool(sqlite_connection, size=1, timeout=0.1)
+        with self.assertRaises(sqlite3.OperationalError):
+            with pool.cursor() as (connection, cursor):
+                cursor.execute('SELECT * FROM missing_table')
+        with pool.cursor() as (connection, cursor):
+            cursor.execute('SELECT 1')
+        self.assertEqual(pool.stats()['opened'], 2)  # the failed connection was not reused
+
+    def test_waits_for_a_free_connection(self):
+        pool = ConnectionPool(sqlite_connection, size=1, timeout=5)
+        connection = pool.acquire()
+        threading.Timer(0.05, connection.close).start()
+        with pool.cursor():
+            pass
+        self.assertGreater(pool.stats()['max_wait_ms'], 0)
+
+    def test_times_out_when_exhausted(self):
+        pool = ConnectionPool(sqlite_connection, size=1, timeout=0.05)
+        connection = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        connection.close()
+        connection.close()  # closing twice must not free two slots
+        pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+    def test_old_connections_are_recycled(self):
+        pool = ConnectionPool(sqlite_connection, size=1, recycle=0)
+        pool.acquire().close()
+        pool.acquire().close()
+        self.assertEqual(pool.stats()['opened'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
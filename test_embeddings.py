@@ -0,0 +1,102 @@
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+import numpy as np
+from embeddings import INT8_SCALE, EmbeddingIndex, quantize_int8
+
+
+def unit_vectors(count, dims, seed=0):
+    vectors = np.random.default_rng(seed).normal(size=(count, dims)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+class FixedQueryIndex(EmbeddingIndex):
+    """Skips the sentence-transformers model: the query text is a row number."""
+
+    def __init__(self, vectors, queries):
+        super().__init__(vectors)
+        self.queries = queries
+
+    def embed(self, text):
+        return self.queries[int(text)]
+
+
+class EmbeddingIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.vectors = unit_vectors(1000, 32)
+
+    def test_search_returns_closest_books_first(self):
+        index = FixedQueryIndex(self.vectors, self.vectors)
+        rows, scores = index.search('42', k=5)
+        self.assertEqual(rows[0], 42)
+        self.assertAlmostEqual(float(scores[0]), 1.0, places=5)
+        expected = np.argsort(-(self.vectors @ self.vectors[42]), kind='stable')[:5]
+        self.assertEqual(rows.tolist(), expected.tolist())
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+
+    def test_int8_embeddings_agree_with_float32(self):
+        quantized = np.clip(np.rint(self.vectors * INT8_SCALE), -127, 127).astype(np.int8)
+        float_index = FixedQueryIndex(self.vectors, self.vectors)
+        int8_index = FixedQueryIndex(quantized, self.vectors)
+        np.testing.assert_allclose(int8_index.similarities(self.vectors[7]), float_index.similarities(self.vectors[7]), atol=0.05)
+        self.assertEqual(int8_index.search('7', k=1)[0][0], 7)
+
+    def test_k_larger_than_catalog(self):
+        index = FixedQueryIndex(self.vectors[:3], self.vectors)
+        rows, _ = index.search('0', k=15)
+        self.assertEqual(sorted(rows.tolist()), [0, 1, 2])
+
+    def test_search_skips_deleted_books(self):
+        index = FixedQueryIndex(self.vectors[:5], self.vectors)
+        live = np.array([True, True, False, True, False])
+        rows, _ = index.search('2', k=15, live=live)
+        self.assertEqual(sorted(rows.tolist()), [0, 1, 3])
+
+
+# Stands in for the model in updated(): each text is the row of the vector to embed it as
+def encode_rows(vectors):
+    return lambda texts, model_name=None: vectors[[int(text) for text in texts]]
+
+
+class UpdatedIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.vectors = unit_vectors(1000, 32)
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'embeddings.npy')
+        np.save(path, self.vectors[:100])
+        self.mapped = np.load(path, mmap_mode='r')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_updates_go_to_an_overlay(self):
+        index = EmbeddingIndex(self.mapped)
+        with patch('embeddings.encode', encode_rows(self.vectors)):
+            # book 5 re-embedded as vector 500, a new book 100 as vector 501, book 7 deleted
+            first = index.updated(101, [5, 100], ['500', '501'], removed=[7])
+            second = first.updated(102, [5, 101], ['502', '503'])
+        self.assertIs(second.vectors, self.mapped)
+        self.assertEqual((len(second), second.overlay.shape[0]), (102, 3))
+        expected = np.concatenate([self.vectors[:100], self.vectors[[501, 503]]])
+        expected[5] = self.vectors[502]
+        np.testing.assert_allclose(second.similarities(self.vectors[9]), expected @ self.vectors[9], rtol=1e-5)
+        second.embed = lambda text: self.vectors[int(text)]
+        self.assertEqual(second.search('502', k=1)[0].tolist(), [5])
+        self.assertEqual(second.search('503', k=1)[0].tolist(), [101])
+        self.assertNotIn(7, second.search('7', k=10)[0].tolist())
+        # the index it was updated from still has the old vectors
+        np.testing.assert_allclose(index.similarities(self.vectors[5]), self.vectors[:100] @ self.vectors[5], rtol=1e-5)
+
+    def test_int8_overlay(self):
+        index = EmbeddingIndex(quantize_int8(self.vectors[:100]))
+        with patch('embeddings.encode', encode_rows(self.vectors)):
+            updated = index.updated(101, [100], ['600'])
+        self.assertEqual(updated.overlay.dtype, np.int8)
+        self.assertAlmostEqual(float(updated.similarities(self.vectors[600])[100]), 1.0, places=1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+import unittest
+import numpy as np
+import pandas as pd
+from werkzeug.datastructures import MultiDict
+from catalog import Catalog
+from catalog_updates import make_delta, updated_facets
+from facets import FacetFilter, FacetIndex, parse_genres
+from prefilter import CandidateRanker, TokenIndex
+from scoring import RelevanceScorer
+from test_catalog_updates import make_catalog_books
+
+
+def make_facet_books(count):
+    books = make_catalog_books(count)
+    books['rating'] = [3.0 + (i % 20) / 10 for i in range(count)]
+    books['pages'] = [str(50 + 37 * i % 900) if i % 11 else 'unknown' for i in range(count)]
+    return books
+
+
+# The rows a filter should allow, worked out from the columns directly
+def expected_rows(books, genres=(), ratings=None, pages=None, live=None):
+    allowed = np.ones(len(books), dtype=bool) if live is None else live.copy()
+    parsed = [{name.casefold() for name in parse_genres(value)} for value in books['genres']]
+    for name in genres:
+        allowed &= [name.casefold() in names for names in parsed]
+    if ratings is not None:
+        allowed &= ratings(books['rating'].to_numpy(dtype=float))
+    if pages is not None:
+        allowed &= pages(pd.to_numeric(books['pages'], errors='coerce').to_numpy(dtype=float))
+    return np.flatnonzero(allowed).tolist()
+
+
+class FacetFilterTests(unittest.TestCase):
+    def test_parse_genres(self):
+        self.assertEqual(parse_genres("['Fantasy', \"Children's\", 'Young Adult']"), ['Fantasy', "Children's", 'Young Adult'])
+        self.assertEqual(parse_genres('[]'), [])
+        self.assertEqual(parse_genres(float('nan')), [])
+
+    def test_from_args(self):
+        args = MultiDict([('genre', 'Fantasy, Magic'), ('genre', 'fantasy'), ('genre', ''),
+                          ('rating', '4.5'), ('rating', 'bogus'), ('pages', 'short'), ('pages', '')])
+        facet_filter = FacetFilter.from_args(args)
+        self.assertEqual(facet_filter, (('Fantasy', 'Magic', 'fantasy'), ('4.5',), ('short',)))
+        self.assertFalse(FacetFilter.from_args(MultiDict([('genre', ' '), ('rating', '')])))
+        self.assertEqual(facet_filter.toggled('ratings', '4.5').toggled('pages', 'long').to_args(),
+                         {'genre': ['Fantasy', 'Magic', 'fantasy'], 'rating': [], 'pages': ['short', 'long']})
+        self.assertEqual(FacetFilter(['B', 'a']).key(), FacetFilter(['A', 'b']).key())
+
+
+class FacetIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.books = make_facet_books(203)
+        self.catalog = Catalog(self.books)
+        self.facets = FacetIndex.from_catalog(self.catalog)
+
+    def rows(self, facet_filter):
+        return np.flatnonzero(self.facets.allowed(facet_filter)).tolist()
+
+    def test_filters_match_the_columns(self):
+        genre = self.facets.genres[0]
+        self.assertEqual(self.rows(FacetFilter()), list(range(203)))
+        self.assertEqual(self.rows(FacetFilter([genre.upper()])), expected_rows(self.books, [genre]))
+        self.assertEqual(self.rows(FacetFilter([genre, self.facets.genres[1]])),
+                         expected_rows(self.books, [genre, self.facets.genres[1]]))
+        self.assertEqual(self.rows(FacetFilter(ratings=['4.5', '0'])),
+                         expected_rows(self.books, ratings=lambda r: (r >= 4.5) | (r < 3.5)))
+        self.assertEqual(self.rows(FacetFilter([genre], ['4'], ['medium', 'epic'])),
+                         expected_rows(self.books, [genre], lambda r: (r >= 4) & (r < 4.5),
+                                       lambda p: ((p >= 200) & (p < 400)) | (p >= 600)))
+        self.assertEqual(self.rows(FacetFilter(['No Such Genre'])), [])
+
+    def test_counts(self):
+        rows = list(range(0, 203, 3))
+        counts = self.facets.counts(self.facets.bitmap(rows), top_genres=3)
+        self.assertEqual(counts['total'], len(rows))
+        self.assertEqual(len(counts['genres']), 3)
+        for name, count in counts['genres']:
+            self.assertEqual(count, len(set(rows) & set(expected_rows(self.books, [name]))))
+        for bucket, count in counts['ratings']:
+            self.assertEqual(count, len(set(rows) & set(self.rows(FacetFilter(ratings=[bucket.key])))))
+        # books with an unknown page count are in no bucket
+        self.assertEqual(sum(count for _, count in counts['pages']), sum(1 for row in rows if row % 11))
+
+    def test_updated_matches_a_rebuild(self):
+        changed = dict(self.books.iloc[7], genres="['Brand New', 'Sea']", rating=4.9, pages='120')
+        new_book = dict(self.books.iloc[0], bookId='new-1', genres="['Brand New']", rating=3.2, pages='700')
+        catalog, changes = self.catalog.updated(make_delta([changed, new_book], ['9', '200']).upserts, ['9', '200'])
+        facets = updated_facets(self.facets, catalog, changes)
+        expected_books = pd.DataFrame({name: catalog.column(name) for name in ('genres', 'rating', 'pages')})
+        rebuilt = FacetIndex(expected_books['genres'], expected_books['rating'], expected_books['pages'], live=catalog.live)
+        for facet_filter in [FacetFilter(), FacetFilter(['Brand New']), FacetFilter(['Sea'], ['4.5']),
+                             FacetFilter(pages=['short', 'epic']), FacetFilter(ratings=['0'])]:
+            np.testing.assert_array_equal(facets.allowed(facet_filter), rebuilt.allowed(facet_filter))
+        self.assertEqual(np.flatnonzero(facets.allowed(FacetFilter(['brand new']))).tolist(), [7, 203])
+        self.assertFalse(facets.allowed(FacetFilter())[[9, 200]].any())
+        # the old index is untouched
+        self.assertEqual(self.rows(FacetFilter(['Brand New'])), [])
+
+
+class FilteredRankingTests(unittest.TestCase):
+    def test_ranking_only_returns_allowed_rows(self):
+        books = make_facet_books(400)
+        scorer = RelevanceScorer.from_frame(books)
+        facets = FacetIndex.from_frame(books)
+        allowed = facets.allowed(FacetFilter(ratings=['4.5', '4']))
+        for limit in (0, 400):
+            ranker = CandidateRanker(scorer, TokenIndex.from_columns(scorer.titles, scorer.genres, scorer.characters), limit=limit)
+            rows, scores = ranker.rank(['dragon magic'], 'a dragon at sea', allowed=allowed)
+            self.assertTrue(allowed[rows].all())
+            # the same as ranking the allowed books on their own
+            subset = np.flatnonzero(allowed)
+            alone = CandidateRanker(RelevanceScorer.from_frame(books.iloc[subset]), None, limit=0)
+            expected_rows, expected_scores = alone.rank(['dragon magic'], 'a dragon at sea')
+            if limit == 0:
+                self.assertEqual(rows.tolist(), subset[expected_rows].tolist())
+                np.testing.assert_array_equal(scores, expected_scores)
+        none = np.zeros(len(books), dtype=bool)
+        self.assertEqual(len(ranker.rank(['dragon'], 'dragon', allowed=none)[0]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import importlib.util
+import io
+import os
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from PIL import Image
+from images import InvalidImage, ProfileImageStore, check_image, content_key, make_thumbnails
+
+
+def encoded_image(size=(640, 480), mode='RGB', image_format='JPEG', color='red'):
+    out = io.BytesIO()
+    Image.new(mode, size, color).save(out, image_format)
+    return out.getvalue()
+
+
+class ThumbnailTests(unittest.TestCase):
+    def test_square_thumbnails_in_both_formats(self):
+        thumbnails = make_thumbnails(encoded_image((1200, 800)), size=128)
+        self.assertEqual(set(thumbnails), {'webp', 'jpg'})
+        for extension, image_format in (('webp', 'WEBP'), ('jpg', 'JPEG')):
+            with Image.open(io.BytesIO(thumbnails[extension])) as image:
+                self.assertEqual((image.format, image.size, image.mode), (image_format, (128, 128), 'RGB'))
+
+    def test_transparency_and_orientation(self):
+        with Image.open(io.BytesIO(make_thumbnails(encoded_image((64, 32), 'RGBA', 'PNG', (0, 0, 0, 0)), 32)['jpg'])) as image:
+            self.assertGreater(min(image.getpixel((16, 16))), 240)  # transparent becomes white
+        # orientation 6 shows the stored image turned clockwise: its left (red) half ends up on top
+        stored = Image.new('RGB', (200, 100), 'blue')
+        stored.paste((255, 0, 0), (0, 0, 100, 100))
+        exif = Image.Exif()
+        exif[0x0112] = 6
+        out = io.BytesIO()
+        stored.save(out, 'JPEG', exif=exif)
+        with Image.open(io.BytesIO(make_thumbnails(out.getvalue(), 50)['jpg'])) as image:
+            top, bottom = image.getpixel((25, 5)), image.getpixel((25, 45))
+        self.assertGreater(top[0], 200)
+        self.assertGreater(bottom[2], 200)
+
+    def test_check_rejects_bad_uploads(self):
+        with self.assertRaises(InvalidImage):
+            check_image(b'not an image')
+        with self.assertRaises(InvalidImage):
+            check_image(encoded_image((100, 100)), max_pixels=5000)
+        with self.assertRaises(InvalidImage):
+            check_image(encoded_image(), max_bytes=10)
+        check_image(encoded_image())
+
+
+class ProfileImageStoreTests(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = ProfileImageStore(self.directory.name, size=64)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_upload_is_stored_under_its_content_hash(self):
+        data = encoded_image()
+        key = self.store.submit(data)
+        self.assertEqual(key, content_key(data))
+        self.assertTrue(self.store.wait(key, timeout=10))
+        self.assertEqual(sorted(os.listdir(self.directory.name)), [f'{key}-64.jpg', f'{key}-64.webp'])
+
+    def test_duplicate_uploads_are_processed_once(self):
+        data = encoded_image(color='blue')
+        keys = {self.store.submit(data) for _ in range(3)}
+        self.assertTrue(self.store.wait(keys.pop(), timeout=10))
+        self.assertEqual(self.store.submit(data), content_key(data))
+        stats = self.store.stats()
+        self.assertEqual((stats['processed'], stats['duplicates'], stats['pending']), (1, 3, 0))
+
+    def test_on_ready_only_after_thumbnails_exist(self):
+        ready = []
+        called = threading.Event()
+        data = encoded_image(color='green')
+
+        def on_ready(key):
+            ready.append((key, self.store.exists(key)))
+            called.set()
+
+        key = self.store.submit(data, on_ready=on_ready)
+        self.assertTrue(called.wait(timeout=10))
+        self.store.submit(data, on_ready=ready.append)  # already processed: called right away
+        self.assertEqual(ready, [(key, True), key])
+
+    def test_failed_processing_is_logged_and_not_ready(self):
+        ready = []
+        truncated = encoded_image((800, 600))[:2000]  # the header checks out, decoding does not
+        with self.assertLogs('images', 'ERROR'):
+            key = self.store.submit(truncated, on_ready=ready.append)
+            self.assertFalse(self.store.wait(key, timeout=10))
+        self.assertEqual((ready, self.store.stats()['failed']), ([], 1))
+
+    def test_unknown_key_is_not_ready(self):
+        self.assertFalse(self.store.wait('0' * 64, timeout=0))
+        with self.assertRaises(InvalidImage):
+            self.store.submit(b'GIF89a broken')
+
+
+# The profile route against the loadtest stand-in database, with one pooled connection
+@unittest.skipUnless(importlib.util.find_spec('sendgrid'), 'the app needs sendgrid')
+class ProfileUploadTests(unittest.TestCase):
+    def test_same_image_twice_with_one_connection(self):
+        from connect import get_pool
+        from benchmark import synthetic_catalog
+        from loadtest import start_app
+
+        with tempfile.TemporaryDirectory() as workdir:
+            csv_path = os.path.join(workdir, 'data.csv')
+            synthetic_catalog(50).to_csv(csv_path, index=False)
+            environ = {'DATA_CSV_PATH': csv_path, 'DB_POOL_SIZE': '1', 'MODEL_LOADING': 'lazy',
+                       'PROFILE_IMAGE_DIR': os.path.join(workdir, 'profile_images')}
+            with patch.dict(os.environ, environ):
+                server, app = start_app(workdir, users=1)
+            pool = get_pool()
+            pool.timeout = 1
+            try:
+                client = app.test_client()
+                with client.session_transaction() as session:
+                    session['user_id'] = 1
+                data = encoded_image(color='purple')
+                for _ in range(2):
+                    response = client.post('/profile', data={'profile_image': (io.BytesIO(data), 'me.jpg')},
+                                           content_type='multipart/form-data')
+                    self.assertEqual(response.status_code, 200)
+                    self.assertNotIn('An error occurred', response.get_data(as_text=True))
+                    self.assertTrue(app.extensions['profile_images'].wait(content_key(data), timeout=10))
+                with pool.cursor() as (connection, cursor):
+                    cursor.execute('SELECT ProfileImage FROM users WHERE UserId = %s', (1,))
+                    self.assertEqual(cursor.fetchone()[0], content_key(data))
+                self.assertEqual(pool.stats()['timeouts'], 0)
+            finally:
+                server.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
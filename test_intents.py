@@ -0,0 +1,58 @@
+import random
+import unittest
+from intents import IntentClassifier
+
+
+INTENTS = [
+    {'tag': 'greeting', 'patterns': ['Hello', 'Hi', 'Good morning'], 'responses': ['Hello!', 'Hi there!']},
+    {'tag': 'thanks', 'patterns': ['Thanks', 'Thank you'], 'responses': ['Happy to help!']},
+    {'tag': 'book_search', 'patterns': ['Can you recommend a book?', "I'm looking for a book"], 'responses': ['What genre?']},
+    {'tag': 'Poetry', 'patterns': ['Poetry', 'Recommend a Poetry book', 'Recommend a book in Poetry'],
+     'responses': [{'Book': 'Leaves of Grass', 'Feedback': '', 'Rate': 4.1}]},
+    {'tag': 'Science fiction', 'patterns': ['Science fiction', 'Recommend a Science fiction book'],
+     'responses': [{'Book': 'Dune', 'Feedback': '', 'Rate': 4.3}]},
+]
+
+
+class IntentClassifierTest(unittest.TestCase):
+    def setUp(self):
+        self.classifier = IntentClassifier(INTENTS)
+
+    def test_exact_match_ignores_case_and_punctuation(self):
+        match = self.classifier.classify('  HI!! ', rng=random.Random(0))
+        self.assertEqual((match.tag, match.kind, match.method, match.score), ('greeting', 'conversation', 'exact', 1.0))
+        self.assertIn(match.response, ['Hello!', 'Hi there!'])
+
+    def test_similar_pattern_matches_through_tfidf(self):
+        match = self.classifier.classify('can you recommend a good book')
+        self.assertEqual((match.tag, match.method), ('book_search', 'similar'))
+        self.assertGreaterEqual(match.score, self.classifier.threshold)
+
+    def test_genre_intents_have_no_text_response(self):
+        match = self.classifier.classify('recommend poetry book')
+        self.assertEqual((match.tag, match.kind, match.response), ('Poetry', 'genre', None))
+
+    def test_book_queries_are_not_matched(self):
+        self.assertIsNone(self.classifier.classify('a science fiction book about a desert planet and giant worms'))
+        self.assertIsNone(self.classifier.classify('dragons and magic'))
+        self.assertIsNone(self.classifier.classify(''))
+
+    def test_stats(self):
+        for text in ['hi', 'thanks', 'poetry', 'dragons and magic']:
+            self.classifier.classify(text)
+        stats = self.classifier.stats()
+        self.assertEqual(stats['classified'], 4)
+        self.assertEqual(stats['matched'], 3)
+        self.assertEqual(stats['answered'], 2)
+        self.assertEqual(stats['genre_shortcuts'], 1)
+        self.assertEqual(stats['match_rate'], 0.75)
+        self.assertEqual(stats['by_tag'], {'greeting': 1, 'thanks': 1, 'Poetry': 1})
+
+    def test_loads_the_shipped_intents(self):
+        classifier = IntentClassifier.from_file('BookData/intents.json')
+        self.assertEqual(len(classifier.intents), 51)
+        self.assertEqual(classifier.classify('Thank you').tag, 'thanks')
+
+
+if __name__ == '__main__':
+    unittest.main()
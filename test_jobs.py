@@ -0,0 +1,59 @@
+import threading
+import time
+import unittest
+from jobs import JobQueue, QueueFull
+
+
+def wait_for(queue, job, timeout=5):
+    deadline = time.time() + timeout
+    while queue.get(job.id).status in ('queued', 'running'):
+        if time.time() > deadline:
+            raise AssertionError(f'job {job.id} did not finish')
+        time.sleep(0.01)
+    return queue.get(job.id)
+
+
+class JobQueueTests(unittest.TestCase):
+
+    def test_runs_job_and_records_stage_timings(self):
+        def handler(job, text):
+            with job.timed('upper'):
+                return text.upper()
+        queue = JobQueue(handler)
+        job = wait_for(queue, queue.submit('dragons'))
+        self.assertEqual(job.status, 'done')
+        self.assertEqual(job.result, 'DRAGONS')
+        self.assertIn('upper', job.to_dict()['timings_ms'])
+        self.assertEqual(queue.stats()['completed'], 1)
+        queue.shutdown()
+
+    def test_failed_job_keeps_error(self):
+        def handler(job):
+            raise ValueError('no books')
+        queue = JobQueue(handler)
+        job = wait_for(queue, queue.submit())
+        self.assertEqual(job.status, 'failed')
+        self.assertEqual(job.error, 'no books')
+        queue.shutdown()
+
+    def test_rejects_when_full(self):
+        release = threading.Event()
+        queue = JobQueue(lambda job: release.wait(), workers=1, max_pending=2)
+        queue.submit()
+        queue.submit()
+        with self.assertRaises(QueueFull):
+            queue.submit()
+        self.assertEqual(queue.stats()['rejected'], 1)
+        release.set()
+        queue.shutdown()
+
+    def test_finished_jobs_are_bounded(self):
+        queue = JobQueue(lambda job: None, max_finished=2)
+        jobs = [wait_for(queue, queue.submit()) for _ in range(3)]
+        self.assertIsNone(queue.get(jobs[0].id))
+        self.assertIsNotNone(queue.get(jobs[2].id))
+        queue.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+from unittest import mock
+from batching import BatchScheduler
+from benchmark import StubNlp, USER_INPUTS
+
+try:
+    import keywords
+    keywords.KeywordExtractor(nlp=StubNlp())
+    skip_reason = None
+except (ImportError, LookupError) as e:  # spaCy / rake-nltk or the NLTK stopwords are missing
+    skip_reason = f'keyword extraction unavailable: {e}'
+
+
+@unittest.skipIf(skip_reason, skip_reason)
+class KeywordExtractorTests(unittest.TestCase):
+    def setUp(self):
+        self.extractor = keywords.KeywordExtractor(nlp=StubNlp(), batch_size=2)
+
+    def test_extract_many_matches_extract(self):
+        texts = USER_INPUTS + ['', 'Harry Potter goes to a wizard school in Scotland']
+        expected = [sorted(self.extractor.extract(text)) for text in texts]
+        self.assertEqual([sorted(found) for found in self.extractor.extract_many(texts)], expected)
+        self.assertIn('Harry Potter', expected[-1])
+
+    def test_scheduled_batches_match_extract(self):
+        scheduler = BatchScheduler(self.extractor.extract_many, max_batch=4, max_wait=0.05)
+        try:
+            futures = [scheduler.submit(text) for text in USER_INPUTS]
+            self.assertEqual([sorted(future.result(5)) for future in futures],
+                             [sorted(self.extractor.extract(text)) for text in USER_INPUTS])
+        finally:
+            scheduler.shutdown()
+
+    def test_only_ner_is_loaded(self):
+        with mock.patch.object(keywords.spacy, 'load', return_value=StubNlp()) as load:
+            extractor = keywords.KeywordExtractor('en_core_web_sm', batch_size=16, n_process=2)
+        load.assert_called_once_with('en_core_web_sm', exclude=keywords.UNUSED_COMPONENTS)
+        self.assertEqual((extractor.batch_size, extractor.n_process), (16, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()
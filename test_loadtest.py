@@ -0,0 +1,57 @@
+import os
+import random
+import tempfile
+import unittest
+from connect import ConnectionPool
+from loadtest import PASSWORD, Client, StandInConnection, create_stand_in_db, parse_mix, summarize
+from werkzeug.security import check_password_hash
+
+
+class StandInDatabaseTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'db.sqlite3')
+        create_stand_in_db(path, users=3)
+        self.pool = ConnectionPool(lambda: StandInConnection(path), size=2)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_app_queries_run_unchanged(self):
+        with self.pool.cursor() as (connection, cursor):
+            cursor.execute('SELECT UserId, UserName, Password FROM users WHERE UserName = %s', ('loadtest1',))
+            user_id, _, password_hash = cursor.fetchone()
+            self.assertTrue(check_password_hash(password_hash, PASSWORD))
+            cursor.execute('INSERT INTO wishlist (UserId, BookId, Title, CoverImg) VALUES (%s, %s, %s, %s)',
+                           (user_id, 'b1', 'Title', ''))
+            connection.commit()
+            cursor.execute('DELETE FROM wishlist WHERE UserId = %s AND BookId = %s', (user_id, 'b1'))
+            self.assertEqual(cursor.rowcount, 1)
+
+
+class ReportTest(unittest.TestCase):
+    def test_percentiles_and_errors_per_route(self):
+        samples = [('book', i / 1000, 200) for i in range(1, 101)] + [('book', 0.5, 500), ('dashboard', 0.01, 302)]
+        report = summarize(samples, elapsed=2.0)
+        self.assertEqual(report['book']['requests'], 101)
+        self.assertEqual(report['book']['errors'], 1)
+        self.assertAlmostEqual(report['book']['rps'], 50.5)
+        self.assertLessEqual(report['book']['p50_ms'], report['book']['p95_ms'])
+        self.assertLessEqual(report['book']['p95_ms'], report['book']['p99_ms'])
+        self.assertEqual(report['dashboard']['errors'], 0)
+
+    def test_parse_mix(self):
+        self.assertEqual(parse_mix('book=3,extract=1,dashboard=0'), {'book': 3.0, 'extract': 1.0})
+        self.assertIn('login', parse_mix(None))
+        with self.assertRaises(ValueError):
+            parse_mix('nope=1')
+
+    def test_client_records_failed_connections(self):
+        client = Client('http://127.0.0.1:9', 'loadtest0', ['b1'], ['query'], {'book': 1}, random.Random(0))
+        client.run_route('book')
+        self.assertEqual(client.samples[0][0], 'book')
+        self.assertEqual(client.samples[0][2], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
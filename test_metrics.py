@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+import tempfile
+import unittest
+from metrics import MetricsRegistry, mark_process_dead, profiled
+
+
+class HistogramTest(unittest.TestCase):
+    def setUp(self):
+        self.registry = MetricsRegistry()
+        self.histogram = self.registry.histogram('stage_seconds', 'Time per stage', ['stage'], buckets=(0.1, 1.0))
+
+    def test_buckets_are_cumulative(self):
+        for value in (0.05, 0.5, 0.5, 3.0):
+            self.histogram.observe(value, stage='summarize')
+        text = self.registry.render()
+        self.assertIn('# TYPE stage_seconds histogram', text)
+        self.assertIn('stage_seconds_bucket{stage="summarize",le="0.1"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="summarize",le="1.0"} 3', text)
+        self.assertIn('stage_seconds_bucket{stage="summarize",le="+Inf"} 4', text)
+        self.assertIn('stage_seconds_count{stage="summarize"} 4', text)
+        self.assertIn('stage_seconds_sum{stage="summarize"} 4.05', text)
+
+    def test_label_sets_are_separate_series(self):
+        self.histogram.observe(0.2, stage='a')
+        self.histogram.observe(0.2, stage='b')
+        self.assertEqual(self.histogram.totals(stage='a'), (1, 0.2))
+        self.assertEqual(self.histogram.totals(stage='c'), (0, 0.0))
+
+    def test_time_observes_even_on_error(self):
+        with self.assertRaises(KeyError):
+            with self.histogram.time(stage='db'):
+                raise KeyError('boom')
+        self.assertEqual(self.histogram.totals(stage='db')[0], 1)
+
+    def test_wrong_labels_are_rejected(self):
+        with self.assertRaises(ValueError):
+            self.histogram.observe(1.0, route='x')
+
+    def test_label_values_are_escaped(self):
+        self.histogram.observe(0.2, stage='say "hi"')
+        self.assertIn('stage="say \\"hi\\""', self.registry.render())
+
+    def test_same_name_returns_same_histogram(self):
+        self.assertIs(self.registry.histogram('stage_seconds', 'Time per stage', ['stage']), self.histogram)
+
+
+def observe_in_worker(directory, values):
+    registry = MetricsRegistry(directory, flush_seconds=3600)
+    histogram = registry.histogram('stage_seconds', 'Time per stage', ['stage'], buckets=(0.1, 1.0))
+    for value in values:
+        histogram.observe(value, stage='summarize')
+    # gunicorn workers flush at exit; multiprocessing ends its processes with os._exit
+    registry.flush()
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+class MultiprocessTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.registry = MetricsRegistry(self.directory.name, flush_seconds=3600)
+        self.histogram = self.registry.histogram('stage_seconds', 'Time per stage', ['stage'], buckets=(0.1, 1.0))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def run_worker(self, values):
+        worker = multiprocessing.get_context('fork').Process(target=observe_in_worker, args=(self.directory.name, values))
+        worker.start()
+        worker.join()
+        return worker.pid
+
+    def test_render_adds_up_every_worker(self):
+        self.histogram.observe(0.5, stage='summarize')
+        pid = self.run_worker([0.05, 3.0])
+        text = self.registry.render()
+        self.assertIn('stage_seconds_bucket{stage="summarize",le="0.1"} 1', text)
+        self.assertIn('stage_seconds_count{stage="summarize"} 3', text)
+        # an exited worker's counts stay, under a name its pid can't overwrite
+        mark_process_dead(pid, self.directory.name)
+        self.assertNotIn(f'metrics-{pid}.json', os.listdir(self.directory.name))
+        self.assertIn('stage_seconds_count{stage="summarize"} 3', self.registry.render())
+        # this process's own series are not counted twice
+        self.assertEqual(self.histogram.totals(stage='summarize'), (1, 0.5))
+
+
+class ProfiledTest(unittest.TestCase):
+    def test_dumps_stats_and_skips_nested_profiles(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with profiled(directory, 'outer') as outer:
+                with profiled(directory, 'inner') as inner:
+                    sum(range(1000))
+            self.assertIsNotNone(outer)
+            self.assertIsNone(inner)
+            self.assertEqual(os.listdir(directory), ['outer.prof'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from prefilter import CandidateRanker, TokenIndex, recall
+from scoring import RelevanceScorer
+from test_scoring import make_books
+
+
+class TokenIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.index = TokenIndex.from_columns(
+            ['The Hunger Games', 'Dragon Magic', 'Space Dragons', 'Cooking'],
+            ["['Young Adult']", "['Fantasy', 'Magic']", "['Science Fiction']", "['Food']"],
+            ['', 'Merlin', '', ''],
+        )
+
+    def test_candidates_share_a_token(self):
+        self.assertEqual(self.index.candidates(['dragon', 'magic']).tolist(), [1])
+        self.assertEqual(self.index.candidates(['magic', 'games']).tolist(), [0, 1])
+        self.assertEqual(self.index.candidates(['unknown']).tolist(), [])
+
+    def test_limit_keeps_best_scores(self):
+        # book 1 matches two of the query tokens, the others at most one
+        self.assertEqual(self.index.candidates(['magic', 'fantasy', 'cooking'], limit=1).tolist(), [1])
+
+
+class CandidateRankerTests(unittest.TestCase):
+
+    def setUp(self):
+        books = make_books(500)
+        self.scorer = RelevanceScorer.from_frame(books)
+        self.token_index = TokenIndex.from_columns(self.scorer.titles, self.scorer.genres, self.scorer.characters)
+
+    def test_all_candidates_match_exhaustive(self):
+        ranker = CandidateRanker(self.scorer, self.token_index, limit=500)
+        keywords, summary = ['dragon magic'], 'a detective story at sea'
+        exhaustive_rows, exhaustive_scores = ranker.rank(keywords, summary, exhaustive=True)
+        rows, scores = ranker.rank(keywords, summary)
+        np.testing.assert_array_equal(scores, exhaustive_scores)
+        self.assertEqual(recall(exhaustive_rows, rows), 1.0)
+
+    def test_disabled_scores_everything(self):
+        ranker = CandidateRanker(self.scorer, self.token_index, limit=0)
+        self.assertIsNone(ranker.candidates(['dragon magic']))
+
+    def test_few_matches_fall_back_to_exhaustive(self):
+        ranker = CandidateRanker(self.scorer, self.token_index)
+        self.assertIsNone(ranker.candidates(['zebra']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import shutil
+import tempfile
+import unittest
+from query_cache import MemoryBackend, QueryCache, SqliteBackend, normalize_query, ranking_key
+
+
+class QueryCacheTests(unittest.TestCase):
+
+    def test_normalize_query(self):
+        self.assertEqual(normalize_query('  Fantasy with\n dragons   and MAGIC '), 'fantasy with dragons and magic')
+
+    def test_ranking_key_depends_on_catalog(self):
+        self.assertNotEqual(ranking_key(['dragon magic'], 'a story', '1'), ranking_key(['dragon magic'], 'a story', '2'))
+
+    def test_get_or_compute_counts_hits(self):
+        cache = QueryCache(MemoryBackend(), 'analysis')
+        calls = []
+        def compute():
+            calls.append(1)
+            return {'keywords': ['dragon magic'], 'summary': 'dragons'}
+        cache.get_or_compute('fantasy', compute)
+        cache.get_or_compute('fantasy', compute)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(cache.stats()['hits'], 1)
+        self.assertEqual(cache.stats()['misses'], 1)
+
+    def test_memory_backend_evicts_least_recently_used(self):
+        backend = MemoryBackend(max_entries=2)
+        backend.put('analysis', 'a', 1)
+        backend.put('analysis', 'b', 2)
+        backend.get('analysis', 'a')
+        backend.put('analysis', 'c', 3)
+        self.assertIsNone(backend.get('analysis', 'b'))
+        self.assertEqual(backend.get('analysis', 'a'), 1)
+
+    def test_tiers_do_not_collide(self):
+        backend = MemoryBackend()
+        QueryCache(backend, 'analysis').put('x', 1)
+        self.assertIsNone(QueryCache(backend, 'ranking').get('x'))
+
+
+class SqliteBackendTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, 'query_cache.sqlite')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_survives_restart(self):
+        SqliteBackend(self.path).put('ranking', 'k', {'book_ids': ['1'], 'scores': [50.0]})
+        self.assertEqual(SqliteBackend(self.path).get('ranking', 'k'), {'book_ids': ['1'], 'scores': [50.0]})
+
+    def test_bounded(self):
+        backend = SqliteBackend(self.path, max_entries=3)
+        for i in range(5):
+            backend.put('analysis', str(i), i)
+        self.assertEqual(len(backend), 3)
+        self.assertIsNone(backend.get('analysis', '0'))
+        self.assertEqual(backend.get('analysis', '4'), 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
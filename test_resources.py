@@ -0,0 +1,77 @@
+import threading
+import unittest
+from resources import ResourceRegistry
+
+
+class ResourceRegistryTest(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.registry = ResourceRegistry()
+
+    def loader(self, value):
+        def load():
+            self.calls.append(value)
+            return value
+        return load
+
+    def test_loads_on_first_get_only(self):
+        self.registry.register('model', self.loader('model'))
+        self.assertFalse(self.registry.is_loaded('model'))
+        self.assertIsNone(self.registry.peek('model'))
+        self.assertEqual(self.registry.get('model'), 'model')
+        self.assertEqual(self.registry.get('model'), 'model')
+        self.assertEqual(self.calls, ['model'])
+        self.assertTrue(self.registry.stats()['model']['loaded'])
+        self.assertGreaterEqual(self.registry.stats()['model']['load_ms'], 0)
+
+    def test_concurrent_gets_load_once(self):
+        started = threading.Event()
+
+        def slow_load():
+            started.set()
+            self.calls.append('slow')
+            return object()
+
+        self.registry.register('slow', slow_load)
+        values = []
+        threads = [threading.Thread(target=lambda: values.append(self.registry.get('slow'))) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.calls, ['slow'])
+        self.assertEqual(len({id(value) for value in values}), 1)
+
+    def test_failed_load_is_reported_and_retried(self):
+        attempts = []
+
+        def flaky():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise OSError('model files missing')
+            return 'ok'
+
+        self.registry.register('flaky', flaky)
+        with self.assertRaises(OSError):
+            self.registry.get('flaky')
+        self.assertEqual(self.registry.stats()['flaky'], {'loaded': False, 'load_ms': None, 'error': 'model files missing'})
+        self.assertEqual(self.registry.get('flaky'), 'ok')
+        self.assertIsNone(self.registry.stats()['flaky']['error'])
+
+    def test_warm_up_loads_everything_in_the_background(self):
+        self.registry.register('a', self.loader('a'))
+        self.registry.register('broken', lambda: 1 / 0)
+        self.registry.register('b', self.loader('b'))
+        self.registry.warm_up().join(5)
+        self.assertEqual(self.calls, ['a', 'b'])
+        self.assertFalse(self.registry.is_loaded('broken'))
+
+    def test_load_all(self):
+        self.registry.register('a', self.loader('a'))
+        self.registry.register('b', self.loader('b'))
+        self.registry.load_all()
+        self.assertEqual(self.calls, ['a', 'b'])
+
+
+if __name__ == '__main__':
+    unittest.main()
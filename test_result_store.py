@@ -0,0 +1,54 @@
+import unittest
+from result_store import ResultStore, SearchResult, result_size
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ResultStoreTests(unittest.TestCase):
+
+    def test_put_and_get(self):
+        store = ResultStore()
+        store.put('a', ['dragon magic'], 'a story', ['1.Harry_Potter', '41865.Twilight'], [90.5, 80.0])
+        result = store.get('a')
+        self.assertEqual(result.book_ids, ('1.Harry_Potter', '41865.Twilight'))
+        self.assertEqual(result.scores, (90.5, 80.0))
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.stats()['hits'], 1)
+        self.assertEqual(store.stats()['misses'], 1)
+
+    def test_least_recently_used_is_evicted(self):
+        store = ResultStore(max_entries=2)
+        store.put('a', [], '', ['1'], [1.0])
+        store.put('b', [], '', ['2'], [1.0])
+        store.get('a')
+        store.put('c', [], '', ['3'], [1.0])
+        self.assertIsNotNone(store.get('a'))
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.stats()['evictions'], 1)
+
+    def test_expired_results_are_dropped(self):
+        clock = FakeClock()
+        store = ResultStore(ttl=10, clock=clock)
+        store.put('a', [], '', ['1'], [1.0])
+        clock.now = 11
+        self.assertIsNone(store.get('a'))
+        self.assertEqual(len(store), 0)
+
+    def test_byte_budget(self):
+        size = result_size(SearchResult([], '', ('1',), (1.0,)))
+        store = ResultStore(max_bytes=2 * size)
+        for search_id in 'abc':
+            store.put(search_id, [], '', ['1'], [1.0])
+        self.assertEqual(len(store), 2)
+        self.assertLessEqual(store.bytes, 2 * size)
+
+
+if __name__ == '__main__':
+    unittest.main()
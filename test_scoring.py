@@ -0,0 +1,84 @@
+import random
+import unittest
+import numpy as np
+import pandas as pd
+from fuzzywuzzy import fuzz as fuzzywuzzy_fuzz
+from rapidfuzz import fuzz
+from scoring import RelevanceScorer
+
+
+WORDS = ['dragon', 'magic', 'school', 'love', 'war', 'space', 'detective', 'murder', 'king', 'sea']
+
+
+def make_books(count, seed=0):
+    rng = random.Random(seed)
+    def text(n):
+        return ' '.join(rng.choice(WORDS) for _ in range(n))
+    return pd.DataFrame({
+        'bookId': [str(i) for i in range(count)],
+        'title': [text(3) for _ in range(count)],
+        'genres': [str([w.title() for w in text(3).split()]) for _ in range(count)],
+        'characters': [text(2) if i % 4 else np.nan for i in range(count)],
+        'description': [text(20) if i % 7 else np.nan for i in range(count)],
+    })
+
+
+# The original iterrows implementation, kept as a reference
+def reference_scores(book_data, keywords, summary, partial_ratio):
+    scores = []
+    for _, row in book_data.iterrows():
+        title = str(row['title']) if pd.notna(row['title']) else ""
+        genres = str(row['genres']) if pd.notna(row['genres']) else ""
+        characters = str(row['characters']) if pd.notna(row['characters']) else ""
+        description = str(row['description']) if pd.notna(row['description']) else ""
+        title_score = max([round(partial_ratio(keyword, title)) for keyword in keywords], default=0)
+        genre_score = max([round(partial_ratio(keyword, genres)) for keyword in keywords], default=0)
+        character_score = max([round(partial_ratio(keyword, characters)) for keyword in keywords], default=0)
+        description_score = round(partial_ratio(summary, description))
+        scores.append((title_score + genre_score + character_score + description_score) / 4)
+    return np.array(scores)
+
+
+class RelevanceScorerTests(unittest.TestCase):
+
+    def setUp(self):
+        self.books = make_books(200)
+        self.keywords = ['dragon magic', 'space war']
+        self.summary = 'a detective story at sea'
+
+    def test_matches_reference_formula(self):
+        scorer = RelevanceScorer.from_frame(self.books)
+        expected = reference_scores(self.books, self.keywords, self.summary, fuzz.partial_ratio)
+        np.testing.assert_array_equal(scorer.scores(self.keywords, self.summary), expected)
+
+    def test_matches_legacy_fuzzywuzzy_scores(self):
+        # cdist passes rapidfuzz keyword arguments that fuzzywuzzy does not accept
+        def legacy_partial_ratio(s1, s2, **kwargs):
+            return fuzzywuzzy_fuzz.partial_ratio(s1, s2)
+        scorer = RelevanceScorer.from_frame(self.books, scorer=legacy_partial_ratio, workers=1)
+        expected = reference_scores(self.books, self.keywords, self.summary, fuzzywuzzy_fuzz.partial_ratio)
+        np.testing.assert_array_equal(scorer.scores(self.keywords, self.summary), expected)
+
+    def test_no_keywords(self):
+        scorer = RelevanceScorer.from_frame(self.books)
+        expected = reference_scores(self.books, [], self.summary, fuzz.partial_ratio)
+        np.testing.assert_array_equal(scorer.scores([], self.summary), expected)
+
+    def test_scores_for_candidate_rows(self):
+        scorer = RelevanceScorer.from_frame(self.books)
+        rows = np.array([5, 17, 3, 120])
+        np.testing.assert_array_equal(scorer.scores(self.keywords, self.summary, rows=rows),
+                                      scorer.scores(self.keywords, self.summary)[rows])
+
+    def test_top_matches_full_sort(self):
+        scores = RelevanceScorer.from_frame(self.books).scores(self.keywords, self.summary)
+        expected = sorted(range(len(scores)), key=lambda i: (-scores[i], i))[:15]
+        self.assertEqual(RelevanceScorer.top(scores).tolist(), expected)
+
+    def test_top_small_catalog(self):
+        self.assertEqual(RelevanceScorer.top(np.array([1.0, 3.0, 2.0])).tolist(), [1, 2, 0])
+        self.assertEqual(RelevanceScorer.top(np.array([])).tolist(), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from search_index import SearchIndex, build_index
+
+
+class SearchIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.csv_path = os.path.join(self.tmp, 'data.csv')
+        self.index_path = os.path.join(self.tmp, 'search_index')
+        pd.DataFrame({
+            'bookId': ['2767052-the-hunger-games', '1.Harry_Potter', '41865.Twilight'],
+            'title': ['The Hunger Games', 'Harry Potter and the Order of the Phoenix', 'Twilight'],
+            'author': ['Suzanne Collins', 'J.K. Rowling, Mary GrandPré (Illustrator)', 'Stephenie Meyer'],
+            'rating': [4.33, 4.5, 3.6],
+            'description': ['WINNING MEANS FAME AND FORTUNE.', np.nan, 'About three things I was absolutely positive.'],
+            'genres': ["['Young Adult', 'Fiction']", "['Fantasy', 'Magic']", "['Romance']"],
+            'characters': ["['Katniss Everdeen']", np.nan, "['Edward Cullen', 'Bella Swan']"],
+            'coverImg': ['https://img/1.jpg', np.nan, 'https://img/3.jpg'],
+        }).to_csv(self.csv_path, index=False)
+        build_index(self.csv_path, self.index_path)
+        self.index = SearchIndex.load(self.index_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_text_columns_have_no_missing_values(self):
+        self.assertEqual(self.index.text('description').tolist()[1], '')
+        self.assertEqual(self.index.text('characters').tolist()[2], "['Edward Cullen', 'Bella Swan']")
+
+    def test_row_for(self):
+        self.assertEqual(self.index.row_for('41865.Twilight'), 2)
+        self.assertEqual(self.index.row_for('1.Harry_Potter'), 1)
+        self.assertIsNone(self.index.row_for('missing'))
+
+    def test_tokens(self):
+        self.assertIn('katniss', self.index.tokens(0))
+        self.assertIn('fantasy', self.index.tokens(1))
+        self.assertNotIn('Fantasy', self.index.tokens(1))
+
+    def test_build_id_changes_on_rebuild(self):
+        build_index(self.csv_path, self.index_path)
+        self.assertNotEqual(SearchIndex.load(self.index_path).build_id, self.index.build_id)
+
+    def test_stale_after_csv_changes(self):
+        self.assertFalse(self.index.is_stale(self.csv_path))
+        with open(self.csv_path, 'a') as f:
+            f.write('new-book,New Book,Someone,4.0,,,,\n')
+        self.assertTrue(self.index.is_stale(self.csv_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+import numpy as np
+from facets import FacetFilter, FacetIndex
+from prefilter import CandidateRanker, TokenIndex
+from scoring import RelevanceScorer
+from shards import (HttpShardClient, LocalShardCluster, SearchShard, ShardCoordinator, ShardHits,
+                    ShardsUnavailable, merge_hits, shard_of)
+from test_scoring import make_books
+
+
+QUERIES = [(['dragon magic', 'sea king'], 'a detective and a murder at sea'),
+           (['love war'], 'space war love story'),
+           ([], 'magic school')]
+
+
+class FailingShard:
+    def search(self, keywords, summary, k, timeout, facet_filter=None):
+        raise ConnectionRefusedError('shard is down')
+
+
+class SlowShard:
+    def __init__(self, shard, delay):
+        self.shard = shard
+        self.delay = delay
+
+    def search(self, keywords, summary, k, timeout, facet_filter=None):
+        time.sleep(self.delay)
+        return self.shard.search(keywords, summary, k, timeout)
+
+
+class StuckShard:
+    def __init__(self):
+        self.release = threading.Event()
+
+    def search(self, keywords, summary, k, timeout, facet_filter=None):
+        self.release.wait()
+        raise TimeoutError('shard is stuck')
+
+
+class ShardAssignmentTests(unittest.TestCase):
+    def test_stable_and_in_range(self):
+        self.assertEqual(shard_of('2767052-the-hunger-games', 4), shard_of('2767052-the-hunger-games', 4))
+        self.assertTrue(all(0 <= shard_of(str(i), 3) < 3 for i in range(100)))
+
+    def test_shards_partition_the_catalog(self):
+        books = make_books(200)
+        shards = [SearchShard(books, index, 3) for index in range(3)]
+        rows = np.concatenate([shard.rows for shard in shards])
+        self.assertEqual(sorted(rows.tolist()), list(range(200)))
+        self.assertTrue(all(len(shard) > 30 for shard in shards))
+
+
+class CoordinatorTests(unittest.TestCase):
+    def setUp(self):
+        self.books = make_books(300)
+        self.shards = [SearchShard(self.books, index, 3, limit=0) for index in range(3)]
+        self.scorer = RelevanceScorer.from_frame(self.books)
+
+    def expected(self, keywords, summary):
+        scores = self.scorer.scores(keywords, summary)
+        rows = self.scorer.top(scores)
+        return self.books['bookId'].to_numpy()[rows].tolist(), scores[rows].tolist()
+
+    def test_merged_results_match_a_single_process(self):
+        coordinator = ShardCoordinator(self.shards)
+        for keywords, summary in QUERIES:
+            result = coordinator.search(keywords, summary)
+            self.assertEqual((result.book_ids, result.scores), self.expected(keywords, summary))
+            self.assertFalse(result.partial)
+        self.assertEqual(coordinator.stats()['searches'], len(QUERIES))
+
+    def test_facet_filter_applies_on_every_shard(self):
+        facet_filter = FacetFilter(['Dragon'])
+        allowed = FacetIndex.from_frame(self.books).allowed(facet_filter)
+        result = ShardCoordinator(self.shards).search(*QUERIES[0], facet_filter=facet_filter)
+        scores = np.where(allowed, self.scorer.scores(*QUERIES[0]), -1.0)
+        rows = self.scorer.top(scores)
+        self.assertEqual(result.book_ids, self.books['bookId'].to_numpy()[rows].tolist())
+
+    def test_merge_breaks_ties_in_catalog_order(self):
+        hits = [ShardHits([4, 1, 3], ['d', 'a', 'c'], [50.0, 40.0, 40.0]), ShardHits([0, 2], ['z', 'b'], [40.0, 40.0])]
+        self.assertEqual(merge_hits(hits, k=4), (['d', 'z', 'a', 'b'], [50.0, 40.0, 40.0, 40.0]))
+
+    def test_failed_shard_gives_partial_results(self):
+        coordinator = ShardCoordinator([self.shards[0], FailingShard(), self.shards[2]])
+        result = coordinator.search(*QUERIES[0])
+        self.assertTrue(result.partial)
+        self.assertEqual((result.answered, result.failed, result.timed_out), (2, [1], []))
+        self.assertFalse(set(result.book_ids) & set(self.shards[1].book_ids))
+        self.assertEqual(coordinator.stats()['errors'], [0, 1, 0])
+
+    def test_slow_shard_times_out(self):
+        coordinator = ShardCoordinator([self.shards[0], SlowShard(self.shards[1], 0.5)], timeout=0.1)
+        start = time.perf_counter()
+        result = coordinator.search(*QUERIES[0])
+        self.assertLess(time.perf_counter() - start, 0.4)
+        self.assertEqual(result.timed_out, [1])
+        self.assertEqual(coordinator.stats()['timeouts'], [0, 1])
+
+    def test_stuck_shard_does_not_hold_up_the_others(self):
+        stuck = StuckShard()
+        coordinator = ShardCoordinator([self.shards[0], stuck], timeout=0.1, workers=1)
+        try:
+            for _ in range(3):
+                start = time.perf_counter()
+                result = coordinator.search(*QUERIES[0])
+                self.assertLess(time.perf_counter() - start, 0.4)
+                self.assertEqual((result.answered, result.timed_out), (1, [1]))
+            # the first call is still running, so later searches skip the shard
+            self.assertEqual(coordinator.stats()['busy'], [0, 2])
+        finally:
+            stuck.release.set()
+            coordinator.shutdown()
+
+    def test_no_shards_answering_raises(self):
+        coordinator = ShardCoordinator([FailingShard(), FailingShard()])
+        with self.assertRaises(ShardsUnavailable):
+            coordinator.search(*QUERIES[0])
+        self.assertEqual(coordinator.stats()['unavailable'], 1)
+
+
+class PrefilterTests(unittest.TestCase):
+    def setUp(self):
+        self.books = make_books(300)
+        self.shards = [SearchShard(self.books, index, 3, limit=20) for index in range(3)]
+        self.scorer = RelevanceScorer.from_frame(self.books)
+        self.token_index = TokenIndex.from_columns(self.scorer.titles, self.scorer.genres, self.scorer.characters)
+
+    def test_shards_use_the_whole_catalog_token_statistics(self):
+        tokens = ['dragon', 'magic', 'sea', 'murder', 'nosuchword']
+        for shard in self.shards:
+            np.testing.assert_allclose([shard.ranker.token_index.idf(token) for token in tokens],
+                                       [self.token_index.idf(token) for token in tokens])
+
+    def test_merged_results_score_at_least_a_single_process(self):
+        ranker = CandidateRanker(self.scorer, self.token_index, limit=20)
+        coordinator = ShardCoordinator(self.shards)
+        for keywords, summary in QUERIES:
+            _, expected = ranker.rank(keywords, summary)
+            result = coordinator.search(keywords, summary)
+            self.assertEqual(len(result.scores), len(expected))
+            self.assertTrue(all(got >= want for got, want in zip(result.scores, expected)))
+
+
+class LocalClusterTests(unittest.TestCase):
+    def test_shard_processes_answer_over_http(self):
+        books = make_books(120)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'data.csv')
+            books.to_csv(path, index=False)
+            with LocalShardCluster(path, 2, limit=0) as cluster:
+                remote = ShardCoordinator(cluster.clients())
+                local = ShardCoordinator([SearchShard(books, index, 2, limit=0) for index in range(2)])
+                for keywords, summary in QUERIES:
+                    self.assertEqual(remote.search(keywords, summary), local.search(keywords, summary))
+                facet_filter = FacetFilter(['Magic'])
+                self.assertEqual(remote.search(*QUERIES[0], facet_filter=facet_filter),
+                                 local.search(*QUERIES[0], facet_filter=facet_filter))
+            with self.assertRaises(ShardsUnavailable):
+                ShardCoordinator([HttpShardClient(url) for url in cluster.urls], timeout=1).search(*QUERIES[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
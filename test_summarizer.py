@@ -0,0 +1,61 @@
+import threading
+import unittest
+import pytest
+
+# summarizer imports torch and transformers; skip rather than fail collection without them
+pytest.importorskip('torch')
+pytest.importorskip('transformers')
+from summarizer import SummarizationScheduler
+
+
+class FakeSummarizer:
+    def __init__(self):
+        self.batches = []
+        self.release = threading.Event()
+
+    def summarize_many(self, texts):
+        self.release.wait(5)
+        self.batches.append(list(texts))
+        return [text.upper() for text in texts]
+
+
+LONG_TEXT = ' '.join(['word'] * 20)
+
+
+class SummarizationSchedulerTest(unittest.TestCase):
+    def setUp(self):
+        self.summarizer = FakeSummarizer()
+        self.scheduler = SummarizationScheduler(self.summarizer, max_batch=4, max_wait=0.05)
+
+    def tearDown(self):
+        self.summarizer.release.set()
+        self.scheduler.shutdown()
+
+    def test_short_text_is_returned_without_batching(self):
+        self.assertEqual(self.scheduler.summarize('too short'), 'too short')
+        self.assertEqual(self.summarizer.batches, [])
+
+    def test_concurrent_texts_share_a_batch(self):
+        futures = [self.scheduler.submit(f'{LONG_TEXT} {i}') for i in range(3)]
+        self.summarizer.release.set()
+        self.assertEqual([future.result(5) for future in futures], [f'{LONG_TEXT} {i}'.upper() for i in range(3)])
+        self.assertEqual(len(self.summarizer.batches), 1)
+        self.assertEqual(self.scheduler.stats()['avg_batch_size'], 3)
+
+    def test_batch_is_capped_at_max_batch(self):
+        futures = [self.scheduler.submit(f'{LONG_TEXT} {i}') for i in range(6)]
+        self.summarizer.release.set()
+        for future in futures:
+            future.result(5)
+        self.assertEqual([len(batch) for batch in self.summarizer.batches], [4, 2])
+
+    def test_errors_reach_every_caller(self):
+        self.summarizer.summarize_many = lambda texts: 1 / 0
+        futures = [self.scheduler.submit(LONG_TEXT) for _ in range(2)]
+        for future in futures:
+            with self.assertRaises(ZeroDivisionError):
+                future.result(5)
+
+
+if __name__ == '__main__':
+    unittest.main()
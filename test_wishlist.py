@@ -0,0 +1,49 @@
+import os
+import tempfile
+import unittest
+import wishlist
+from loadtest import StandInConnection, create_stand_in_db
+
+
+class WishlistTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'db.sqlite3')
+        create_stand_in_db(path, users=2)
+        self.connection = StandInConnection(path)
+        self.cursor = self.connection.cursor()
+
+    def tearDown(self):
+        self.connection.close()
+        self.directory.cleanup()
+
+    def books(self, *book_ids):
+        return [(book_id, f'Title {book_id}', f'{book_id}.jpg') for book_id in book_ids]
+
+    def test_add_skips_books_already_in_the_wishlist(self):
+        self.assertEqual(wishlist.add_books(self.cursor, 1, self.books('a', 'b')), 2)
+        self.assertEqual(wishlist.add_books(self.cursor, 1, self.books('b', 'c')), 1)
+        self.assertEqual([book.bookId for book in wishlist.books(self.cursor, 1)], ['a', 'b', 'c'])
+        # Another user's wishlist is separate
+        self.assertEqual(wishlist.add_books(self.cursor, 2, self.books('a')), 1)
+
+    def test_remove_many(self):
+        wishlist.add_books(self.cursor, 1, self.books('a', 'b', 'c'))
+        wishlist.add_books(self.cursor, 2, self.books('a'))
+        self.assertEqual(wishlist.remove_books(self.cursor, 1, ['a', 'c', 'c', 'missing']), 2)
+        self.assertEqual(wishlist.books(self.cursor, 1), [wishlist.WishlistBook('b', 'Title b', 'b.jpg')])
+        self.assertEqual([book.bookId for book in wishlist.books(self.cursor, 2)], ['a'])
+
+    def test_empty_requests_do_not_query(self):
+        self.assertEqual(wishlist.add_books(self.cursor, 1, []), 0)
+        self.assertEqual(wishlist.remove_books(self.cursor, 1, []), 0)
+
+    def test_contains(self):
+        wishlist.add_books(self.cursor, 1, self.books('a'))
+        self.assertTrue(wishlist.contains(self.cursor, 1, 'a'))
+        self.assertFalse(wishlist.contains(self.cursor, 1, 'b'))
+        self.assertFalse(wishlist.contains(self.cursor, 2, 'a'))
+
+
+if __name__ == '__main__':
+    unittest.main()
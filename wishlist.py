@@ -0,0 +1,42 @@
+from collections import namedtuple
+
+
+# Wishlist queries. The (UserId, BookId) unique key in create_database.sql
+# lets adds be a single INSERT IGNORE instead of a SELECT and an INSERT.
+
+# Most bookIds one bulk request may add or remove
+MAX_BULK_BOOKS = 500
+
+# A wishlist row, with the attribute names of the catalog's BookRecord
+WishlistBook = namedtuple('WishlistBook', ['bookId', 'title', 'coverImg'])
+
+
+# Add books, given as (book_id, title, cover_img); returns how many were new
+def add_books(cursor, user_id, books):
+    rows = [(user_id, book_id, title, cover_img) for book_id, title, cover_img in books]
+    if not rows:
+        return 0
+    cursor.executemany('INSERT IGNORE INTO wishlist (UserId, BookId, Title, CoverImg) VALUES (%s, %s, %s, %s)', rows)
+    return cursor.rowcount
+
+
+# Remove books by id in one statement; returns how many were removed
+def remove_books(cursor, user_id, book_ids):
+    book_ids = list(dict.fromkeys(book_ids))
+    if not book_ids:
+        return 0
+    placeholders = ', '.join(['%s'] * len(book_ids))
+    cursor.execute(f'DELETE FROM wishlist WHERE UserId = %s AND BookId IN ({placeholders})', [user_id] + book_ids)
+    return cursor.rowcount
+
+
+# The user's wishlisted books as stored, oldest first. The stored title and
+# cover stand in for books that are no longer in the catalog
+def books(cursor, user_id):
+    cursor.execute('SELECT BookId, Title, CoverImg FROM wishlist WHERE UserId = %s ORDER BY WishlistId', (user_id,))
+    return [WishlistBook(*row) for row in cursor.fetchall()]
+
+
+def contains(cursor, user_id, book_id):
+    cursor.execute('SELECT 1 FROM wishlist WHERE UserId = %s AND BookId = %s LIMIT 1', (user_id, book_id))
+    return cursor.fetchone() is not None